@@ -0,0 +1,129 @@
+# backend/admission.py
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi.responses import JSONResponse
+
+from database import request_deadline, pool_pressure, DeadlineExceeded, DB_POOL_SIZE, DB_MAX_OVERFLOW
+from loopmonitor import monitor
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Контроль допуску під перевантаженням.
+#
+# Коли пул з'єднань вичерпано, перегляд каталогу стає в ту саму чергу пулу,
+# що й ставки з оплатами, і витісняє їх. Тут кожен запит отримує клас
+# пріоритету (оплати > ставки > читання користувача > анонімний перегляд),
+# а нижчі класи відкидаються раніше - 503 з Retry-After ще до будь-якої
+# роботи, щойно тиск на пул (див. database.pool_pressure) або lag event
+# loop перейдуть поріг класу. Оплати не відкидаються ніколи.
+#
+# Кожен допущений запит має дедлайн: MeteredPool не видає з'єднання
+# запиту, чий дедлайн минув, - клієнт, найімовірніше, вже не чекає, а
+# з'єднання потрібне тим, хто чекає.
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") == "1"
+
+@dataclass(frozen=True)
+class Priority:
+    name: str
+    # Поріг тиску на пул: 1.0 - усі з'єднання видані, 2.0 - ще стільки ж чекають (None - не відкидати)
+    max_pressure: Optional[float]
+    # Поріг lag event loop, секунд (None - не відкидати)
+    max_lag: Optional[float]
+    # Дедлайн запиту, секунд
+    deadline: float
+
+PAYMENTS = Priority("payments", None, None, 10)
+BIDS = Priority("bids", 2.0, 1.0, 5)
+READS = Priority("reads", 1.0, 0.5, 3)
+BROWSE = Priority("browse", 0.8, 0.25, 2)
+
+# Без класу - не обмежуються (дешеві, без БД)
+EXEMPT_PATHS = ("/", "/metrics")
+EXEMPT_PREFIXES = ("/uploads/",)
+
+RETRY_AFTER_SECONDS = 1
+# Допущений запит тримає з'єднання лише частину свого часу (а влучання в кеш - зовсім ні):
+# стільки допущених запитів на одне з'єднання пулу вважаються повним навантаженням
+ADMITTED_PER_CONNECTION = 2
+
+admission_shed = metrics.Counter("admission_shed_total", "Requests rejected by load shedding", ["priority", "reason"])
+admission_deadline_exceeded = metrics.Counter("admission_deadline_exceeded_total", "Requests dropped at their deadline", ["priority"])
+in_flight = metrics.Gauge("admission_in_flight", "Admitted requests in progress", ["priority"])
+_admitted = 0
+
+def pressure():
+    """
+    Тиск на пул з урахуванням уже допущених запитів: сплеск, що прийшов на
+    порожній пул, ще не встиг взяти з'єднання, але скоро візьме.
+    """
+    return max(pool_pressure(), _admitted / (ADMITTED_PER_CONNECTION * max(1, DB_POOL_SIZE + DB_MAX_OVERFLOW)))
+
+def classify(scope):
+    method, path = scope["method"], scope["path"]
+    if method == "OPTIONS" or path in EXEMPT_PATHS or path.startswith(EXEMPT_PREFIXES):
+        return None
+    # Лише сама оплата: фоновий POST /payments/check-expired не конкурує з нею
+    if path.rstrip("/") == "/payments" and method == "POST":
+        return PAYMENTS
+    if path.startswith("/bids/") and method in ("POST", "DELETE"):
+        return BIDS
+    if any(name == b"authorization" for name, _ in scope["headers"]):
+        return READS
+    return BROWSE
+
+def overloaded(priority):
+    """Причина відкинути запит цього класу або None"""
+    if priority.max_pressure is not None and pressure() >= priority.max_pressure:
+        return "pool"
+    if priority.max_lag is not None and monitor.recent_lag() >= priority.max_lag:
+        return "loop_lag"
+    return None
+
+def _overloaded_response():
+    return JSONResponse(
+        {"detail": "Server is overloaded, please retry"},
+        status_code=503,
+        headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+    )
+
+async def deadline_handler(request, exc: DeadlineExceeded):
+    priority = classify(request.scope)
+    admission_deadline_exceeded.inc(priority=priority.name if priority else "none")
+    return _overloaded_response()
+
+class AdmissionMiddleware:
+    """Чистий ASGI middleware: відкидає запити нижчих класів під перевантаженням, ставить дедлайн решті"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ADMISSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        priority = classify(scope)
+        if priority is None:
+            await self.app(scope, receive, send)
+            return
+
+        reason = overloaded(priority)
+        if reason is not None:
+            admission_shed.inc(priority=priority.name, reason=reason)
+            await _overloaded_response()(scope, receive, send)
+            return
+
+        global _admitted
+        token = request_deadline.set(time.monotonic() + priority.deadline)
+        _admitted += 1
+        in_flight.inc(priority=priority.name)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _admitted -= 1
+            in_flight.dec(priority=priority.name)
+            request_deadline.reset(token)
@@ -0,0 +1,110 @@
+# backend/archive.py
+import logging
+import os
+import time
+from datetime import timedelta
+
+from sqlalchemy import delete, insert, update
+from sqlalchemy.future import select
+
+from database import AsyncSessionLocal
+from models import (
+    Lot, LotImage, Bid, Payment, ProxyBid, WatchlistItem,
+    ArchivedLot, ArchivedLotImage, ArchivedBid, ArchivedPayment,
+)
+import cache
+import clock
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Архів завершених лотів.
+#
+# Продані й закриті лоти з усіма ставками, фото й оплатами лишаються в
+# тих самих таблицях, що й живі торги, і їх сканують ставки, каталог і
+# фонові задачі. Тут лоти, завершені понад ARCHIVE_AFTER_DAYS тому,
+# переносяться в *_archive пакетами по ARCHIVE_BATCH_SIZE - кожен пакет
+# одна коротка транзакція: INSERT ... SELECT в архів, DELETE з гарячих
+# таблиць. Рядки лотів пакета беруться FOR UPDATE SKIP LOCKED - лот, який
+# саме змінюють (відновлення продавцем), просто лишається до наступного
+# проходу.
+#
+# Читання історії ("мої лоти", "мої ставки", сторінка лота і його ставки)
+# дивляться в архів, якщо в гарячих таблицях рядка немає.
+# Лоти, видалені разом із забаненим продавцем (ban_jobs.py), видаляються
+# повністю - архівувати там нічого.
+
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+# Пакетів за один прохід фонової задачі (решта - наступного разу)
+ARCHIVE_MAX_BATCHES = int(os.getenv("ARCHIVE_MAX_BATCHES", "20"))
+
+FINISHED_STATUSES = ("sold", "closed", "closed_unsold")
+
+# Гаряча таблиця -> архівна; лоти першими (на них посилаються решта архівних)
+TABLES = ((Lot, ArchivedLot), (LotImage, ArchivedLotImage), (Bid, ArchivedBid), (Payment, ArchivedPayment))
+
+batch_duration = metrics.Histogram(
+    "archive_batch_seconds", "Duration of one archive batch",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+rows_archived = metrics.Counter("archive_rows_total", "Rows moved to archive tables", ["table"])
+
+def _copy(hot, archived, lot_ids):
+    columns = [column.name for column in hot.__table__.columns]
+    key = hot.id if hot is Lot else hot.lot_id
+    return insert(archived).from_select(columns, select(*(hot.__table__.c[name] for name in columns)).where(key.in_(lot_ids)))
+
+def _candidates(cutoff):
+    return (
+        select(Lot.id).where(Lot.status.in_(FINISHED_STATUSES), Lot.closed_at < cutoff)
+        .order_by(Lot.closed_at).limit(ARCHIVE_BATCH_SIZE).with_for_update(skip_locked=True)
+    )
+
+async def _backfill_closed_at():
+    # Лоти, завершені до появи closed_at у продажу: відлік до архівації - від зараз
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(Lot).where(Lot.id.in_(
+                select(Lot.id).where(Lot.status.in_(FINISHED_STATUSES), Lot.closed_at.is_(None)).limit(ARCHIVE_BATCH_SIZE).scalar_subquery()
+            )).values(closed_at=clock.now()),
+            execution_options={"synchronize_session": False},
+        )
+        await db.commit()
+
+async def archive_batch():
+    """Переносить один пакет лотів; повертає кількість перенесених лотів"""
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        lot_ids = list((await db.execute(_candidates(clock.now() - timedelta(days=ARCHIVE_AFTER_DAYS)))).scalars())
+        if not lot_ids:
+            return 0
+
+        # 1. Копії в архів
+        for hot, archived in TABLES:
+            result = await db.execute(_copy(hot, archived, lot_ids))
+            rows_archived.inc(result.rowcount, table=hot.__tablename__)
+
+        # 2. Видалення з гарячих таблиць: залежні рядки, потім лоти.
+        # Автоматичні ставки і список спостереження завершених лотів не потрібні
+        for model in (LotImage, ProxyBid, WatchlistItem, Bid, Payment):
+            await db.execute(delete(model).where(model.lot_id.in_(lot_ids)), execution_options={"synchronize_session": False})
+        await db.execute(delete(Lot).where(Lot.id.in_(lot_ids)), execution_options={"synchronize_session": False})
+
+        cache.invalidate_lot(db, *lot_ids)
+        await db.commit()
+    batch_duration.observe(time.perf_counter() - started)
+    return len(lot_ids)
+
+async def sweep_archive():
+    """Фонова задача: до ARCHIVE_MAX_BATCHES пакетів за прохід"""
+    await _backfill_closed_at()
+    archived = 0
+    for _ in range(ARCHIVE_MAX_BATCHES):
+        moved = await archive_batch()
+        archived += moved
+        if moved < ARCHIVE_BATCH_SIZE:
+            break
+    if archived:
+        logger.info("Archived finished lots", extra={"lots": archived})
+    return archived
@@ -1,4 +1,7 @@
 import os
+import json
+import time
+import asyncio
 from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
@@ -6,10 +9,44 @@ from jose import jwt
 from jose.exceptions import JOSEError
 import httpx
 
+import tracing
+
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Локальний JWKS замість Auth0 (навантажувальні тести, офлайн-розробка)
+AUTH0_JWKS_FILE = os.getenv("AUTH0_JWKS_FILE")
+# Ключі Auth0 змінюються рідко - не тягнемо їх на кожен запит
+AUTH0_JWKS_TTL_SECONDS = float(os.getenv("AUTH0_JWKS_TTL_SECONDS", "3600"))
+
+_jwks_cache = {"jwks": None, "fetched_at": 0.0}
+_jwks_lock = asyncio.Lock()
+
+def _read_jwks_file():
+    with open(AUTH0_JWKS_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+async def get_jwks(url, force=False):
+    """JWKS з кешу; force=True - перечитати (напр. невідомий kid після ротації ключів)"""
+    fresh = time.monotonic() - _jwks_cache["fetched_at"] < AUTH0_JWKS_TTL_SECONDS
+    if _jwks_cache["jwks"] is not None and fresh and not force:
+        return _jwks_cache["jwks"]
+
+    async with _jwks_lock:
+        # Поки чекали на замок, інший запит міг уже оновити кеш
+        if _jwks_cache["jwks"] is not None and time.monotonic() - _jwks_cache["fetched_at"] < 1:
+            return _jwks_cache["jwks"]
+        if AUTH0_JWKS_FILE:
+            jwks = await asyncio.to_thread(_read_jwks_file)
+        else:
+            async with httpx.AsyncClient() as client:
+                response = await client.get(url)
+                jwks = response.json()
+        _jwks_cache["jwks"] = jwks
+        _jwks_cache["fetched_at"] = time.monotonic()
+        return jwks
+
 class VerifyToken:
     """Перевіряє токен Auth0"""
     def __init__(self):
@@ -18,11 +55,23 @@ class VerifyToken:
         self.algorithm = os.getenv("AUTH0_ALGORITHM")
         self.jwks_url = f"https://{self.domain}/.well-known/jwks.json"
 
+    @staticmethod
+    def _find_key(jwks, kid):
+        for key in jwks["keys"]:
+            if key["kid"] == kid:
+                return {
+                    "kty": key["kty"],
+                    "kid": key["kid"],
+                    "use": key["use"],
+                    "n": key["n"],
+                    "e": key["e"]
+                }
+        return {}
+
     async def verify(self, token: str):
-        # 1. Отримуємо публічні ключі (JWKS) від Auth0
-        async with httpx.AsyncClient() as client:
-            response = await client.get(self.jwks_url)
-            jwks = response.json()
+        # 1. Отримуємо публічні ключі (JWKS) від Auth0 (з кешу)
+        with tracing.span("auth.jwks_fetch", url=self.jwks_url):
+            jwks = await get_jwks(self.jwks_url)
 
         # 2. Декодуємо заголовок токена
         try:
@@ -31,16 +80,11 @@ class VerifyToken:
             raise HTTPException(status_code=401, detail="Invalid header")
 
         # 3. Шукаємо правильний ключ
-        rsa_key = {}
-        for key in jwks["keys"]:
-            if key["kid"] == unverified_header["kid"]:
-                rsa_key = {
-                    "kty": key["kty"],
-                    "kid": key["kid"],
-                    "use": key["use"],
-                    "n": key["n"],
-                    "e": key["e"]
-                }
+        rsa_key = self._find_key(jwks, unverified_header.get("kid"))
+        if not rsa_key:
+            # Можливо, Auth0 змінив ключі - оновлюємо кеш один раз
+            jwks = await get_jwks(self.jwks_url, force=True)
+            rsa_key = self._find_key(jwks, unverified_header.get("kid"))
         
         if not rsa_key:
             raise HTTPException(status_code=401, detail="Unable to find appropriate key")
@@ -68,6 +112,7 @@ token_auth_scheme = HTTPBearer()
 
 async def get_current_user(token: HTTPAuthorizationCredentials = Depends(token_auth_scheme)):
     """Цю функцію ми будемо вставляти в ендпоінти"""
-    validator = VerifyToken()
-    payload = await validator.verify(token.credentials)
+    with tracing.span("auth.verify"):
+        validator = VerifyToken()
+        payload = await validator.verify(token.credentials)
     return payload
\ No newline at end of file
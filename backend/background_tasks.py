@@ -1,203 +1,260 @@
 # backend/background_tasks.py
 import asyncio
-from datetime import datetime, timezone, timedelta
+import logging
+import time
+from datetime import timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import and_, delete
 from sqlalchemy.orm import joinedload
 from database import AsyncSessionLocal
 from models import Lot, Bid, Notification
+import archive
+import ban_jobs
+import cache
+import clock
+import idempotency
+import metrics
+import outbid
+import querystats
+import tracing
 
-async def check_expired_payments():
+logger = logging.getLogger(__name__)
+
+sweep_duration = metrics.Histogram(
+    "task_sweep_duration_seconds", "Duration of one background sweep", ["task"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+sweep_rows = metrics.Counter("task_rows_processed_total", "Rows processed by background sweeps", ["task"])
+sweep_errors = metrics.Counter("task_errors_total", "Failed background sweeps", ["task"])
+sweep_last_success = metrics.Gauge("task_last_success_timestamp_seconds", "Unix time of the last successful sweep", ["task"])
+payment_expirations = metrics.Counter("payment_expirations_total", "Unpaid wins that expired", ["outcome"])
+lots_auto_closed = metrics.Counter("lots_auto_closed_total", "Lots closed for inactivity")
+
+async def run_periodic(name, sweep, interval):
+    """
+    Нескінченний цикл фонової задачі: один прохід sweep() кожні interval секунд.
+    sweep() повертає кількість оброблених рядків.
+    """
+    while True:
+        started = time.perf_counter()
+        try:
+            with tracing.start_trace(f"task {name}", task=name) as root, querystats.track(f"task:{name}"):
+                processed = await sweep()
+                if root is not None:
+                    root.set(processed=processed or 0)
+            sweep_rows.inc(processed or 0, task=name)
+            sweep_last_success.set(time.time(), task=name)
+        except Exception:
+            sweep_errors.inc(task=name)
+            logger.exception("Background task %s failed", name)
+        finally:
+            sweep_duration.observe(time.perf_counter() - started, task=name)
+
+        await clock.sleep(interval)
+
+async def sweep_expired_payments():
     """
     Задача 1: Перевіряє прострочені оплати.
     - Видаляє ставку переможця (HARD DELETE).
     - Надсилає сповіщення про провал.
     - Передає перемогу наступному.
     """
-    while True:
-        try:
-            async with AsyncSessionLocal() as db:
-                now = datetime.now(timezone.utc)
+    async with AsyncSessionLocal() as db:
+        now = clock.now()
+        
+        # Шукаємо лоти, де час оплати вийшов
+        query = select(Lot).where(
+            and_(
+                Lot.status == "pending_payment",
+                Lot.payment_deadline < now
+            )
+        )
+        result = await db.execute(query)
+        expired_lots = result.scalars().all()
+        
+        for lot in expired_lots:
+            logger.info("Processing expired lot", extra={"lot_id": lot.id})
+            
+            # Знаходимо поточного "переможця", який не заплатив
+            current_winner_bid_q = select(Bid).where(
+                Bid.lot_id == lot.id, 
+                Bid.is_active == True
+            ).order_by(Bid.amount.desc()).limit(1)
+            
+            cw_res = await db.execute(current_winner_bid_q)
+            failed_bid = cw_res.scalar_one_or_none()
+            
+            if failed_bid:
+                # 1. Зберігаємо дані для сповіщення
+                failed_user_id = failed_bid.user_id
                 
-                # Шукаємо лоти, де час оплати вийшов
-                query = select(Lot).where(
-                    and_(
-                        Lot.status == "pending_payment",
-                        Lot.payment_deadline < now
-                    )
+                # 2. HARD DELETE - Видаляємо ставку повністю
+                await db.delete(failed_bid)
+                
+                # 3. Сповіщення невдасі
+                fail_notif = Notification(
+                    user_id=failed_user_id,
+                    message=f"⏰ Час на оплату лота '{lot.title}' вичерпано. Вашу перемогу анульовано та ставку видалено."
                 )
-                result = await db.execute(query)
-                expired_lots = result.scalars().all()
+                db.add(fail_notif)
                 
-                for lot in expired_lots:
-                    print(f"[TASK] Processing expired lot #{lot.id}")
-                    
-                    # Знаходимо поточного "переможця", який не заплатив
-                    current_winner_bid_q = select(Bid).where(
-                        Bid.lot_id == lot.id, 
-                        Bid.is_active == True
-                    ).order_by(Bid.amount.desc()).limit(1)
-                    
-                    cw_res = await db.execute(current_winner_bid_q)
-                    failed_bid = cw_res.scalar_one_or_none()
-                    
-                    if failed_bid:
-                        # 1. Зберігаємо дані для сповіщення
-                        failed_user_id = failed_bid.user_id
-                        
-                        # 2. HARD DELETE - Видаляємо ставку повністю
-                        await db.delete(failed_bid)
-                        
-                        # 3. Сповіщення невдасі
-                        fail_notif = Notification(
-                            user_id=failed_user_id,
-                            message=f"⏰ Час на оплату лота '{lot.title}' вичерпано. Вашу перемогу анульовано та ставку видалено."
-                        )
-                        db.add(fail_notif)
-                        
-                        print(f"   -> Bid #{failed_bid.id} deleted due to expiration.")
+                logger.info("Bid deleted due to payment expiration", extra={"lot_id": lot.id, "bid_id": failed_bid.id})
 
-                        # 4. Шукаємо наступного (тепер після видалення попередньої ставки)
-                        next_bid_q = select(Bid).where(
-                            Bid.lot_id == lot.id, 
-                            Bid.is_active == True
-                        ).order_by(Bid.amount.desc()).limit(1)
-                        
-                        next_res = await db.execute(next_bid_q)
-                        next_bid = next_res.scalar_one_or_none()
-                        
-                        if next_bid:
-                            # Новий переможець
-                            lot.current_price = next_bid.amount
-                            lot.payment_deadline = now + timedelta(
-                                days=lot.payment_deadline_days,
-                                hours=lot.payment_deadline_hours,
-                                minutes=lot.payment_deadline_minutes
-                            )
-                            
-                            # Сповіщення новому переможцю
-                            new_win_notif = Notification(
-                                user_id=next_bid.user_id,
-                                message=f"🎉 Попередній переможець не заплатив! Тепер ви виграли лот '{lot.title}'. Оплатіть до {lot.payment_deadline.strftime('%d.%m %H:%M')}."
-                            )
-                            db.add(new_win_notif)
-                            print(f"   -> New winner found: User #{next_bid.user_id}")
-                        else:
-                            # Нікого немає -> Лот знову активний, ціна повертається до стартової
-                            lot.status = "active"
-                            lot.current_price = lot.start_price
-                            lot.payment_deadline = None
-                            
-                            seller_notif = Notification(
-                                user_id=lot.seller_id,
-                                message=f"⚠️ Переможець лота '{lot.title}' не оплатив, і інших ставок немає. Лот знову активний з початковою ціною ${lot.start_price}."
-                            )
-                            db.add(seller_notif)
-                            print("   -> No other bids. Lot set to ACTIVE with start price.")
+                # 4. Шукаємо наступного (тепер після видалення попередньої ставки)
+                next_bid_q = select(Bid).where(
+                    Bid.lot_id == lot.id, 
+                    Bid.is_active == True
+                ).order_by(Bid.amount.desc()).limit(1)
                 
-                await db.commit()
-
-        except Exception as e:
-            print(f"[Check Expired Error]: {e}")
+                next_res = await db.execute(next_bid_q)
+                next_bid = next_res.scalar_one_or_none()
+                
+                if next_bid:
+                    # Новий переможець
+                    lot.current_price = next_bid.amount
+                    lot.payment_deadline = now + timedelta(
+                        days=lot.payment_deadline_days,
+                        hours=lot.payment_deadline_hours,
+                        minutes=lot.payment_deadline_minutes
+                    )
+                    
+                    # Сповіщення новому переможцю
+                    new_win_notif = Notification(
+                        user_id=next_bid.user_id,
+                        message=f"🎉 Попередній переможець не заплатив! Тепер ви виграли лот '{lot.title}'. Оплатіть до {lot.payment_deadline.strftime('%d.%m %H:%M')}."
+                    )
+                    db.add(new_win_notif)
+                    payment_expirations.inc(outcome="next_winner")
+                    logger.info("New winner found", extra={"lot_id": lot.id, "user_id": next_bid.user_id})
+                else:
+                    # Нікого немає -> Лот знову активний, ціна повертається до стартової
+                    lot.status = "active"
+                    lot.current_price = lot.start_price
+                    lot.payment_deadline = None
+                    
+                    seller_notif = Notification(
+                        user_id=lot.seller_id,
+                        message=f"⚠️ Переможець лота '{lot.title}' не оплатив, і інших ставок немає. Лот знову активний з початковою ціною ${lot.start_price}."
+                    )
+                    db.add(seller_notif)
+                    payment_expirations.inc(outcome="reactivated")
+                    logger.info("No other bids, lot reactivated with start price", extra={"lot_id": lot.id})
         
-        await asyncio.sleep(10) # Перевірка кожні 10 сек
+        cache.invalidate_lot(db, *[lot.id for lot in expired_lots])
+        await db.commit()
+        return len(expired_lots)
 
-async def delete_old_cancelled_bids():
+async def sweep_old_cancelled_bids():
     """
     Задача 2: Видаляє ставки, які були скасовані (cancelled_at) більше 10 хвилин тому.
     ПРИМІТКА: У поточній версії ми робимо HARD DELETE одразу, тому ця задача не використовується.
     Залишаємо на випадок майбутньої зміни логіки на SOFT DELETE.
     """
-    while True:
-        try:
-            async with AsyncSessionLocal() as db:
-                now = datetime.now(timezone.utc)
-                cutoff_time = now - timedelta(minutes=10)
-                
-                # Знаходимо неактивні ставки старше 10 хвилин
-                # (У поточній версії таких не буде, бо ми робимо HARD DELETE)
-                query = select(Bid).where(
-                    and_(
-                        Bid.is_active == False,
-                        Bid.timestamp < cutoff_time
-                    )
-                )
-                result = await db.execute(query)
-                bids_to_delete = result.scalars().all()
-                
-                if bids_to_delete:
-                    print(f"[CLEANUP] Found {len(bids_to_delete)} old cancelled bids. Deleting...")
-                    for bid in bids_to_delete:
-                        await db.delete(bid)
-                    
-                    await db.commit()
-                    print(f"   -> Deleted successfully.")
-                    
-        except Exception as e:
-            print(f"[Cleanup Bids Error]: {e}")
+    async with AsyncSessionLocal() as db:
+        now = clock.now()
+        cutoff_time = now - timedelta(minutes=10)
+        
+        # Знаходимо неактивні ставки старше 10 хвилин
+        # (У поточній версії таких не буде, бо ми робимо HARD DELETE)
+        query = select(Bid).where(
+            and_(
+                Bid.is_active == False,
+                Bid.timestamp < cutoff_time
+            )
+        )
+        result = await db.execute(query)
+        bids_to_delete = result.scalars().all()
+        
+        if bids_to_delete:
+            logger.info("Deleting old cancelled bids", extra={"count": len(bids_to_delete)})
+            for bid in bids_to_delete:
+                await db.delete(bid)
             
-        await asyncio.sleep(60) # Перевірка раз на хвилину
+            await db.commit()
+
+        return len(bids_to_delete)
 
-async def close_inactive_lots():
+async def sweep_inactive_lots():
     """
     Задача 3: Закриває лоти, які були активними без ставок 7+ днів
     """
-    while True:
-        try:
-            async with AsyncSessionLocal() as db:
-                now = datetime.now(timezone.utc)
-                # Час "Ч" = зараз мінус 7 днів
-                cutoff_time = now - timedelta(days=7)
-                
-                # Знаходимо лоти для закриття:
-                # 1. Статус = active
-                # 2. Створені більше 7 днів тому
-                # 3. Немає жодної активної ставки
-                query = select(Lot).where(
-                    and_(
-                        Lot.status == "active",
-                        Lot.created_at < cutoff_time
-                    )
-                )
-                result = await db.execute(query)
-                old_lots = result.scalars().all()
-                
-                for lot in old_lots:
-                    # Перевіряємо чи є активні ставки
-                    bids_query = select(Bid).where(
-                        Bid.lot_id == lot.id,
-                        Bid.is_active == True
-                    )
-                    bids_result = await db.execute(bids_query)
-                    active_bids = bids_result.scalars().all()
-                    
-                    # Якщо ставок немає - закриваємо
-                    if len(active_bids) == 0:
-                        lot.status = "closed_unsold"
-                        lot.closed_at = now
-                        
-                        # Сповіщення продавцю
-                        notification = Notification(
-                            user_id=lot.seller_id,
-                            message=f"⏰ Ваш лот '{lot.title}' був автоматично закритий через відсутність ставок протягом 7 днів."
-                        )
-                        db.add(notification)
-                        
-                        print(f"[AUTO-CLOSE] Lot #{lot.id} '{lot.title}' closed due to inactivity (7+ days, no bids)")
-                
-                await db.commit()
-                
-        except Exception as e:
-            print(f"[Close Inactive Lots Error]: {e}")
+    async with AsyncSessionLocal() as db:
+        now = clock.now()
+        # Час "Ч" = зараз мінус 7 днів
+        cutoff_time = now - timedelta(days=7)
+        
+        # Знаходимо лоти для закриття:
+        # 1. Статус = active
+        # 2. Створені більше 7 днів тому
+        # 3. Немає жодної активної ставки (перевірка в тому ж запиті, а не
+        #    окремим SELECT на кожен старий лот: лоти зі ставками, які продавець
+        #    не закриває, інакше перевірялися б щогодини заново)
+        active_bid = select(Bid.id).where(Bid.lot_id == Lot.id, Bid.is_active == True).exists()
+        query = select(Lot).where(
+            and_(
+                Lot.status == "active",
+                Lot.created_at < cutoff_time,
+                ~active_bid
+            )
+        )
+        result = await db.execute(query)
+        old_lots = result.scalars().all()
+        
+        for lot in old_lots:
+            lot.status = "closed_unsold"
+            lot.closed_at = now
+            
+            # Сповіщення продавцю
+            notification = Notification(
+                user_id=lot.seller_id,
+                message=f"⏰ Ваш лот '{lot.title}' був автоматично закритий через відсутність ставок протягом 7 днів."
+            )
+            db.add(notification)
+            
+            logger.info("Lot closed due to inactivity (7+ days, no bids)", extra={"lot_id": lot.id})
         
-        # Перевірка раз на годину (3600 секунд)
-        await asyncio.sleep(3600)
+        cache.invalidate_lot(db, *[lot.id for lot in old_lots])
+        await db.commit()
+        lots_auto_closed.inc(len(old_lots))
+        return len(old_lots)
 
 async def start_background_tasks():
     """
     Запускає всі фонові задачі
     """
-    asyncio.create_task(check_expired_payments())
-    asyncio.create_task(delete_old_cancelled_bids())
-    asyncio.create_task(close_inactive_lots())
\ No newline at end of file
+    # Перевірка кожні 10 сек
+    asyncio.create_task(
+        run_periodic("check_expired_payments", sweep_expired_payments, 10),
+        name="check_expired_payments"
+    )
+    # Перевірка раз на хвилину
+    asyncio.create_task(
+        run_periodic("delete_old_cancelled_bids", sweep_old_cancelled_bids, 60),
+        name="delete_old_cancelled_bids"
+    )
+    # Перевірка раз на годину (3600 секунд)
+    asyncio.create_task(
+        run_periodic("close_inactive_lots", sweep_inactive_lots, 3600),
+        name="close_inactive_lots"
+    )
+    # Прострочені Idempotency-Key - раз на 5 хвилин
+    asyncio.create_task(
+        run_periodic("expire_idempotency_keys", idempotency.sweep_expired_keys, 300),
+        name="expire_idempotency_keys"
+    )
+    # Каскади бану, не запущені або покинуті воркером, що впав
+    asyncio.create_task(
+        run_periodic("ban_jobs", ban_jobs.sweep_ban_jobs, 10),
+        name="ban_jobs"
+    )
+    # Сповіщення "перебито": події зі ставок, коли лот стих
+    asyncio.create_task(
+        run_periodic("outbid_alerts", outbid.flush, outbid.OUTBID_FLUSH_INTERVAL),
+        name="outbid_alerts"
+    )
+    # Перенесення давно завершених лотів в архівні таблиці - раз на годину
+    asyncio.create_task(
+        run_periodic("archive_finished_lots", archive.sweep_archive, 3600),
+        name="archive_finished_lots"
+    )
\ No newline at end of file
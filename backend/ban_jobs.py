@@ -0,0 +1,228 @@
+# backend/ban_jobs.py
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from datetime import timedelta
+
+from sqlalchemy import delete, update, func, literal, or_, and_, insert
+from sqlalchemy.future import select
+
+from database import AsyncSessionLocal
+from models import BanJob, Lot, LotImage, Bid, Payment, ProxyBid, WatchlistItem, Notification, User
+import cache
+import clock
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Каскад бану у фоні.
+#
+# Запит адміна лише ставить прапорець бану, прибирає автоматичні ставки
+# і створює рядок ban_jobs - коміт одразу. Решту робить ця задача
+# пакетами по BAN_JOB_BATCH_SIZE лотів, кожен пакет - коротка транзакція:
+#   1. лоти забаненого: сповіщення учасникам одним INSERT ... SELECT,
+#      потім видалення картинок, ставок, оплат і самих лотів
+#   2. його активні ставки: деактивація і перерахунок цін лотів одним UPDATE
+# Лоти пакета блокуються в порядку id - як їх блокує ставка, тож ставки на
+# ці лоти чекають лише один короткий пакет, а не весь каскад.
+# Бан бере рядок користувача FOR UPDATE, а ставки і нові лоти перечитують
+# users.is_blocked під FOR SHARE (blocked_users) у своїй транзакції: вони
+# або комітяться до бану (і каскад їх бачить), або чекають його коміту і
+# відхиляються - запит, що пройшов автентифікацію до бану, не проскочить.
+# Розблокування скасовує задачу (cancel); кожен пакет під тим самим FOR
+# SHARE перевіряє, що бан і задача ще чинні, і бере лише лоти й ставки,
+# створені до бану, - перезапущена задача не зачепить нових даних.
+# Прогрес пишеться в ban_jobs у тій самій транзакції, що й пакет. Задачу
+# з простроченим heartbeat (воркер упав) підхоплює sweep_ban_jobs.
+
+BAN_JOB_BATCH_SIZE = int(os.getenv("BAN_JOB_BATCH_SIZE", "200"))
+BAN_JOB_STALE_SECONDS = float(os.getenv("BAN_JOB_STALE_SECONDS", "60"))
+BAN_JOB_MAX_ATTEMPTS = int(os.getenv("BAN_JOB_MAX_ATTEMPTS", "5"))
+
+batch_duration = metrics.Histogram(
+    "ban_job_batch_seconds", "Duration of one ban cascade batch", ["step"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+jobs_finished = metrics.Counter("ban_jobs_total", "Finished ban cascades", ["status"])
+
+class Cancelled(Exception):
+    """Користувача розблоковано - каскад зупиняється"""
+
+# Посилання на запущені задачі, щоб їх не зібрав GC
+_tasks = set()
+
+async def blocked_users(db, user_ids):
+    """Хто з user_ids заблокований - під FOR SHARE на рядках users до кінця транзакції"""
+    rows = await db.execute(
+        select(User.id, User.is_blocked).where(User.id.in_(user_ids)).order_by(User.id).with_for_update(read=True)
+    )
+    return {user_id for user_id, is_blocked in rows if is_blocked}
+
+async def create(db, user, admin_id):
+    """Задача каскаду в транзакції бану; обсяг роботи - для прогресу"""
+    lots_total = (await db.execute(select(func.count()).select_from(Lot).where(Lot.seller_id == user.id))).scalar()
+    bid_lots_total = (await db.execute(
+        select(func.count(func.distinct(Bid.lot_id))).where(Bid.user_id == user.id, Bid.is_active == True)
+    )).scalar()
+    # created_at - межа каскаду; час з clock, як у created_at лотів і ставок
+    job = BanJob(
+        user_id=user.id, admin_id=admin_id, status="pending", lots_total=lots_total, bid_lots_total=bid_lots_total,
+        created_at=clock.now(),
+    )
+    db.add(job)
+    await db.flush()
+    return job
+
+async def cancel(db, user_id):
+    """Розблокування: незавершені каскади користувача скасовуються в транзакції виклику"""
+    result = await db.execute(
+        update(BanJob).where(BanJob.user_id == user_id, BanJob.status.in_(("pending", "running")))
+        .values(status="cancelled", finished_at=clock.now()),
+        execution_options={"synchronize_session": False},
+    )
+    jobs_finished.inc(result.rowcount, status="cancelled")
+
+def start(job_id):
+    """Запускає каскад у цьому воркері (після коміту бану)"""
+    # Порожній контекст: без лічильника запитів і дедлайну HTTP-запиту адміна
+    # (Context().run, бо create_task(context=...) є лише з Python 3.11)
+    task = contextvars.Context().run(asyncio.create_task, run(job_id), name=f"ban_job:{job_id}")
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+def _claimable():
+    stale = clock.now() - timedelta(seconds=BAN_JOB_STALE_SECONDS)
+    return or_(BanJob.status == "pending", and_(BanJob.status == "running", BanJob.heartbeat_at < stale))
+
+async def _claim(job_id):
+    # Один UPDATE: з двох воркерів, що побачили ту саму задачу, її отримає один
+    async with AsyncSessionLocal() as db:
+        query = update(BanJob).where(BanJob.id == job_id, _claimable()).values(
+            status="running", heartbeat_at=clock.now(), attempts=BanJob.attempts + 1,
+        ).returning(BanJob.user_id, BanJob.attempts, BanJob.created_at)
+        claimed = (await db.execute(query)).first()
+        await db.commit()
+        return claimed
+
+async def _progress(db, job_id, **increments):
+    values = {name: getattr(BanJob, name) + amount for name, amount in increments.items()}
+    await db.execute(update(BanJob).where(BanJob.id == job_id).values(heartbeat_at=clock.now(), **values))
+
+async def _still_banned(db, job_id):
+    # FOR SHARE на рядку користувача: розблокування чекає кінця пакета
+    row = (await db.execute(
+        select(User.is_blocked, BanJob.status).join(BanJob, BanJob.user_id == User.id)
+        .where(BanJob.id == job_id).with_for_update(read=True, of=User)
+    )).first()
+    return row is not None and row.is_blocked and row.status == "running"
+
+async def _delete_lots_batch(job_id, user_id, cutoff):
+    async with AsyncSessionLocal() as db:
+        if not await _still_banned(db, job_id):
+            raise Cancelled()
+        lot_ids = list((await db.execute(
+            select(Lot.id).where(Lot.seller_id == user_id, Lot.created_at <= cutoff).order_by(Lot.id).limit(BAN_JOB_BATCH_SIZE).with_for_update()
+        )).scalars())
+        if not lot_ids:
+            return False
+
+        # 1. Сповіщення всім, хто мав активні ставки, - одним запитом
+        bidders = select(
+            Bid.user_id,
+            literal("Лот '") + Lot.title + literal("' видалено: продавця заблоковано. Вашу ставку скасовано."),
+        ).join(Lot, Lot.id == Bid.lot_id).where(
+            Bid.lot_id.in_(lot_ids), Bid.is_active == True, Bid.user_id != user_id,
+        ).distinct()
+        notified = (await db.execute(insert(Notification).from_select(["user_id", "message"], bidders))).rowcount
+
+        # 2. Залежні рядки і самі лоти - по запиту на таблицю
+        for model in (LotImage, ProxyBid, WatchlistItem, Bid, Payment):
+            await db.execute(delete(model).where(model.lot_id.in_(lot_ids)), execution_options={"synchronize_session": False})
+        await db.execute(delete(Lot).where(Lot.id.in_(lot_ids)), execution_options={"synchronize_session": False})
+
+        await _progress(db, job_id, lots_deleted=len(lot_ids), notifications_sent=notified)
+        cache.invalidate_lot(db, *lot_ids)
+        await db.commit()
+        return True
+
+async def _release_bids_batch(job_id, user_id, cutoff):
+    async with AsyncSessionLocal() as db:
+        if not await _still_banned(db, job_id):
+            raise Cancelled()
+        before_ban = and_(Bid.user_id == user_id, Bid.is_active == True, Bid.timestamp <= cutoff)
+        lot_ids = list((await db.execute(
+            select(Bid.lot_id).where(before_ban).distinct().order_by(Bid.lot_id).limit(BAN_JOB_BATCH_SIZE)
+        )).scalars())
+        if not lot_ids:
+            return False
+
+        # 1. Лоти - під замок до зміни ставок, як у place_bid
+        await db.execute(select(Lot.id).where(Lot.id.in_(lot_ids)).order_by(Lot.id).with_for_update())
+        await db.execute(
+            update(Bid).where(before_ban, Bid.lot_id.in_(lot_ids)).values(is_active=False),
+            execution_options={"synchronize_session": False},
+        )
+
+        # 2. Нова ціна активних лотів: найвища ставка, що лишилась, або стартова
+        best = select(func.max(Bid.amount)).where(Bid.lot_id == Lot.id, Bid.is_active == True).scalar_subquery()
+        await db.execute(
+            update(Lot).where(Lot.id.in_(lot_ids), Lot.status == "active").values(current_price=func.coalesce(best, Lot.start_price)),
+            execution_options={"synchronize_session": False},
+        )
+
+        await _progress(db, job_id, bid_lots_done=len(lot_ids))
+        cache.invalidate_lot(db, *lot_ids)
+        await db.commit()
+        return True
+
+async def _finish(job_id, status, error=None):
+    async with AsyncSessionLocal() as db:
+        # Скасовану розблокуванням задачу не перезаписуємо
+        result = await db.execute(update(BanJob).where(BanJob.id == job_id, BanJob.status == "running").values(
+            status=status, error=error, heartbeat_at=clock.now(),
+            finished_at=clock.now() if status != "pending" else None,
+        ))
+        await db.commit()
+    if status != "pending" and result.rowcount:
+        jobs_finished.inc(status=status)
+
+async def run(job_id):
+    """Виконує задачу, якщо вдалося її зайняти; повертає True, якщо займала"""
+    claimed = await _claim(job_id)
+    if claimed is None:
+        return False
+    user_id, attempts, cutoff = claimed
+    logger.info("Ban cascade started", extra={"job_id": job_id, "user_id": user_id, "attempt": attempts})
+
+    try:
+        for step, batch in (("lots", _delete_lots_batch), ("bids", _release_bids_batch)):
+            while True:
+                started = time.perf_counter()
+                more = await batch(job_id, user_id, cutoff)
+                batch_duration.observe(time.perf_counter() - started, step=step)
+                if not more:
+                    break
+    except Cancelled:
+        await _finish(job_id, "cancelled")
+        logger.info("Ban cascade cancelled: user unblocked", extra={"job_id": job_id, "user_id": user_id})
+        return True
+    except Exception as e:
+        # Зроблені пакети закомічені; наступна спроба продовжить з місця зупинки
+        logger.exception("Ban cascade failed", extra={"job_id": job_id, "user_id": user_id, "attempt": attempts})
+        await _finish(job_id, "failed" if attempts >= BAN_JOB_MAX_ATTEMPTS else "pending", error=str(e)[:1000])
+        return True
+
+    await _finish(job_id, "done")
+    logger.info("Ban cascade finished", extra={"job_id": job_id, "user_id": user_id})
+    return True
+
+async def sweep_ban_jobs():
+    """Фонова задача: незапущені, відкладені після помилки і покинуті каскади"""
+    async with AsyncSessionLocal() as db:
+        job_ids = list((await db.execute(select(BanJob.id).where(_claimable()).order_by(BanJob.id).limit(10))).scalars())
+    processed = 0
+    for job_id in job_ids:
+        processed += await run(job_id)
+    return processed
@@ -0,0 +1,74 @@
+# backend/broadcasts.py
+import logging
+
+from sqlalchemy import and_, or_, exists, func, literal, true, union_all
+from sqlalchemy.future import select
+
+from models import Broadcast, Notification, Lot, Bid, User
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Розсилки: сповіщення для всіх або сегмента користувачів.
+#
+# Рядок на користувача (як у notifications) на мільйоні користувачів -
+# мільйон вставок і оновлень індексу на одне оголошення. Тут розсилка -
+# один рядок broadcasts, а стан прочитання - один "водяний знак" на
+# користувача: users.broadcasts_read_id, найбільший прочитаний id.
+# Непрочитані - видимі розсилки з id більшим за нього; "прочитати все"
+# просто пересуває його на останню розсилку.
+#
+# Сегмент перевіряється в момент читання (ліниво) за поточним станом
+# користувача. Користувач бачить розсилки лише від своєї реєстрації.
+
+# Ключ сегмента -> умова на користувача з id user_id
+SEGMENTS = {
+    "all": lambda user_id: true(),
+    "admins": lambda user_id: exists().where(User.id == user_id, User.is_admin == True),
+    "sellers": lambda user_id: exists().where(Lot.seller_id == user_id),
+    "bidders": lambda user_id: exists().where(Bid.user_id == user_id, Bid.is_active == True),
+}
+
+broadcasts_created = metrics.Counter("broadcasts_created_total", "Broadcast notifications created", ["segment"])
+
+def create(db, message, segment="all"):
+    """Розсилка в транзакції виклику"""
+    if segment not in SEGMENTS:
+        raise ValueError(f"Unknown segment: {segment}")
+    broadcast = Broadcast(message=message, segment=segment)
+    db.add(broadcast)
+    broadcasts_created.inc(segment=segment)
+    return broadcast
+
+def visible_to(user):
+    # Умови сегментів не залежать від рядка розсилки - Postgres рахує кожну раз на запит
+    return and_(
+        Broadcast.created_at >= user.created_at,
+        or_(*(and_(Broadcast.segment == name, condition(user.id)) for name, condition in SEGMENTS.items())),
+    )
+
+def feed_query(user):
+    """Особисті сповіщення і розсилки одним запитом, новіші спершу"""
+    personal = select(
+        Notification.id, Notification.message, Notification.is_read, Notification.created_at,
+        literal(False).label("broadcast"),
+    ).where(Notification.user_id == user.id)
+    shared = select(
+        Broadcast.id, Broadcast.message, (Broadcast.id <= user.broadcasts_read_id).label("is_read"), Broadcast.created_at,
+        literal(True).label("broadcast"),
+    ).where(visible_to(user))
+    feed = union_all(personal, shared).subquery()
+    return select(feed).order_by(feed.c.created_at.desc(), feed.c.id.desc())
+
+def unread_count_query(user):
+    personal = select(func.count()).select_from(Notification).where(
+        Notification.user_id == user.id, Notification.is_read == False,
+    ).scalar_subquery()
+    shared = select(func.count()).select_from(Broadcast).where(
+        Broadcast.id > user.broadcasts_read_id, visible_to(user),
+    ).scalar_subquery()
+    return select(personal + shared)
+
+def latest_id():
+    """Для "прочитати все": id останньої розсилки (0, якщо їх немає)"""
+    return select(func.coalesce(func.max(Broadcast.id), 0)).scalar_subquery()
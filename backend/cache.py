@@ -0,0 +1,391 @@
+# backend/cache.py
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+
+import asyncpg
+from fastapi import HTTPException, Request
+from sqlalchemy import event, literal_column, text, update
+from sqlalchemy.orm import Session
+
+import metrics
+import conditional
+from database import engine, ReadSessionLocal, ReplicaRouter
+from models import Lot, lot_version_seq
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# --- НАЛАШТУВАННЯ ---
+# Загальний TTL (правила сайту тощо)
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "60"))
+# Гарантія: закешована ціна ніколи не старша за цю межу,
+# навіть якщо повідомлення про інвалідацію загубилось
+CACHE_MAX_PRICE_STALENESS_SECONDS = float(os.getenv("CACHE_MAX_PRICE_STALENESS_SECONDS", "5"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+# "local" - інвалідація тільки в межах процесу (dev, один воркер)
+# "postgres" - інвалідації розсилаються іншим воркерам через LISTEN/NOTIFY
+CACHE_BROADCAST = os.getenv("CACHE_BROADCAST", "local")
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1") == "1"
+# Конкурентні промахи по одному ключу виконують один запит до БД
+COALESCE_ENABLED = os.getenv("COALESCE_ENABLED", "1") == "1"
+COALESCE_TIMEOUT_SECONDS = float(os.getenv("COALESCE_TIMEOUT_SECONDS", "10"))
+
+INVALIDATION_CHANNEL = "cache_invalidation"
+# NOTIFY обмежений 8000 байт - більші пакети замінюємо на повне очищення
+_MAX_NOTIFY_PAYLOAD = 7000
+
+WORKER_ID = uuid.uuid4().hex[:12]
+
+cache_hits = metrics.Counter("cache_hits_total", "Cache hits", ["namespace"])
+cache_misses = metrics.Counter("cache_misses_total", "Cache misses", ["namespace"])
+cache_invalidations = metrics.Counter("cache_invalidations_total", "Cache invalidations", ["source"])
+
+def lot_key(lot_id):
+    return f"lot:{lot_id}"
+
+def bids_key(lot_id):
+    return f"bids:{lot_id}"
+
+def lots_page_key(skip, limit):
+    return f"lots:page:{skip}:{limit}"
+
+LOTS_PAGE_PREFIX = "lots:page:"
+RULES_KEY = "rules"
+
+class LocalBackend:
+    """
+    In-process LRU з TTL.
+    Зберігає вже серіалізовані JSON-байти разом з ETag, тому попадання
+    в кеш не торкається ні БД, ні Pydantic.
+    """
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        # Лічильник інвалідацій: захищає від запису застарілого значення,
+        # якщо інвалідація відбулась, поки ми читали з БД
+        self._stamp = 0
+        self._invalidated_at = OrderedDict()
+        self._prefix_invalidated_at = {}
+        # Час останньої інвалідації (для вибору між реплікою і primary)
+        self._changed_at = OrderedDict()
+        self._prefix_changed_at = {}
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def token(self):
+        return self._stamp
+
+    def set(self, key, value, ttl, token=None):
+        if token is not None and self._is_invalidated_since(key, token):
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def epoch(self, key):
+        """Номер останньої інвалідації, що зачепила ключ"""
+        stamp = self._invalidated_at.get(key, 0)
+        for prefix, prefix_stamp in self._prefix_invalidated_at.items():
+            if prefix_stamp > stamp and key.startswith(prefix):
+                stamp = prefix_stamp
+        return stamp
+
+    def changed_within(self, key, seconds):
+        threshold = time.monotonic() - seconds
+        if self._changed_at.get(key, float("-inf")) >= threshold:
+            return True
+        return any(
+            changed_at >= threshold and key.startswith(prefix)
+            for prefix, changed_at in self._prefix_changed_at.items()
+        )
+
+    def _is_invalidated_since(self, key, token):
+        return self.epoch(key) > token
+
+    def delete(self, keys=(), prefixes=()):
+        self._stamp += 1
+        now = time.monotonic()
+        for key in keys:
+            self._data.pop(key, None)
+            self._invalidated_at[key] = self._stamp
+            self._invalidated_at.move_to_end(key)
+            self._changed_at[key] = now
+            self._changed_at.move_to_end(key)
+        while len(self._invalidated_at) > self.max_entries:
+            self._invalidated_at.popitem(last=False)
+        while len(self._changed_at) > self.max_entries:
+            self._changed_at.popitem(last=False)
+        for prefix in prefixes:
+            self._prefix_invalidated_at[prefix] = self._stamp
+            self._prefix_changed_at[prefix] = now
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+
+    def clear(self):
+        self._stamp += 1
+        self._data.clear()
+        # Все, що читалось до цього моменту, вважаємо застарілим
+        self._prefix_invalidated_at[""] = self._stamp
+        self._prefix_changed_at[""] = time.monotonic()
+
+    def __len__(self):
+        return len(self._data)
+
+backend = LocalBackend()
+
+flights = SingleFlight("cache")
+
+metrics.Gauge("cache_entries", "Entries in the local cache", function=lambda: len(backend))
+metrics.Gauge("singleflight_inflight", "Loads currently in flight", function=lambda: flights.inflight())
+
+def _namespace(key):
+    return key.split(":", 1)[0]
+
+async def get_or_load(
+    key,
+    loader,
+    ttl=CACHE_MAX_PRICE_STALENESS_SECONDS,
+    request: Request = None,
+    validator=None,
+    cache_control=conditional.CACHE_CONTROL_REVALIDATE,
+):
+    """
+    Read-through: повертає JSON-відповідь з кешу або викликає loader().
+    loader - корутина, що повертає (байти JSON, ETag).
+    Вона має відкривати власну сесію: при об'єднанні запитів завантаження
+    може пережити запит, який його запустив.
+
+    validator - дешева корутина, що повертає поточний ETag (або None).
+    Якщо клієнт прислав If-None-Match і він збігся - відповідаємо 304
+    без важкого запиту.
+    """
+    conditional_request = request is not None and "if-none-match" in request.headers
+
+    if CACHE_ENABLED:
+        cached = backend.get(key)
+        if cached is not None:
+            cache_hits.inc(namespace=_namespace(key))
+            body, etag = cached
+            if conditional_request and conditional.etag_matches(request, etag):
+                return conditional.not_modified(etag, cache_control)
+            return conditional.json_response(body, etag, cache_control)
+        cache_misses.inc(namespace=_namespace(key))
+
+    if conditional_request and validator is not None:
+        etag = await validator()
+        if conditional.etag_matches(request, etag):
+            return conditional.not_modified(etag, cache_control)
+
+    body, etag = await _load(key, loader, ttl)
+    return conditional.json_response(body, etag, cache_control)
+
+async def fetch(key, loader, ttl=CACHE_MAX_PRICE_STALENESS_SECONDS):
+    """
+    Те саме читання через кеш, але повертає (байти JSON, ETag) замість
+    відповіді - для складених сторінок (routers/views.py), які вклеюють
+    кілька закешованих тіл в одну відповідь.
+    """
+    if CACHE_ENABLED:
+        cached = backend.get(key)
+        if cached is not None:
+            cache_hits.inc(namespace=_namespace(key))
+            return cached
+        cache_misses.inc(namespace=_namespace(key))
+    return await _load(key, loader, ttl)
+
+async def _load(key, loader, ttl):
+    async def load_and_store():
+        token = backend.token()
+        loaded = await loader()
+        if CACHE_ENABLED:
+            backend.set(key, loaded, ttl, token=token)
+        return loaded
+
+    if not COALESCE_ENABLED:
+        return await load_and_store()
+    # Не приєднуємось до завантаження, що почалось до останньої інвалідації:
+    # інакше автор ставки міг би отримати ціну до власного коміту
+    flight_key = (key, backend.epoch(key))
+    try:
+        return await flights.do(flight_key, load_and_store, timeout=COALESCE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Timed out waiting for data")
+
+def read_session(key):
+    """
+    Сесія для завантаження ключа: з репліки, якщо дані не змінювались
+    нещодавно, інакше з primary (репліка могла ще не отримати зміну).
+    """
+    fresh = backend.changed_within(key, ReplicaRouter.WRITE_WINDOW_SECONDS)
+    return ReadSessionLocal(fresh=fresh)
+
+def dump_json(data):
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+# --- ІНВАЛІДАЦІЯ ---
+# Хендлери лише позначають, що змінилось, у межах сесії.
+# Реальне видалення відбувається ПІСЛЯ коміту (щоб конкурентне читання
+# не закешувало старі дані), а NOTIFY відправляється в тій самій транзакції
+# і доставляється іншим воркерам тільки якщо транзакція закомічена.
+
+_listeners = []
+
+def on_invalidate(callback):
+    """
+    callback(keys, prefixes) викликається після кожної застосованої інвалідації:
+    власного коміту або NOTIFY від іншого воркера. Повне очищення кешу
+    передається як prefixes=("",). Так кеші поза LocalBackend
+    (стан лотів у sequencer.py) дізнаються про зміни.
+    """
+    _listeners.append(callback)
+
+def _notify_listeners(keys, prefixes):
+    for callback in _listeners:
+        try:
+            callback(keys, prefixes)
+        except Exception:
+            logger.exception("Invalidation listener failed")
+
+def invalidate(db, keys=(), prefixes=()):
+    pending = db.info.setdefault("cache_invalidate", {"keys": set(), "prefixes": set()})
+    pending["keys"].update(keys)
+    pending["prefixes"].update(prefixes)
+
+def invalidate_lot(db, *lot_ids):
+    """
+    Лот змінився: його картка, список ставок і всі сторінки каталогу.
+    Під час коміту лот також отримує нову версію (ETag).
+    """
+    keys = []
+    for lot_id in lot_ids:
+        keys.append(lot_key(lot_id))
+        keys.append(bids_key(lot_id))
+    invalidate(db, keys=keys, prefixes=[LOTS_PAGE_PREFIX])
+    db.info.setdefault("lot_versions", {"ids": set(), "sellers": set()})["ids"].update(lot_ids)
+
+def invalidate_seller_lots(db, seller_id):
+    """Змінились дані продавця, вбудовані в картки всіх його лотів"""
+    invalidate(db, prefixes=["lot:", LOTS_PAGE_PREFIX])
+    db.info.setdefault("lot_versions", {"ids": set(), "sellers": set()})["sellers"].add(seller_id)
+
+def invalidate_rules(db):
+    invalidate(db, keys=[RULES_KEY])
+
+def _encode_payload(pending):
+    payload = json.dumps({
+        "w": WORKER_ID,
+        "k": sorted(pending["keys"]),
+        "p": sorted(pending["prefixes"]),
+    })
+    if len(payload) > _MAX_NOTIFY_PAYLOAD:
+        payload = json.dumps({"w": WORKER_ID, "all": True})
+    return payload
+
+# id поточної транзакції: since_version у POST /lots/snapshots (routers/lots.py)
+CURRENT_XID = literal_column("pg_current_xact_id()::text::bigint")
+
+@event.listens_for(Session, "before_commit")
+def _bump_lot_versions(session):
+    pending = session.info.pop("lot_versions", None)
+    if not pending:
+        return
+    # Та сама транзакція, що й зміна: версія не може "випередити" дані
+    if pending["ids"]:
+        session.execute(
+            update(Lot).where(Lot.id.in_(pending["ids"])).values(version=lot_version_seq.next_value(), version_xid=CURRENT_XID),
+            execution_options={"synchronize_session": False}
+        )
+    if pending["sellers"]:
+        session.execute(
+            update(Lot).where(Lot.seller_id.in_(pending["sellers"])).values(version=lot_version_seq.next_value(), version_xid=CURRENT_XID),
+            execution_options={"synchronize_session": False}
+        )
+
+@event.listens_for(Session, "before_commit")
+def _broadcast_invalidations(session):
+    pending = session.info.get("cache_invalidate")
+    if not pending or CACHE_BROADCAST != "postgres":
+        return
+    session.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": INVALIDATION_CHANNEL, "payload": _encode_payload(pending)}
+    )
+
+@event.listens_for(Session, "after_commit")
+def _apply_invalidations(session):
+    pending = session.info.pop("cache_invalidate", None)
+    if pending:
+        backend.delete(pending["keys"], pending["prefixes"])
+        cache_invalidations.inc(source="local")
+        _notify_listeners(pending["keys"], pending["prefixes"])
+
+@event.listens_for(Session, "after_rollback")
+def _drop_invalidations(session):
+    session.info.pop("cache_invalidate", None)
+    session.info.pop("lot_versions", None)
+
+# --- СЛУХАЧ ІНВАЛІДАЦІЙ ВІД ІНШИХ ВОРКЕРІВ ---
+
+def _on_notification(connection, pid, channel, payload):
+    try:
+        message = json.loads(payload)
+    except ValueError:
+        _clear()
+        return
+    if message.get("w") == WORKER_ID:
+        return
+    if message.get("all"):
+        _clear()
+    else:
+        backend.delete(message.get("k", ()), message.get("p", ()))
+        _notify_listeners(message.get("k", ()), message.get("p", ()))
+    cache_invalidations.inc(source="remote")
+
+def _clear():
+    backend.clear()
+    _notify_listeners((), ("",))
+
+async def listen_for_invalidations():
+    """
+    Тримає окреме з'єднання з LISTEN. Якщо з'єднання обірвалось,
+    частина повідомлень могла загубитись, тому кеш повністю очищається.
+    """
+    dsn = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+    while True:
+        connection = None
+        try:
+            connection = await asyncpg.connect(dsn)
+            lost = asyncio.Event()
+            connection.add_termination_listener(lambda _conn: lost.set())
+            await connection.add_listener(INVALIDATION_CHANNEL, _on_notification)
+            # Усе, що ми закешували до підписки, могло пропустити інвалідацію
+            _clear()
+            await lost.wait()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Cache listener connection failed: %s", e)
+        finally:
+            if connection is not None and not connection.is_closed():
+                await connection.close()
+        _clear()
+        await asyncio.sleep(1)
+
+async def start_cache_listener():
+    if CACHE_ENABLED and CACHE_BROADCAST == "postgres":
+        asyncio.create_task(listen_for_invalidations())
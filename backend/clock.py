@@ -0,0 +1,75 @@
+# backend/clock.py
+import asyncio
+import heapq
+import itertools
+from contextlib import contextmanager
+from datetime import datetime, timezone, timedelta
+
+# Єдине джерело "зараз" для логіки аукціону: дедлайни оплати, передача
+# перемоги, автозакриття неактивних лотів, терміни банів, пауза між
+# проходами фонових задач. У продакшні - системний час; симулятор
+# (tools/simulate.py) підставляє VirtualClock і прокручує місяці за секунди.
+# Службові таймери (метрики, монітор циклу, експорт трас) лишаються на
+# справжньому часі - вони вимірюють сам процес, а не аукціон.
+
+class SystemClock:
+    def now(self):
+        return datetime.now(timezone.utc)
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(seconds)
+
+class VirtualClock:
+    """
+    Час, що рухається лише через advance(). sleep() чекає, доки
+    віртуальний час не дійде до потрібної позначки.
+    """
+    def __init__(self, start=None):
+        self._now = start or datetime.now(timezone.utc)
+        self._sleepers = []
+        self._order = itertools.count()
+
+    def now(self):
+        return self._now
+
+    async def sleep(self, seconds):
+        if seconds <= 0:
+            await asyncio.sleep(0)
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._sleepers, (self._now + timedelta(seconds=seconds), next(self._order), future))
+        await future
+
+    def advance(self, delta):
+        """Переводить годинник вперед і будить тих, чий sleep() уже минув"""
+        if not isinstance(delta, timedelta):
+            delta = timedelta(seconds=delta)
+        self._now += delta
+        while self._sleepers and self._sleepers[0][0] <= self._now:
+            _, _, future = heapq.heappop(self._sleepers)
+            if not future.done():
+                future.set_result(None)
+
+_clock = SystemClock()
+
+def now():
+    return _clock.now()
+
+async def sleep(seconds):
+    await _clock.sleep(seconds)
+
+def get_clock():
+    return _clock
+
+def set_clock(clock):
+    global _clock
+    previous, _clock = _clock, clock
+    return previous
+
+@contextmanager
+def use_clock(clock):
+    previous = set_clock(clock)
+    try:
+        yield clock
+    finally:
+        set_clock(previous)
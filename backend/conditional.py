@@ -0,0 +1,51 @@
+# backend/conditional.py
+import hashlib
+
+from fastapi import Request, Response
+
+# HTTP conditional requests: ETag + If-None-Match.
+# Валідатори дешеві (версія лота, ревізія налаштувань), тому 304
+# віддається ще до важкого запиту з joinedload і серіалізації.
+
+# Ціни змінюються постійно: браузер може зберегти відповідь,
+# але зобов'язаний перевірити її (If-None-Match) перед використанням
+CACHE_CONTROL_REVALIDATE = "no-cache"
+CACHE_CONTROL_RULES = "public, max-age=60"
+# Складені сторінки (routers/views.py) містять дані конкретного користувача
+CACHE_CONTROL_PRIVATE = "private, no-cache"
+
+def lot_etag(lot_id, version):
+    return f'W/"lot-{lot_id}-{version}"'
+
+def bids_etag(lot_id, version):
+    return f'W/"bids-{lot_id}-{version}"'
+
+def lots_page_etag(rows):
+    """rows - пари (id, version) у порядку сторінки"""
+    digest = hashlib.sha1(",".join(f"{lot_id}:{version}" for lot_id, version in rows).encode()).hexdigest()
+    return f'W/"lots-{digest[:20]}"'
+
+def rules_etag(revision):
+    return f'W/"rules-{revision}"'
+
+def _strip_weak(tag):
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+def etag_matches(request: Request, etag):
+    header = request.headers.get("if-none-match")
+    if not header or not etag:
+        return False
+    if header.strip() == "*":
+        return True
+    wanted = _strip_weak(etag)
+    return any(_strip_weak(tag) == wanted for tag in header.split(","))
+
+def not_modified(etag, cache_control):
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+def json_response(body, etag, cache_control):
+    headers = {"Cache-Control": cache_control}
+    if etag:
+        headers["ETag"] = etag
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -1,13 +1,224 @@
 import os
+import time
+import uuid
+import asyncio
+import logging
+import itertools
+import contextvars
+from sqlalchemy import event, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from dotenv import load_dotenv
 
+import metrics
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Репліки для читання (через кому). Порожньо = всі читання йдуть на primary
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# Якщо репліка відстає більше - читаємо з primary
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "1"))
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "1"))
+
+# --- ПРОФІЛІ ДВИЖКА ---
+# DB_PROFILE=dev|prod|bench. Будь-який параметр можна перевизначити
+# окремою змінною оточення (DB_POOL_SIZE, DB_STATEMENT_TIMEOUT_MS, ...).
+# Таймаути в мілісекундах, 0 = вимкнено.
+PROFILES = {
+    "dev": {
+        "echo": True,
+        "pool_size": 5,
+        "max_overflow": 10,
+        "pool_timeout": 30,
+        "pool_recycle": -1,
+        "pool_pre_ping": False,
+        "statement_timeout_ms": 0,
+        "idle_in_transaction_timeout_ms": 0,
+    },
+    "prod": {
+        "echo": False,
+        "pool_size": 20,
+        "max_overflow": 10,
+        "pool_timeout": 5,
+        "pool_recycle": 1800,
+        "pool_pre_ping": True,
+        "statement_timeout_ms": 5000,
+        "idle_in_transaction_timeout_ms": 10000,
+    },
+    "bench": {
+        "echo": False,
+        "pool_size": 50,
+        "max_overflow": 0,
+        "pool_timeout": 10,
+        "pool_recycle": -1,
+        "pool_pre_ping": False,
+        "statement_timeout_ms": 30000,
+        "idle_in_transaction_timeout_ms": 30000,
+    },
+}
+
+DB_PROFILE = os.getenv("DB_PROFILE", "dev")
+if DB_PROFILE not in PROFILES:
+    raise RuntimeError(f"Unknown DB_PROFILE '{DB_PROFILE}'. Use one of: {', '.join(PROFILES)}")
+
+def _setting(name, cast):
+    value = os.getenv(f"DB_{name.upper()}")
+    if value is None:
+        return PROFILES[DB_PROFILE][name]
+    if cast is bool:
+        return value.lower() in ("1", "true", "yes")
+    return cast(value)
+
+DB_ECHO = _setting("echo", bool)
+DB_POOL_SIZE = _setting("pool_size", int)
+DB_MAX_OVERFLOW = _setting("max_overflow", int)
+DB_POOL_TIMEOUT = _setting("pool_timeout", float)
+DB_POOL_RECYCLE = _setting("pool_recycle", int)
+DB_POOL_PRE_PING = _setting("pool_pre_ping", bool)
+DB_STATEMENT_TIMEOUT_MS = _setting("statement_timeout_ms", int)
+DB_IDLE_IN_TRANSACTION_TIMEOUT_MS = _setting("idle_in_transaction_timeout_ms", int)
+# Режим сумісності з PgBouncer (transaction pooling): без кешу prepared statements
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "0") == "1"
+DB_APPLICATION_NAME = os.getenv("DB_APPLICATION_NAME", f"bidbuy-{DB_PROFILE}")
+# JIT лише заважає коротким OLTP-запитам
+DB_JIT = os.getenv("DB_JIT", "off")
+
+# --- МЕТРИКИ ПУЛУ ---
+pool_checkout_wait = metrics.Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled connection",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+pool_checkout_timeouts = metrics.Counter(
+    "db_pool_checkout_timeouts_total", "Checkouts that gave up after pool_timeout"
+)
+
+pool_deadline_exceeded = metrics.Counter(
+    "db_pool_deadline_exceeded_total", "Checkouts dropped because the request deadline passed"
+)
+
+# Дедлайн поточного запиту (time.monotonic()), ставить admission.py.
+# Запит, що не дочекався з'єднання до дедлайну, знімається з черги пулу.
+# Після першого коміту із записом дедлайн знімається (_remember_writer)
+request_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+class DeadlineExceeded(PoolTimeoutError):
+    """Дедлайн запиту минув, поки він чекав на з'єднання"""
+
+class MeteredPool(AsyncAdaptedQueuePool):
+    """Пул, що вимірює час очікування вільного з'єднання і поважає дедлайн запиту"""
+    _checkouts_in_progress = 0
+
+    # QueuePool читає _timeout на кожному checkout: очікування обрізається дедлайном
+    @property
+    def _timeout(self):
+        deadline = request_deadline.get()
+        if deadline is None:
+            return self._pool_timeout
+        return min(self._pool_timeout, max(deadline - time.monotonic(), 0.001))
+
+    @_timeout.setter
+    def _timeout(self, value):
+        self._pool_timeout = value
+
+    def recreate(self):
+        pool = super().recreate()
+        pool._timeout = self._pool_timeout
+        return pool
+
+    def _do_get(self):
+        deadline = request_deadline.get()
+        if deadline is not None and time.monotonic() >= deadline:
+            pool_deadline_exceeded.inc()
+            raise DeadlineExceeded("Request deadline passed before connection checkout")
+
+        started = time.perf_counter()
+        self._checkouts_in_progress += 1
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            if deadline is not None and time.monotonic() >= deadline:
+                pool_deadline_exceeded.inc()
+                raise DeadlineExceeded("Request deadline passed while waiting for a connection")
+            pool_checkout_timeouts.inc()
+            raise
+        finally:
+            self._checkouts_in_progress -= 1
+            pool_checkout_wait.observe(time.perf_counter() - started)
+
+def _connect_args(application_name):
+    server_settings = {"application_name": application_name}
+    args = {"server_settings": server_settings}
+
+    if DB_PGBOUNCER:
+        # PgBouncer не пропускає довільні стартові параметри -
+        # таймаути і jit в цьому режимі задаються на рівні ролі:
+        # ALTER ROLE ... SET statement_timeout = ...
+        args["statement_cache_size"] = 0
+        # Унікальні імена, щоб prepared statements різних клієнтів
+        # не конфліктували на спільному серверному з'єднанні
+        args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+        return args
+
+    server_settings["jit"] = DB_JIT
+    if DB_STATEMENT_TIMEOUT_MS:
+        server_settings["statement_timeout"] = str(DB_STATEMENT_TIMEOUT_MS)
+    if DB_IDLE_IN_TRANSACTION_TIMEOUT_MS:
+        server_settings["idle_in_transaction_session_timeout"] = str(DB_IDLE_IN_TRANSACTION_TIMEOUT_MS)
+    return args
+
+def _engine_url(url):
+    if DB_PGBOUNCER and url and "prepared_statement_cache_size" not in url:
+        # Кеш prepared statements на боці SQLAlchemy теж вимикаємо
+        separator = "&" if "?" in url else "?"
+        return f"{url}{separator}prepared_statement_cache_size=0"
+    return url
+
+def _create_engine(url, application_name):
+    return create_async_engine(
+        _engine_url(url),
+        # echo=True вішає на логер синхронний StreamHandler - замість цього
+        # SQL-логи йдуть через загальне (чергове) логування, див. нижче
+        echo=False,
+        poolclass=MeteredPool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args=_connect_args(application_name),
+    )
+
+if DB_ECHO:
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO)
+
+engine = _create_engine(DATABASE_URL, DB_APPLICATION_NAME)
+replica_engines = [
+    _create_engine(url, f"{DB_APPLICATION_NAME}-replica") for url in DATABASE_REPLICA_URLS
+]
+
+def _pool_in_use():
+    return engine.sync_engine.pool.checkedout()
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+def pool_pressure():
+    """(видані + ті, що чекають на з'єднання) / ємність пулу; > 1 - є черга"""
+    pool = engine.sync_engine.pool
+    return (pool.checkedout() + pool._checkouts_in_progress) / max(1, DB_POOL_SIZE + DB_MAX_OVERFLOW)
+
+metrics.Gauge("db_pool_size", "Configured pool size", function=lambda: DB_POOL_SIZE)
+metrics.Gauge("db_pool_max_overflow", "Configured pool overflow", function=lambda: DB_MAX_OVERFLOW)
+metrics.Gauge("db_pool_checked_out", "Connections currently checked out", function=_pool_in_use)
+metrics.Gauge(
+    "db_pool_saturation",
+    "Checked out connections / (pool_size + max_overflow)",
+    function=lambda: _pool_in_use() / max(1, DB_POOL_SIZE + DB_MAX_OVERFLOW),
+)
+metrics.Gauge("db_pool_pressure", "(Checked out + waiting checkouts) / pool capacity", function=lambda: pool_pressure())
 
 # Фабрика сесій
 AsyncSessionLocal = sessionmaker(
@@ -19,4 +230,197 @@ AsyncSessionLocal = sessionmaker(
 # Dependency для отримання сесії в контролерах
 async def get_db():
     async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+# --- РЕПЛІКИ ДЛЯ ЧИТАННЯ ---
+
+replica_lag = metrics.Gauge("db_replica_lag_seconds", "Replication lag per replica", ["replica"])
+read_routing = metrics.Counter("db_read_routing_total", "Read sessions by target", ["target", "reason"])
+
+class ReplicaRouter:
+    """
+    Вибирає репліку для читання (round-robin серед тих, що відстають
+    не більше REPLICA_MAX_LAG_SECONDS). Відставання міряє фоновий монітор;
+    поки воно невідоме, репліка не використовується.
+
+    Read-your-writes: written_at - час останнього запису клієнта (заголовок
+    X-Last-Write, див. ReadYourWritesMiddleware). Репліка підходить, лише
+    якщо вона вже застосувала WAL primary, записаний до цього часу:
+    монітор бере pg_current_wal_lsn() на primary і порівнює з
+    pg_last_wal_replay_lsn() репліки (caught_up). Час приходить від
+    клієнта, тому працює в будь-якому воркері, а не лише в тому, що
+    прийняв запис.
+    """
+    def __init__(self, engines, primary=None):
+        self.engines = engines
+        self.primary = primary
+        self.lag = {index: None for index in range(len(engines))}
+        # Час (time.time()), до якого репліка гарантовано все застосувала
+        self.caught_up = {index: None for index in range(len(engines))}
+        self._cycle = itertools.cycle(range(len(engines))) if engines else None
+
+    WRITE_WINDOW_SECONDS = REPLICA_MAX_LAG_SECONDS + REPLICA_LAG_CHECK_SECONDS
+
+    def pick(self, written_at=None, fresh=False):
+        """Повертає engine репліки або None (читати з primary)"""
+        if not self.engines:
+            return None
+        if fresh:
+            read_routing.inc(target="primary", reason="fresh")
+            return None
+        behind_write = False
+        for _ in range(len(self.engines)):
+            index = next(self._cycle)
+            lag = self.lag[index]
+            if lag is None or lag > REPLICA_MAX_LAG_SECONDS:
+                continue
+            if written_at is not None and (self.caught_up[index] is None or self.caught_up[index] < written_at):
+                behind_write = True
+                continue
+            read_routing.inc(target="replica", reason="ok")
+            return self.engines[index]
+        read_routing.inc(target="primary", reason="read_your_writes" if behind_write else "replica_lag")
+        return None
+
+    async def primary_lsn(self):
+        async with self.primary.connect() as conn:
+            return (await conn.execute(text("SELECT pg_current_wal_lsn()::text"))).scalar()
+
+    async def measure(self, index, lsn):
+        """(відставання в секундах, чи застосовано WAL primary до lsn)"""
+        # На primary (pg_is_in_recovery = false) відставання нульове -
+        # зручно для локального запуску, де "репліка" вказує на ту ж БД.
+        # lsn - рядок: asyncpg передає pg_lsn як число
+        query = text("""
+            SELECT CASE
+                WHEN NOT pg_is_in_recovery() THEN 0
+                WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+            END,
+            NOT pg_is_in_recovery() OR pg_last_wal_replay_lsn() >= CAST(CAST(:lsn AS text) AS pg_lsn)
+        """)
+        async with self.engines[index].connect() as conn:
+            lag, applied = (await conn.execute(query, {"lsn": lsn})).one()
+            return float(lag), applied
+
+    async def monitor(self):
+        while True:
+            # Коміт, підтверджений до started, лежить у WAL нижче lsn
+            started = time.time()
+            try:
+                lsn = await asyncio.wait_for(self.primary_lsn(), REPLICA_LAG_CHECK_SECONDS * 2)
+            except Exception as e:
+                lsn = None
+                logger.warning("Primary WAL position check failed: %s", e)
+            for index in range(len(self.engines)):
+                try:
+                    if lsn is None:
+                        raise RuntimeError("primary WAL position unknown")
+                    self.lag[index], applied = await asyncio.wait_for(self.measure(index, lsn), REPLICA_LAG_CHECK_SECONDS * 2)
+                    if applied:
+                        self.caught_up[index] = started
+                except Exception as e:
+                    # Недоступна репліка виключається з ротації
+                    self.lag[index] = None
+                    logger.warning("Replica #%s lag check failed: %s", index, e)
+                replica_lag.set(self.lag[index] if self.lag[index] is not None else -1, replica=str(index))
+            await asyncio.sleep(REPLICA_LAG_CHECK_SECONDS)
+
+replicas = ReplicaRouter(replica_engines, primary=engine)
+
+# --- READ-YOUR-WRITES ---
+# Стан поточного HTTP-запиту: {"written_at": час останнього запису клієнта
+# з X-Last-Write або власного коміту цього запиту, "wrote": чи був коміт}.
+# Словник, а не окремі значення: коміт у вкладеному контексті змінює той
+# самий об'єкт, і middleware бачить це при відповіді.
+# Час - time.time() воркера: годинники серверів застосунку синхронізовані (NTP).
+LAST_WRITE_HEADER = "X-Last-Write"
+_write_state = contextvars.ContextVar("write_state", default=None)
+
+def _parse_last_write(value):
+    try:
+        written_at = float(value)
+    except (TypeError, ValueError):
+        return None
+    # Час "з майбутнього" не тримає клієнта на primary довше, ніж справжній
+    return min(written_at, time.time()) if written_at == written_at else None
+
+class ReadYourWritesMiddleware:
+    """
+    Чистий ASGI middleware: читає X-Last-Write запиту і, якщо запит щось
+    закомітив, повертає новий X-Last-Write у відповіді. Клієнт пересилає
+    останнє значення з кожним запитом (client/src/useApi.js).
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        header = LAST_WRITE_HEADER.lower().encode()
+        value = next((value for name, value in scope["headers"] if name == header), None)
+        state = {"written_at": _parse_last_write(value.decode("latin-1")) if value else None, "wrote": False}
+        token = _write_state.set(state)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and state["wrote"]:
+                headers = list(message.get("headers", []))
+                headers.append((header, f"{state['written_at']:.6f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _write_state.reset(token)
+
+def ReadSessionLocal(fresh=False):
+    """
+    Фабрика сесій для читання поруч з AsyncSessionLocal.
+    fresh=True - дані щойно змінились, репліка могла їх ще не отримати.
+    Репліку, що ще не отримала останній запис клієнта, пропускаємо.
+    """
+    state = _write_state.get()
+    replica = replicas.pick(written_at=state["written_at"] if state else None, fresh=fresh)
+    if replica is None:
+        return AsyncSessionLocal()
+    return AsyncSession(bind=replica, expire_on_commit=False)
+
+# Dependency для анонімних читань
+async def get_read_db():
+    async with ReadSessionLocal() as session:
+        yield session
+
+async def start_replica_monitor():
+    if replica_engines:
+        asyncio.create_task(replicas.monitor())
+
+# Фіксуємо, чи сесія щось записала
+@event.listens_for(Session, "after_flush")
+def _mark_session_wrote(session, flush_context):
+    session.info["wrote"] = True
+
+# Масові INSERT/UPDATE/DELETE через session.execute() не проходять через flush
+@event.listens_for(Session, "do_orm_execute")
+def _mark_statement_wrote(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
+
+@event.listens_for(Session, "after_commit")
+def _remember_writer(session):
+    if not session.info.pop("wrote", False):
+        return
+    # Запис зафіксовано: решта запиту (refresh після коміту, відповідь) уже
+    # не відкидається дедлайном - інакше клієнт отримав би 503 на успішний запис
+    request_deadline.set(None)
+    state = _write_state.get()
+    if state is not None:
+        # Після підтвердження коміту: усе, що застосовано до цього часу, містить запис
+        state["written_at"] = time.time()
+        state["wrote"] = True
+
+@event.listens_for(Session, "after_rollback")
+def _forget_writer(session):
+    session.info.pop("wrote", None)
@@ -1,15 +1,22 @@
 from fastapi import Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from datetime import datetime, timezone
+from datetime import timezone
 from auth import get_current_user 
-from database import get_db
+from database import get_db, ReadSessionLocal
 from models import User
+import ban_jobs
+import clock
+import tracing
 
 async def get_current_user_db(
     token_data: dict = Depends(get_current_user), 
     db: AsyncSession = Depends(get_db)            
 ):
+    with tracing.span("user.resolve"):
+        return await _resolve_user(token_data, db)
+
+async def _resolve_user(token_data: dict, db: AsyncSession):
     auth0_sub = token_data.get("sub")
     email = token_data.get("email")
 
@@ -43,12 +50,13 @@ async def get_current_user_db(
     # --- ПЕРЕВІРКА БЛОКУВАННЯ ---
     if user.is_blocked:
         # Перевіряємо, чи не закінчився термін бану
-        if user.ban_until and user.ban_until.replace(tzinfo=timezone.utc) < datetime.now(timezone.utc):
+        if user.ban_until and user.ban_until.replace(tzinfo=timezone.utc) < clock.now():
             # Розблокуємо автоматично
             user.is_blocked = False
             user.ban_reason = None
             user.ban_until = None
             db.add(user)
+            await ban_jobs.cancel(db, user.id)
             await db.commit()
         else:
             # БАН АКТИВНИЙ
@@ -59,4 +67,9 @@ async def get_current_user_db(
                 detail=f"Your account is blocked. Reason: {reason}. Until: {until}"
             )
 
-    return user
\ No newline at end of file
+    return user
+
+# Dependency для читань від імені користувача (репліка або primary)
+async def get_user_read_db(current_user: User = Depends(get_current_user_db)):
+    async with ReadSessionLocal() as session:
+        yield session
@@ -0,0 +1,252 @@
+# backend/idempotency.py
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+
+from fastapi import Depends, HTTPException, Request
+from fastapi.responses import Response
+from sqlalchemy import delete, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.future import select
+
+from database import AsyncSessionLocal, request_deadline
+from dependencies import get_current_user_db
+from models import IdempotencyKey, User
+import clock
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Idempotency-Key для POST, які змінюють стан (ставка, оплата).
+#
+# Клієнт, що не дочекався відповіді, повторює запит з тим самим ключем.
+# Перший запит із ключем "займає" рядок idempotency_keys (INSERT ... ON
+# CONFLICT DO NOTHING - атомарно між воркерами), виконується звичайно, а
+# його відповідь (статус < 500) зберігається в тому ж рядку. Повтор:
+#   - відповідь уже є - віддаємо збережену, обробник не виконується
+#   - перший ще виконується - чекаємо на нього (у тому ж воркері - на
+#     future, в іншому - опитуванням рядка), потім віддаємо його відповідь
+#   - той самий ключ з іншим тілом чи шляхом - 422
+# 5xx і необроблені винятки звільняють ключ: повтор виконається заново.
+# Рядки живуть IDEMPOTENCY_TTL_SECONDS, потім їх прибирає фонова задача.
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+# Скільки повтор чекає на перший запит, перш ніж отримати 409
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+# Ключ у стані pending довше за це - воркер упав посеред запиту, ключ можна перехопити
+IDEMPOTENCY_LOCK_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+# Відповіді, більші за це, не зберігаються (ключ звільняється)
+IDEMPOTENCY_MAX_BODY_BYTES = int(os.getenv("IDEMPOTENCY_MAX_BODY_BYTES", "65536"))
+
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+SWEEP_BATCH = 1000
+
+idempotency_requests = metrics.Counter("idempotency_requests_total", "Requests with Idempotency-Key", ["outcome"])
+
+class Replay(Exception):
+    """Збережена відповідь замість виконання обробника (див. replay_handler у main.py)"""
+    def __init__(self, record):
+        super().__init__(record.key)
+        self.record = record
+
+async def replay_handler(request: Request, exc: Replay):
+    record = exc.record
+    return Response(
+        content=record.body,
+        status_code=record.status_code,
+        media_type=record.content_type,
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+@dataclass
+class Claim:
+    id: int
+    local_key: tuple
+    future: asyncio.Future
+
+# (user_id, ключ) -> future першого запиту в цьому воркері
+_inflight = {}
+
+def _fingerprint(request: Request, body: bytes):
+    digest = hashlib.sha256()
+    for part in (request.method.encode(), request.url.path.encode(), body):
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+async def _insert(user_id, key, request_hash):
+    async with AsyncSessionLocal() as db:
+        query = insert(IdempotencyKey).values(
+            user_id=user_id, key=key, request_hash=request_hash, status="pending",
+            created_at=clock.now(), expires_at=clock.now() + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+        ).on_conflict_do_nothing(constraint="uq_idempotency_keys_user_key").returning(IdempotencyKey.id)
+        claimed = (await db.execute(query)).scalar()
+        await db.commit()
+        return claimed
+
+async def _load(user_id, key):
+    async with AsyncSessionLocal() as db:
+        query = select(IdempotencyKey).where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+        return (await db.execute(query)).scalar_one_or_none()
+
+async def _take_over(record):
+    # Умова на created_at: з двох повторів, що побачили той самий завислий рядок, перехопить один
+    async with AsyncSessionLocal() as db:
+        query = update(IdempotencyKey).where(
+            IdempotencyKey.id == record.id,
+            IdempotencyKey.status == "pending",
+            IdempotencyKey.created_at == record.created_at,
+        ).values(
+            created_at=clock.now(), expires_at=clock.now() + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+        ).returning(IdempotencyKey.id)
+        claimed = (await db.execute(query)).scalar()
+        await db.commit()
+        return claimed
+
+async def idempotent(request: Request, current_user: User = Depends(get_current_user_db)):
+    """
+    Dependency для POST-ендпоінтів: без заголовка Idempotency-Key нічого не робить.
+    Займає ключ (запит виконується далі) або кидає Replay зі збереженою відповіддю.
+    """
+    key = request.headers.get("idempotency-key")
+    if key is None:
+        return None
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters")
+
+    request_hash = _fingerprint(request, await request.body())
+    local_key = (current_user.id, key)
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+
+    while True:
+        # 1. Перший запит виконується в цьому ж воркері - чекаємо без БД
+        future = _inflight.get(local_key)
+        if future is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(future), max(deadline - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                idempotency_requests.inc(outcome="conflict")
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is in progress",
+                                    headers={"Retry-After": "1"})
+
+        # 2. Займаємо ключ
+        claimed = await _insert(current_user.id, key, request_hash)
+        if claimed is None:
+            record = await _load(current_user.id, key)
+            if record is None:
+                # Перший запит звільнив ключ (5xx) між нашими запитами - пробуємо ще раз
+                continue
+            if record.request_hash != request_hash:
+                idempotency_requests.inc(outcome="mismatch")
+                raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+            if record.status == "done":
+                idempotency_requests.inc(outcome="replayed")
+                raise Replay(record)
+            if (clock.now() - record.created_at).total_seconds() > IDEMPOTENCY_LOCK_SECONDS:
+                claimed = await _take_over(record)
+                if claimed is not None:
+                    logger.warning("Took over stale idempotency key", extra={"user_id": current_user.id})
+
+        if claimed is not None:
+            break
+
+        # 3. Перший запит виконується в іншому воркері - опитуємо рядок
+        if time.monotonic() >= deadline:
+            idempotency_requests.inc(outcome="conflict")
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is in progress",
+                                headers={"Retry-After": "1"})
+        await asyncio.sleep(POLL_INTERVAL)
+
+    idempotency_requests.inc(outcome="executed")
+    claim = Claim(claimed, local_key, asyncio.get_running_loop().create_future())
+    _inflight[local_key] = claim.future
+    # IdempotencyMiddleware збереже відповідь, коли обробник її віддасть
+    request.state.idempotency = claim
+    return claim
+
+async def _finish(claim, status_code=None, content_type=None, body=None):
+    """Зберігає відповідь (status_code задано) або звільняє ключ"""
+    # Обробник уже відпрацював: збереження відповіді не відкидається дедлайном запиту
+    request_deadline.set(None)
+    try:
+        async with AsyncSessionLocal() as db:
+            if status_code is not None:
+                await db.execute(update(IdempotencyKey).where(IdempotencyKey.id == claim.id).values(
+                    status="done", status_code=status_code, content_type=content_type, body=body,
+                ))
+            else:
+                await db.execute(delete(IdempotencyKey).where(IdempotencyKey.id == claim.id))
+            await db.commit()
+    except Exception:
+        # Ключ лишиться pending і буде перехоплений після IDEMPOTENCY_LOCK_SECONDS
+        logger.exception("Failed to finish idempotency key")
+    finally:
+        if _inflight.get(claim.local_key) is claim.future:
+            del _inflight[claim.local_key]
+        if not claim.future.done():
+            claim.future.set_result(None)
+
+class IdempotencyMiddleware:
+    """Чистий ASGI middleware: відповідь на запит, що зайняв ключ, - в idempotency_keys"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+
+        # Спільний dict з request.state обробника
+        state = scope.setdefault("state", {})
+        response = {"status": None, "content_type": None, "body": []}
+        finished = False
+
+        async def finish(store):
+            nonlocal finished
+            claim = state.get("idempotency")
+            if claim is None or finished:
+                return
+            finished = True
+            body = b"".join(response["body"])
+            if store and response["status"] < 500 and len(body) <= IDEMPOTENCY_MAX_BODY_BYTES:
+                await _finish(claim, response["status"], response["content_type"], body)
+            else:
+                await _finish(claim)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                for name, value in message.get("headers", []):
+                    if name == b"content-type":
+                        response["content_type"] = value.decode("latin-1")
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+                # Зберігаємо до останнього шматка: коли клієнт отримав відповідь, повтор її вже знайде
+                if not message.get("more_body", False):
+                    await finish(store=True)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            await finish(store=False)
+
+async def sweep_expired_keys():
+    """Видаляє прострочені ключі пакетами"""
+    deleted = 0
+    async with AsyncSessionLocal() as db:
+        while True:
+            expired = select(IdempotencyKey.id).where(IdempotencyKey.expires_at < clock.now()).limit(SWEEP_BATCH)
+            result = await db.execute(
+                delete(IdempotencyKey).where(IdempotencyKey.id.in_(expired.scalar_subquery())),
+                execution_options={"synchronize_session": False},
+            )
+            await db.commit()
+            deleted += result.rowcount
+            if result.rowcount < SWEEP_BATCH:
+                return deleted
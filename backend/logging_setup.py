@@ -0,0 +1,205 @@
+# backend/logging_setup.py
+import os
+import sys
+import copy
+import json
+import time
+import uuid
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+import metrics
+import tracing
+
+# Логування без блокування event loop:
+# логер -> QueueHandler (лише кладе запис у чергу) -> потік QueueListener -> stdout.
+# Формат JSON (або text для локальної розробки), у кожному записі -
+# request_id поточного запиту і trace_id, якщо запит трасується.
+# Повтори одного й того ж повідомлення обмежуються LOG_RATE_LIMIT за вікно.
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Рівні для окремих модулів: "sqlalchemy.engine=INFO,routers.bids=WARNING"
+LOG_LEVELS = os.getenv("LOG_LEVELS", "httpx=WARNING")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json | text
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_RATE_LIMIT = int(os.getenv("LOG_RATE_LIMIT", "20"))
+LOG_RATE_WINDOW_SECONDS = float(os.getenv("LOG_RATE_WINDOW_SECONDS", "10"))
+
+logs_dropped = metrics.Counter("log_records_dropped_total", "Log records dropped because the log queue was full")
+logs_suppressed = metrics.Counter("log_records_suppressed_total", "Repeated log records suppressed by rate limiting")
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+# Стандартні атрибути LogRecord - все інше прийшло через extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id", "trace_id"}
+
+class ContextFilter(logging.Filter):
+    """Додає request_id і trace_id з контексту запиту"""
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        span = tracing.current_span()
+        record.trace_id = span.trace_id if span is not None else None
+        return True
+
+class RateLimitFilter(logging.Filter):
+    """
+    Не більше limit записів з однаковим шаблоном (logger, рівень, msg)
+    за window секунд. Кількість пропущених додається до першого запису
+    наступного вікна (поле suppressed).
+    """
+    def __init__(self, limit, window):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.limit <= 0:
+            return True
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            state = self._state.get(key)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state is not None else 0
+                if len(self._state) > 10000:
+                    self._state.clear()
+                self._state[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            state[1] += 1
+            if state[1] > self.limit:
+                state[2] += 1
+                logs_suppressed.inc()
+                return False
+            return True
+
+class NonBlockingQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # Форматування - вже в потоці слухача; тут лише фіксуємо текст і traceback,
+        # поки аргументи ще живі
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            logs_dropped.inc()
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if getattr(record, "trace_id", None):
+            entry["trace_id"] = record.trace_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = None
+        return super().format(record)
+
+_listener = None
+
+def _apply_levels(spec):
+    for item in spec.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            logging.getLogger(name.strip()).setLevel(level.strip().upper())
+
+def setup_logging(queued=True, stream=None):
+    """
+    queued=False - синхронний запис у потік (поведінка як у print);
+    лишено для порівняння в tools/bench_logging.py.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter())
+
+    if queued:
+        handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        _listener = QueueListener(handler.queue, output, respect_handler_level=False)
+        _listener.start()
+    else:
+        handler = output
+
+    handler.addFilter(ContextFilter())
+    handler.addFilter(RateLimitFilter(LOG_RATE_LIMIT, LOG_RATE_WINDOW_SECONDS))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL.upper())
+    _apply_levels(LOG_LEVELS)
+
+def stop_logging():
+    """Дописує чергу перед завершенням процесу"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+atexit.register(stop_logging)
+
+class RequestIdMiddleware:
+    """Чистий ASGI middleware: X-Request-ID з запиту (або новий) - в логи і у відповідь"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex[:16]
+        token = request_id_var.set(request_id)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", request_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id_var.reset(token)
@@ -0,0 +1,178 @@
+# backend/loopmonitor.py
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+import weakref
+from collections import deque
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Монітор блокувань event loop.
+# 1. Проба всередині циклу: спить LOOP_LAG_INTERVAL_MS і міряє, наскільки
+#    пізніше прокинулась (lag). Звідси гістограма і перцентилі.
+# 2. Watchdog у окремому потоці: якщо проба давно не прокидалась - цикл
+#    зайнятий синхронним кодом. Знімає стек потоку циклу (sys._current_frames)
+#    в момент блокування, тобто показує винуватця, а не наслідок.
+# 3. Строгий режим (LOOP_STRICT_MS > 0, для dev/тестів): запит, під час
+#    обробки якого цикл блокувався довше N мс, завершується помилкою.
+
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "1") == "1"
+LOOP_LAG_INTERVAL_MS = float(os.getenv("LOOP_LAG_INTERVAL_MS", "50"))
+LOOP_SLOW_CALLBACK_MS = float(os.getenv("LOOP_SLOW_CALLBACK_MS", "200"))
+LOOP_STRICT_MS = float(os.getenv("LOOP_STRICT_MS", "0"))
+
+lag_histogram = metrics.Histogram(
+    "event_loop_lag_seconds", "Event loop wake-up delay",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+blocked_total = metrics.Counter("event_loop_blocked_total", "Event loop stalls longer than LOOP_SLOW_CALLBACK_MS")
+
+class LoopBlocked(RuntimeError):
+    pass
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+class LoopMonitor:
+    def __init__(self, interval_ms, slow_ms, strict_ms=0):
+        self.interval = interval_ms / 1000
+        self.slow = slow_ms / 1000
+        self.strict = strict_ms / 1000
+        # Останні ~30 секунд вимірювань для перцентилів
+        self.samples = deque(maxlen=max(1, int(30 / self.interval)))
+        self.heartbeat = time.monotonic()
+        self.loop = None
+        self.loop_thread_id = None
+        # task -> scope HTTP-запиту, щоб у звітах було видно, чий це запит
+        self.scopes = weakref.WeakKeyDictionary()
+        # task -> опис блокування (строгий режим)
+        self.violations = weakref.WeakKeyDictionary()
+        self._stopped = threading.Event()
+
+    def task_label(self, task):
+        """Маршрут (шаблон, якщо вже знайдений) для HTTP-запиту або ім'я задачі"""
+        if task is None:
+            return "(no task)"
+        scope = self.scopes.get(task)
+        if scope is not None:
+            route = scope.get("route")
+            return f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+        return task.get_name()
+
+    def percentile(self, pct):
+        return _percentile(list(self.samples), pct)
+
+    def recent_lag(self, samples=10):
+        """Найбільший lag за останні ~samples вимірювань або поточне запізнення проби (для admission.py)"""
+        count = len(self.samples)
+        recent = max((self.samples[i] for i in range(max(0, count - samples), count)), default=0.0)
+        if self.loop is None:
+            return recent
+        return max(recent, time.monotonic() - self.heartbeat - self.interval)
+
+    async def probe(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            self.heartbeat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self.samples.append(lag)
+            lag_histogram.observe(lag)
+
+    def _running_task(self):
+        # Читання з іншого потоку: значення може бути трохи застарілим, для звіту це не важливо
+        try:
+            return asyncio.current_task(self.loop)
+        except RuntimeError:
+            return None
+
+    def _snapshot(self):
+        frame = sys._current_frames().get(self.loop_thread_id)
+        return "".join(traceback.format_stack(frame)) if frame is not None else ""
+
+    def watch(self):
+        thresholds = [value for value in (self.slow, self.strict) if value > 0]
+        poll = max(0.005, min(thresholds) / 4)
+        reported_slow = reported_strict = None
+
+        while not self._stopped.wait(poll):
+            heartbeat = self.heartbeat
+            blocked = time.monotonic() - heartbeat - self.interval
+            if blocked <= 0:
+                continue
+
+            if self.slow and blocked >= self.slow and reported_slow != heartbeat:
+                reported_slow = heartbeat
+                task = self._running_task()
+                label = self.task_label(task)
+                blocked_total.inc()
+                logger.warning(
+                    "Event loop busy for %.0f+ ms in %s", blocked * 1000, label,
+                    extra={"stack": self._snapshot()},
+                )
+
+            if self.strict and blocked >= self.strict and reported_strict != heartbeat:
+                reported_strict = heartbeat
+                task = self._running_task()
+                if task is not None:
+                    self.violations[task] = f"{blocked * 1000:.0f}+ ms\n{self._snapshot()}"
+
+    def start(self):
+        if not (self.slow or self.strict):
+            return
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self.loop.create_task(self.probe(), name="loop_lag_probe")
+        threading.Thread(target=self.watch, name="loop-watchdog", daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+
+monitor = LoopMonitor(LOOP_LAG_INTERVAL_MS, LOOP_SLOW_CALLBACK_MS, LOOP_STRICT_MS)
+
+metrics.Gauge("event_loop_lag_p50_seconds", "Median loop lag over the last 30s", function=lambda: monitor.percentile(50))
+metrics.Gauge("event_loop_lag_p99_seconds", "p99 loop lag over the last 30s", function=lambda: monitor.percentile(99))
+metrics.Gauge("event_loop_lag_max_seconds", "Max loop lag over the last 30s", function=lambda: monitor.percentile(100))
+
+async def start_loop_monitor():
+    if LOOP_MONITOR_ENABLED:
+        monitor.start()
+
+class LoopMonitorMiddleware:
+    """
+    Підписує задачу запиту маршрутом (для звітів watchdog і фільтра route
+    у profiler.py) і в строгому режимі валить запит, під час якого цикл
+    був заблокований.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Підпис потрібен і профайлеру, тому не залежить від LOOP_MONITOR_ENABLED
+        task = asyncio.current_task()
+        monitor.scopes[task] = scope
+        monitor.violations.pop(task, None)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            monitor.scopes.pop(task, None)
+
+        violation = monitor.violations.pop(task, None)
+        if violation is not None:
+            route = getattr(scope.get("route"), "path", scope["path"])
+            raise LoopBlocked(f"{scope['method']} {route} blocked the event loop for {violation}")
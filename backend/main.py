@@ -1,29 +1,47 @@
 import os
+import logging
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from database import engine
+from database import engine, start_replica_monitor, ReadYourWritesMiddleware, LAST_WRITE_HEADER
 from models import Base
 from background_tasks import start_background_tasks
+from cache import start_cache_listener
+import metrics
+import querystats
+import tracing
+from logging_setup import setup_logging, RequestIdMiddleware
+from loopmonitor import start_loop_monitor, LoopMonitorMiddleware
+import idempotency
+import admission
+from database import DeadlineExceeded
 
 # --- ІМПОРТИ РОУТЕРІВ ---
-from routers import lots, bids, payments, users, admin, settings
+from routers import lots, bids, payments, users, admin, settings, views
+
+setup_logging()
+logger = logging.getLogger("main")
 
 if not os.path.exists("uploads"):
     os.makedirs("uploads")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print("Starting up database...")
+    logger.info("Starting up database...")
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
     
-    print("Starting background tasks...")
+    logger.info("Starting background tasks...")
     await start_background_tasks()
+    await start_cache_listener()
+    await start_replica_monitor()
+    await start_loop_monitor()
+    await tracing.start_trace_exporter()
     
     yield
-    print("Shutting down...")
+    logger.info("Shutting down...")
 
 app = FastAPI(title="Bid&Buy API", lifespan=lifespan)
 
@@ -35,13 +53,29 @@ origins = [
     "http://127.0.0.1:5173",
 ]
 
+# Найглибше: відповіді 503 під перевантаженням теж отримують CORS-заголовки
+app.add_middleware(admission.AdmissionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Клієнт читає X-Last-Write і повертає його в наступних запитах (read-your-writes)
+    expose_headers=[LAST_WRITE_HEADER],
 )
+# Усередині QueryStats: збереження відповіді рахується в запити маршруту
+app.add_middleware(idempotency.IdempotencyMiddleware)
+# Останнім, щоб охопити весь стек, включно з CORS
+app.add_middleware(LoopMonitorMiddleware)
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(querystats.QueryStatsMiddleware)
+app.add_middleware(metrics.HTTPMetricsMiddleware)
+app.add_middleware(tracing.TracingMiddleware)
+app.add_middleware(RequestIdMiddleware)
+
+app.add_exception_handler(idempotency.Replay, idempotency.replay_handler)
+app.add_exception_handler(DeadlineExceeded, admission.deadline_handler)
 
 app.include_router(lots.router)
 app.include_router(bids.router)
@@ -49,7 +83,12 @@ app.include_router(payments.router)
 app.include_router(users.router)
 app.include_router(admin.router)
 app.include_router(settings.router)
+app.include_router(views.router)
 
 @app.get("/")
 def read_root():
-    return {"message": "Bid&Buy API is running"}
\ No newline at end of file
+    return {"message": "Bid&Buy API is running"}
+
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
\ No newline at end of file
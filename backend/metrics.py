@@ -0,0 +1,161 @@
+# backend/metrics.py
+import bisect
+import threading
+import time
+
+# Мінімальний реєстр метрик у форматі Prometheus (text exposition 0.0.4).
+# Без зовнішніх залежностей: лічильники живуть у пам'яті процесу,
+# кожен воркер віддає власні значення через GET /metrics.
+
+REGISTRY = []
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    inner = ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+    return "{" + inner + "}"
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def _samples(self):
+        for key, value in list(self._values.items()):
+            yield self.name, key, None, value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, extra, value in self._samples():
+            lines.append(f"{name}{_format_labels(self.labelnames, key, extra)} {value}")
+        return "\n".join(lines)
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self._function = function
+
+    def set(self, value, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        if self._function is not None:
+            # Значення рахується в момент скрейпу (напр. стан пулу з'єднань)
+            yield self.name, (), None, self._function()
+            return
+        yield from super()._samples()
+
+class Histogram(_Metric):
+    kind = "histogram"
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [лічильники по бакетах..., +Inf] , сума
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+
+    def _samples(self):
+        for key, (counts, total) in list(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f"{self.name}_bucket", key, ("le", bound), cumulative
+            cumulative += counts[-1]
+            yield f"{self.name}_bucket", key, ("le", "+Inf"), cumulative
+            yield f"{self.name}_sum", key, None, total
+            yield f"{self.name}_count", key, None, cumulative
+
+def render():
+    """Повертає всі зареєстровані метрики у текстовому форматі Prometheus"""
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+# --- HTTP ---
+
+http_requests_in_flight = Gauge("http_requests_in_flight", "HTTP requests currently being served")
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"]
+)
+
+class HTTPMetricsMiddleware:
+    """
+    Чистий ASGI middleware (без BaseHTTPMiddleware - він дорожчий і
+    ламає стрімінг). Шлях береться з шаблону маршруту (/lots/{lot_id}),
+    а не з URL, щоб кількість серій не росла з кожним id.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.dec()
+            # Роутер Starlette кладе знайдений маршрут у scope
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            http_request_duration.observe(
+                time.perf_counter() - started,
+                method=scope["method"], route=path, status=str(status_code),
+            )
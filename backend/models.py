@@ -1,9 +1,14 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Numeric, DateTime, Text, func
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, ForeignKey, Numeric, DateTime, Text, LargeBinary, Sequence, Index, UniqueConstraint, func, text
 from sqlalchemy.orm import relationship, declarative_base
 from datetime import datetime
 
 Base = declarative_base()
 
+# Глобальний монотонний лічильник версій лотів.
+# Кожна зміна лота бере нове значення (див. cache.invalidate_lot),
+# тому версія годиться і як ETag, і як курсор "що змінилось після N".
+lot_version_seq = Sequence("lot_version_seq", metadata=Base.metadata)
+
 class User(Base):
     __tablename__ = "users"
 
@@ -18,6 +23,10 @@ class User(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     phone_number = Column(String, nullable=True)
     bio = Column(Text, nullable=True) 
+    # Найбільший прочитаний id розсилки: стан прочитання розсилок без рядка на користувача (broadcasts.py)
+    broadcasts_read_id = Column(BigInteger, nullable=False, default=0, server_default="0")
+    # Сповіщення "вашу ставку перебито" (outbid.py)
+    notify_outbid = Column(Boolean, nullable=False, default=True, server_default=text("true"))
 
     lots = relationship("Lot", back_populates="seller") 
     bids = relationship("Bid", back_populates="bidder") 
@@ -33,9 +42,29 @@ class Notification(Base):
     message = Column(Text, nullable=False)
     is_read = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Тип для сповіщень, що оновлюються на місці ("outbid"); NULL - звичайне
+    kind = Column(String(16), nullable=True)
+    lot_id = Column(Integer, ForeignKey("lots.id", ondelete="SET NULL"), nullable=True)
 
     recipient = relationship("User", back_populates="notifications")
 
+    # Як у postgres_tables.sql - щоб create_all давав ту саму схему
+    __table_args__ = (
+        Index("idx_notifications_user_id", "user_id"),
+        # Одне сповіщення "перебито" на (користувач, лот): нові події оновлюють його (upsert)
+        Index("uq_notifications_outbid", "user_id", "lot_id", unique=True, postgresql_where=text("kind = 'outbid'")),
+    )
+
+class Broadcast(Base):
+    """Сповіщення для всіх або сегмента користувачів - один рядок на розсилку (див. broadcasts.py)"""
+    __tablename__ = "broadcasts"
+
+    id = Column(BigInteger, primary_key=True)
+    message = Column(Text, nullable=False)
+    # Ключ broadcasts.SEGMENTS
+    segment = Column(String(32), nullable=False, default="all", server_default="all")
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
 class Lot(Base):
     __tablename__ = "lots"
     id = Column(Integer, primary_key=True, index=True)
@@ -54,12 +83,25 @@ class Lot(Base):
     seller_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     closed_at = Column(DateTime(timezone=True), nullable=True)
+    version = Column(BigInteger, nullable=False, server_default=lot_version_seq.next_value())
+    # Транзакція, що востаннє змінила лот (pg_current_xact_id), - для since_version у POST /lots/snapshots
+    version_xid = Column(BigInteger, nullable=False, server_default=text("(pg_current_xact_id()::text::bigint)"))
     
     seller = relationship("User", back_populates="lots")
     images = relationship("LotImage", back_populates="lot", cascade="all, delete-orphan")
     bids = relationship("Bid", back_populates="lot", order_by="desc(Bid.amount)", cascade="all, delete-orphan")
     payment = relationship("Payment", back_populates="lot", uselist=False, cascade="all, delete-orphan")
 
+    # Підтягуємо version (server_default) одразу після INSERT через RETURNING
+    __mapper_args__ = {"eager_defaults": True}
+
+    __table_args__ = (
+        # Лоти продавця по id: "мої лоти" і пакети каскаду бану (ban_jobs.py)
+        Index("idx_lots_seller_id", "seller_id", "id"),
+        # Завершені лоти за часом закриття - кандидати в архів (archive.py)
+        Index("idx_lots_finished_closed_at", "closed_at", postgresql_where=text("status IN ('sold', 'closed', 'closed_unsold')")),
+    )
+
 class LotImage(Base):
     __tablename__ = "lot_images"
     id = Column(Integer, primary_key=True, index=True)
@@ -79,6 +121,27 @@ class Bid(Base):
     bidder = relationship("User", back_populates="bids")
     lot = relationship("Lot", back_populates="bids")
 
+    # Як у postgres_tables.sql - щоб create_all давав ту саму схему
+    __table_args__ = (
+        Index("idx_bids_lot_id", "lot_id"),
+        # Найвища активна ставка лота - одним кроком індексу (знімки лотів, мінімальна ставка)
+        Index("idx_bids_lot_active_amount", "lot_id", text("amount DESC"), postgresql_where=text("is_active")),
+        # Активні ставки користувача по лотах - пакети каскаду бану (ban_jobs.py)
+        Index("idx_bids_user_active_lot", "user_id", "lot_id", postgresql_where=text("is_active")),
+    )
+
+class ProxyBid(Base):
+    """Автоматична ставка: сервер сам перебиває конкурентів до max_amount (див. proxy.py)"""
+    __tablename__ = "proxy_bids"
+    id = Column(Integer, primary_key=True, index=True)
+    lot_id = Column(Integer, ForeignKey("lots.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    max_amount = Column(Numeric(10, 2), nullable=False)
+    # Пріоритет при однаковому максимумі - хто раніше встановив
+    placed_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (UniqueConstraint("lot_id", "user_id", name="uq_proxy_bids_lot_user"),)
+
 class Payment(Base):
     __tablename__ = "payments"
     id = Column(Integer, primary_key=True, index=True)
@@ -89,7 +152,118 @@ class Payment(Base):
     payer = relationship("User", back_populates="payments")
     lot = relationship("Lot", back_populates="payment")
     
+class WatchlistItem(Base):
+    __tablename__ = "watchlist"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    lot_id = Column(Integer, ForeignKey("lots.id", ondelete="CASCADE"), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Унікальність (user_id, lot_id) заодно індексує список користувача
+    __table_args__ = (UniqueConstraint("user_id", "lot_id", name="uq_watchlist_user_lot"),)
+
+class IdempotencyKey(Base):
+    """Відповідь на запит з Idempotency-Key - для повторів клієнта (див. idempotency.py)"""
+    __tablename__ = "idempotency_keys"
+    id = Column(BigInteger, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    key = Column(String(255), nullable=False)
+    # Хеш методу, шляху і тіла: той самий ключ з іншим запитом - помилка клієнта
+    request_hash = Column(String(64), nullable=False)
+    # pending - перший запит ще виконується, done - відповідь збережено
+    status = Column(String(16), nullable=False, default="pending")
+    status_code = Column(Integer, nullable=True)
+    content_type = Column(String, nullable=True)
+    body = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+    __table_args__ = (UniqueConstraint("user_id", "key", name="uq_idempotency_keys_user_key"),)
+
+class BanJob(Base):
+    """Каскад бану, що виконується у фоні пакетами (див. ban_jobs.py)"""
+    __tablename__ = "ban_jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    admin_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    # pending -> running -> done | failed; cancelled - користувача розблоковано
+    status = Column(String(16), nullable=False, default="pending")
+    lots_total = Column(Integer, nullable=False, default=0)
+    lots_deleted = Column(Integer, nullable=False, default=0)
+    bid_lots_total = Column(Integer, nullable=False, default=0)
+    bid_lots_done = Column(Integer, nullable=False, default=0)
+    notifications_sent = Column(Integer, nullable=False, default=0)
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    # Оновлюється з кожним пакетом: завислу задачу (воркер упав) підхоплює інший
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+# --- АРХІВ (archive.py) ---
+# Завершені лоти старші за ARCHIVE_AFTER_DAYS разом зі ставками, фото й оплатами.
+# Колонки - як у гарячих таблиць (копіюються INSERT ... SELECT), id зберігаються.
+
+class ArchivedLot(Base):
+    __tablename__ = "lots_archive"
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    title = Column(String, nullable=False)
+    description = Column(Text, nullable=True)
+    start_price = Column(Numeric(10, 2), nullable=False)
+    current_price = Column(Numeric(10, 2), nullable=True)
+    min_step = Column(Numeric(10, 2))
+    status = Column(String)
+    image_url = Column(String, nullable=True)
+    payment_deadline_days = Column(Integer, nullable=False)
+    payment_deadline_hours = Column(Integer, nullable=False)
+    payment_deadline_minutes = Column(Integer, nullable=False)
+    payment_deadline = Column(DateTime(timezone=True), nullable=True)
+    lot_type = Column(String)
+    seller_id = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime(timezone=True))
+    closed_at = Column(DateTime(timezone=True), nullable=True)
+    version = Column(BigInteger, nullable=False)
+    version_xid = Column(BigInteger, nullable=True)
+    archived_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    seller = relationship("User", viewonly=True)
+    images = relationship("ArchivedLotImage", viewonly=True)
+
+    __table_args__ = (Index("idx_lots_archive_seller_id", "seller_id", "id"),)
+
+class ArchivedLotImage(Base):
+    __tablename__ = "lot_images_archive"
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    image_url = Column(String, nullable=False)
+    lot_id = Column(Integer, ForeignKey("lots_archive.id", ondelete="CASCADE"), nullable=False, index=True)
+
+class ArchivedBid(Base):
+    __tablename__ = "bids_archive"
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    amount = Column(Numeric(10, 2), nullable=False)
+    timestamp = Column(DateTime(timezone=True))
+    is_active = Column(Boolean)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    lot_id = Column(Integer, ForeignKey("lots_archive.id", ondelete="CASCADE"), nullable=False)
+
+    lot = relationship("ArchivedLot", viewonly=True)
+
+    __table_args__ = (
+        Index("idx_bids_archive_lot_id", "lot_id"),
+        # "Мої ставки" з архіву
+        Index("idx_bids_archive_user_id", "user_id", text("timestamp DESC")),
+    )
+
+class ArchivedPayment(Base):
+    __tablename__ = "payments_archive"
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    amount = Column(Numeric(10, 2), nullable=False)
+    created_at = Column(DateTime(timezone=True))
+    user_id = Column(Integer, ForeignKey("users.id"))
+    lot_id = Column(Integer, ForeignKey("lots_archive.id", ondelete="CASCADE"), nullable=False, index=True)
+
 class SiteSetting(Base):
     __tablename__ = "site_settings"
     key = Column(String, primary_key=True)
-    value = Column(Text, nullable=False)
\ No newline at end of file
+    value = Column(Text, nullable=False)
+    revision = Column(Integer, nullable=False, default=1, server_default="1")
\ No newline at end of file
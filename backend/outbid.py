@@ -0,0 +1,125 @@
+# backend/outbid.py
+import logging
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import Integer, Numeric, column, func, literal, values
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.future import select
+
+from database import AsyncSessionLocal
+from models import Bid, Lot, Notification, User
+import clock
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Сповіщення "вашу ставку перебито".
+#
+# Шлях ставки лише запам'ятовує подію в пам'яті воркера (record після
+# коміту) - жодного запису в БД на ставку. Події одного лота зливаються:
+# запам'ятовується ціна ДО першої ставки вікна. Фонова задача (flush)
+# забирає лоти, на яких OUTBID_DEBOUNCE_SECONDS не було ставок (або
+# подія старша за OUTBID_MAX_DELAY_SECONDS - щоб безперервна війна
+# ставок теж давала сповіщення), і одним INSERT ... SELECT на пакет
+# лотів сповіщає тих, чия активна ставка >= тієї ціни, але нижча за
+# поточну: саме вони були лідерами у вікні і їх перебили.
+#
+# Сповіщення upsert'ом по (користувач, лот): війна ставок дає один рядок
+# з останньою ціною, знову непрочитаний, а не десятки рядків. Хто
+# вимкнув users.notify_outbid, сповіщень не отримує.
+#
+# Події в пам'яті: падіння воркера втрачає ще не надіслані сповіщення
+# (ставки при цьому не страждають).
+
+OUTBID_ALERTS = os.getenv("OUTBID_ALERTS", "1") == "1"
+# Тиша на лоті, після якої надсилаємо сповіщення
+OUTBID_DEBOUNCE_SECONDS = float(os.getenv("OUTBID_DEBOUNCE_SECONDS", "5"))
+# Найдовше очікування під час безперервної війни ставок
+OUTBID_MAX_DELAY_SECONDS = float(os.getenv("OUTBID_MAX_DELAY_SECONDS", "30"))
+# Лотів на один INSERT
+OUTBID_FLUSH_BATCH = int(os.getenv("OUTBID_FLUSH_BATCH", "200"))
+OUTBID_FLUSH_INTERVAL = float(os.getenv("OUTBID_FLUSH_INTERVAL", "1"))
+
+KIND = "outbid"
+
+events_recorded = metrics.Counter("outbid_events_total", "Accepted bids recorded for outbid alerts")
+notifications_sent = metrics.Counter("outbid_notifications_total", "Outbid notifications inserted or refreshed")
+
+@dataclass
+class _Event:
+    since_price: Decimal
+    first_at: datetime
+    last_at: datetime
+
+# lot_id -> подія, що чекає надсилання
+_pending = {}
+
+metrics.Gauge("outbid_pending_lots", "Lots with outbid alerts waiting for flush", function=lambda: len(_pending))
+
+def record(lot_id, price_before):
+    """Після коміту ставки: price_before - ціна лота до неї"""
+    if not OUTBID_ALERTS:
+        return
+    events_recorded.inc()
+    now = clock.now()
+    event = _pending.get(lot_id)
+    if event is None:
+        _pending[lot_id] = _Event(price_before, now, now)
+    else:
+        # Ціна могла впасти (скасування ставки) - беремо нижчу межу вікна
+        event.since_price = min(event.since_price, price_before)
+        event.last_at = now
+
+def _due(now):
+    quiet = timedelta(seconds=OUTBID_DEBOUNCE_SECONDS)
+    longest = timedelta(seconds=OUTBID_MAX_DELAY_SECONDS)
+    return [lot_id for lot_id, event in _pending.items() if now - event.last_at >= quiet or now - event.first_at >= longest]
+
+def _notify_query(events):
+    window = values(column("lot_id", Integer), column("since_price", Numeric(10, 2)), name="outbid_events").data(events)
+    message = (
+        literal("Вашу ставку на лот '") + Lot.title
+        + literal("' перебито. Поточна ціна: $") + func.to_char(Lot.current_price, "FM999999990.00")
+    )
+    recipients = select(
+        Bid.user_id, message, literal(KIND), Lot.id, literal(False), func.now(),
+    ).select_from(Bid).join(window, window.c.lot_id == Bid.lot_id).join(Lot, Lot.id == Bid.lot_id).join(User, User.id == Bid.user_id).where(
+        Bid.is_active == True,
+        Bid.amount >= window.c.since_price,
+        Bid.amount < Lot.current_price,
+        Lot.status == "active",
+        User.notify_outbid == True,
+    ).distinct()
+    query = insert(Notification).from_select(["user_id", "message", "kind", "lot_id", "is_read", "created_at"], recipients)
+    # Повторна подія оновлює наявне сповіщення: нова ціна, знову непрочитане і вгорі списку
+    return query.on_conflict_do_update(
+        index_elements=["user_id", "lot_id"],
+        index_where=Notification.kind == KIND,
+        set_={"message": query.excluded.message, "is_read": False, "created_at": query.excluded.created_at},
+    )
+
+async def flush(drain=False):
+    """
+    Фонова задача: сповіщення для лотів, де ставки стихли; повертає кількість сповіщень.
+    drain=True - усі події одразу, без очікування тиші (tools.loadtest).
+    """
+    due = list(_pending) if drain else _due(clock.now())
+    sent = 0
+    for start in range(0, len(due), OUTBID_FLUSH_BATCH):
+        # Забираємо з черги до запиту: ставка під час запиту відкриє нове вікно
+        events = [(lot_id, _pending.pop(lot_id).since_price) for lot_id in due[start:start + OUTBID_FLUSH_BATCH]]
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(_notify_query(events))
+                await db.commit()
+        except Exception:
+            # Повертаємо події назад - наступний прохід спробує ще раз
+            for lot_id, since_price in events:
+                record(lot_id, since_price)
+            raise
+        sent += result.rowcount
+    notifications_sent.inc(sent)
+    return sent
@@ -0,0 +1,123 @@
+# backend/profiler.py
+import os
+import sys
+import time
+import asyncio
+import threading
+from collections import Counter
+
+from loopmonitor import monitor
+
+# Семплюючий профайлер воркера на вимогу.
+# Окремий потік кожні interval_ms знімає стек потоку event loop
+# (sys._current_frames) і задачу, що зараз виконується. Код застосунку
+# не інструментується, тож накладні витрати - лише на самі знімки.
+# Результат - collapsed stacks ("кадр;кадр;кадр N"), які приймають
+# flamegraph.pl, speedscope та inferno.
+# Корінь кожного стеку - мітка задачі: маршрут "GET /bids/{lot_id}",
+# ім'я фонової задачі, "(idle)" або "(no task)".
+
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "60"))
+PROFILER_MIN_INTERVAL_MS = 1.0
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)})"
+
+def _is_loop_plumbing(frame):
+    code = frame.f_code
+    return code.co_name == "_run" and code.co_filename.endswith(os.path.join("asyncio", "events.py"))
+
+def _collapse(frame):
+    """Стек від кореня до поточного кадру, без обв'язки event loop над Handle._run"""
+    names = []
+    while frame is not None:
+        if _is_loop_plumbing(frame):
+            break
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    names.reverse()
+    return names
+
+class SamplingProfiler:
+    def __init__(self, loop, interval_ms=5.0, route=None, task=None):
+        self.loop = loop
+        self.loop_thread_id = monitor.loop_thread_id or threading.get_ident()
+        self.interval = max(PROFILER_MIN_INTERVAL_MS, interval_ms) / 1000
+        self.route = route
+        self.task = task
+        self.stacks = Counter()
+        self.samples = 0
+        self.skipped = 0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _matches(self, label):
+        if self.route and not label.endswith(f" {self.route}"):
+            return False
+        if self.task and label != self.task:
+            return False
+        return True
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.loop_thread_id)
+        if frame is None:
+            return
+        try:
+            task = asyncio.current_task(self.loop)
+        except RuntimeError:
+            task = None
+        label = monitor.task_label(task)
+        if task is None and frame.f_code.co_filename.endswith("selectors.py"):
+            label = "(idle)"
+
+        if not self._matches(label):
+            self.skipped += 1
+            return
+        self.samples += 1
+        self.stacks[";".join([label, *_collapse(frame)])] += 1
+
+    def _run(self):
+        next_at = time.perf_counter()
+        while not self._stopped.is_set():
+            self._sample()
+            next_at += self.interval
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                self._stopped.wait(delay)
+            else:
+                # Не встигаємо - не наздоганяємо пачкою знімків
+                next_at = time.perf_counter()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+# Одночасно - лише один профіль на воркер
+_lock = asyncio.Lock()
+
+async def profile(seconds, interval_ms=5.0, route=None, task=None):
+    if _lock.locked():
+        raise ProfilerBusy("Another profile is already running in this worker")
+    seconds = min(max(seconds, 0.1), PROFILER_MAX_SECONDS)
+
+    async with _lock:
+        profiler = SamplingProfiler(asyncio.get_running_loop(), interval_ms, route=route, task=task)
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            # Якщо клієнт відвалився - задача скасована, потік все одно зупиняємо
+            profiler.stop()
+        return profiler
@@ -0,0 +1,118 @@
+# backend/proxy.py
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy.future import select
+
+from models import Bid, ProxyBid
+
+# Автоматичні (proxy) ставки.
+#
+# Покупець задає max_amount, і сервер сам перебиває конкурентів на min_step,
+# доки не впреться в максимум. Покроково це виглядало б як війна ставок:
+# поки є учасник (не лідер) з максимумом >= ціна + крок, найпріоритетніший
+# з них (більший максимум, за рівності - раніший) ставить ціна + крок.
+# Тут та сама війна рахується в закритій формі: перебивати одне одного
+# продовжують лише два найпріоритетніші учасники - третій вибуває, щойно
+# ціна перейде його максимум, а до того він завжди поступається другому.
+# Записуються лише підсумкові видимі ставки учасників, а не кожен крок.
+# tests/test_proxy.py порівнює resolve() з покроковою симуляцією.
+
+@dataclass(frozen=True)
+class Contender:
+    user_id: int
+    max_amount: Decimal
+    placed_at: datetime
+
+def _priority(contender):
+    return (-contender.max_amount, contender.placed_at, contender.user_id)
+
+def _smallest_odd_above(value):
+    return value + 1 if (value + 1) % 2 else value + 2
+
+def _smallest_even_above(value):
+    return value + 1 if (value + 1) % 2 == 0 else value + 2
+
+def resolve(price, step, leader_id, proxies):
+    """
+    Підсумок війни автоматичних ставок.
+    price, leader_id - видима ціна і лідер до неї; proxies - Contender'и лота.
+    Повертає (ціна, лідер, {user_id: остання видима ставка}) - лише для тих,
+    хто в ході війни ставив.
+    """
+    contenders = sorted(
+        (p for p in proxies if p.max_amount >= (price if p.user_id == leader_id else price + step)),
+        key=_priority,
+    )[:2]
+    raised = {}
+
+    # 1. Лідер не серед двох найсильніших: першим ставить найпріоритетніший
+    if not any(c.user_id == leader_id for c in contenders):
+        if not contenders:
+            return price, leader_id, raised
+        price += step
+        leader_id = contenders[0].user_id
+        raised[leader_id] = price
+
+    if len(contenders) < 2:
+        return price, leader_id, raised
+
+    # 2. Далі по черзі: на непарних кроках k ставить претендент Y (ціна + k кроків),
+    # на парних - лідер X. Війна зупиняється на першому кроці, який учасник не потягне
+    leader, challenger = sorted(contenders, key=lambda c: c.user_id != leader_id)
+    leader_steps = int((leader.max_amount - price) // step)
+    challenger_steps = int((challenger.max_amount - price) // step)
+    steps = min(_smallest_odd_above(challenger_steps), _smallest_even_above(leader_steps)) - 1
+    if steps <= 0:
+        return price, leader_id, raised
+
+    final = price + steps * step
+    winner, loser = (leader, challenger) if steps % 2 == 0 else (challenger, leader)
+    raised[winner.user_id] = final
+    # Переможений ставив на попередньому кроці (лідер X - лише з кроку 2)
+    if loser is challenger or steps >= 3:
+        raised[loser.user_id] = final - step
+    return final, winner.user_id, raised
+
+async def load_state(db, lot_id, user_ids):
+    """Автоматичні ставки лота і активні ставки учасників - двома запитами"""
+    proxies = {p.user_id: p for p in (await db.execute(select(ProxyBid).where(ProxyBid.lot_id == lot_id))).scalars()}
+    users = set(user_ids) | set(proxies)
+    bids_query = select(Bid).where(Bid.lot_id == lot_id, Bid.user_id.in_(users), Bid.is_active == True)
+    bids = {bid.user_id: bid for bid in (await db.execute(bids_query)).scalars()}
+    return proxies, bids
+
+def apply_bid(db, lot, user_id, amount, max_amount, proxies, bids, now):
+    """
+    Ставка користувача разом з відповіддю автоматичних ставок.
+    Правила (sequencer.check_bid) вже перевірені, lot заблоковано.
+    proxies і bids (з load_state) оновлюються на місці - так пакет
+    ставок у sequencer.py бачить результат попередніх.
+    Повертає (ставка користувача, "new" | "raised").
+    """
+    kind = "raised" if user_id in bids else "new"
+
+    if max_amount is not None:
+        proxy = proxies.get(user_id)
+        if proxy is None:
+            proxy = ProxyBid(lot_id=lot.id, user_id=user_id)
+            db.add(proxy)
+            proxies[user_id] = proxy
+        proxy.max_amount = max_amount
+        proxy.placed_at = now
+
+    contenders = [Contender(p.user_id, p.max_amount, p.placed_at) for p in proxies.values()]
+    price, _, raised = resolve(amount, lot.min_step, user_id, contenders)
+
+    for bidder_id, bid_amount in {user_id: amount, **raised}.items():
+        bid = bids.get(bidder_id)
+        if bid is None:
+            bid = Bid(lot_id=lot.id, user_id=bidder_id, is_active=True)
+            db.add(bid)
+            bids[bidder_id] = bid
+        bid.amount = bid_amount
+        bid.timestamp = now
+
+    lot.current_price = price
+    return bids[user_id], kind
@@ -0,0 +1,230 @@
+# backend/querystats.py
+import os
+import time
+import logging
+import contextvars
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Лічильник SQL-запитів на HTTP-запит / прохід фонової задачі.
+# Хуки висять на класі Engine, тому охоплюють і primary, і репліки.
+# - однаковий запит, повторений SQL_NPLUS1_THRESHOLD разів, - ознака N+1
+# - QUERY_BUDGETS задає максимум запитів для маршруту; в строгому режимі
+#   (SQL_BUDGET_STRICT=1, для dev/CI) перевищення валить запит
+# - в dev відповідь отримує заголовок Server-Timing з часом БД
+
+SQL_NPLUS1_THRESHOLD = int(os.getenv("SQL_NPLUS1_THRESHOLD", "5"))
+SQL_BUDGET_STRICT = os.getenv("SQL_BUDGET_STRICT", "0") == "1"
+SERVER_TIMING = os.getenv("SERVER_TIMING", "1" if os.getenv("DB_PROFILE", "dev") == "dev" else "0") == "1"
+
+# Максимум запитів на холодному шляху (кеш порожній, користувач уже існує).
+# Перевіряється в tests/test_query_budgets.py - новий маршрут без бюджету валить CI.
+# Перший вхід (створення користувача в get_current_user_db, +3 запити)
+# клієнт робить через GET /users/me - його бюджет це враховує.
+QUERY_BUDGETS = {
+    ("GET", "/lots/"): 2,
+    ("GET", "/lots/my"): 4,
+    ("POST", "/lots/"): 6,
+    ("GET", "/lots/{lot_id}"): 3,
+    ("PATCH", "/lots/{lot_id}"): 6,
+    ("POST", "/lots/{lot_id}/close"): 6,
+    ("DELETE", "/lots/{lot_id}"): 7,
+    ("POST", "/lots/{lot_id}/reopen"): 6,
+    ("GET", "/bids/my"): 4,
+    ("GET", "/bids/{lot_id}"): 4,
+    # Ставка і оплата з Idempotency-Key: +2 (зайняти ключ, зберегти відповідь);
+    # ставка ще перечитує бан під FOR SHARE (ban_jobs.blocked_users)
+    ("POST", "/bids/{lot_id}"): 11,
+    ("DELETE", "/bids/{bid_id}"): 9,
+    ("POST", "/payments/"): 10,
+    ("GET", "/users/me"): 4,
+    ("PATCH", "/users/me"): 6,
+    ("GET", "/users/notifications"): 3,
+    ("GET", "/users/notifications/unread-count"): 3,
+    ("POST", "/users/notifications/read"): 5,
+    ("GET", "/users/watchlist"): 2,
+    ("PUT", "/users/watchlist/{lot_id}"): 4,
+    ("DELETE", "/users/watchlist/{lot_id}"): 2,
+    ("POST", "/lots/snapshots"): 3,
+    ("GET", "/settings/rules"): 2,
+    ("PUT", "/settings/rules"): 7,
+    ("GET", "/admin/users"): 3,
+    ("POST", "/admin/users/{user_id}/unblock"): 6,
+    # Лот зі ставками: ORM-каскад читає картинки, ставки й оплату
+    ("DELETE", "/admin/lots/{lot_id}"): 10,
+    ("GET", "/admin/profile"): 2,
+    # Каскад - у ban_jobs.py, запит лише ставить прапорець і створює задачу
+    ("POST", "/admin/users/{user_id}/block"): 8,
+    ("GET", "/admin/ban-jobs"): 2,
+    ("GET", "/admin/ban-jobs/{job_id}"): 2,
+    ("POST", "/admin/broadcasts"): 3,
+    ("GET", "/views/lot/{lot_id}"): 6,
+    ("GET", "/views/profile"): 7,
+    # Не залежить від кількості прострочених лотів (tests/test_query_budgets.py)
+    ("POST", "/payments/check-expired"): 5,
+}
+
+queries_per_request = metrics.Histogram(
+    "db_queries_per_request", "SQL statements per request or task iteration", ["source"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100),
+)
+db_time_per_request = metrics.Histogram(
+    "db_time_per_request_seconds", "Total SQL time per request or task iteration", ["source"]
+)
+repeated_statements = metrics.Counter(
+    "db_repeated_statements_total", "Statements repeated N+1-style within one request", ["source"]
+)
+budget_exceeded = metrics.Counter(
+    "db_query_budget_exceeded_total", "Requests that ran more statements than their budget", ["source"]
+)
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+class QueryStats:
+    def __init__(self, source, budget=None, scope=None, parent=None):
+        self.source = source
+        self.budget = budget
+        self.scope = scope
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = {}
+        self._over_budget = False
+        # Зовнішній лічильник (assert_max_queries навколо HTTP-запиту) теж бачить запити
+        self.parent = parent
+
+    def label(self):
+        # Для HTTP маршрут відомий лише після роутингу
+        if self.scope is not None:
+            route = self.scope.get("route")
+            if route is not None:
+                return f"{self.scope['method']} {route.path}"
+        return self.source
+
+    def current_budget(self):
+        if self.budget is not None:
+            return self.budget
+        if self.scope is not None and self.scope.get("route") is not None:
+            return QUERY_BUDGETS.get((self.scope["method"], self.scope["route"].path))
+        return None
+
+    def _record(self, shape):
+        self.count += 1
+        repeats = self.shapes.get(shape, 0) + 1
+        self.shapes[shape] = repeats
+        if self.parent is not None:
+            self.parent._record(shape)
+        return repeats
+
+    def before(self, statement):
+        shape = " ".join(statement.split())
+        repeats = self._record(shape)
+        if repeats == SQL_NPLUS1_THRESHOLD:
+            repeated_statements.inc(source=self.label())
+            logger.warning(
+                "Possible N+1: statement repeated %sx in %s", repeats, self.label(),
+                extra={"statement": shape[:200]},
+            )
+
+        budget = self.current_budget()
+        if budget is not None and self.count > budget and not self._over_budget:
+            self._over_budget = True
+            budget_exceeded.inc(source=self.label())
+            logger.warning("Query budget exceeded in %s: more than %s statements", self.label(), budget)
+            if SQL_BUDGET_STRICT:
+                raise QueryBudgetExceeded(f"{self.label()}: more than {budget} SQL statements")
+
+    def report(self):
+        """Найчастіші запити - для повідомлень про помилки"""
+        top = sorted(self.shapes.items(), key=lambda item: item[1], reverse=True)[:5]
+        return "\n".join(f"  {count}x {shape[:200]}" for shape, count in top)
+
+    def finish(self):
+        source = self.label()
+        queries_per_request.observe(self.count, source=source)
+        db_time_per_request.observe(self.duration, source=source)
+
+_current = contextvars.ContextVar("query_stats", default=None)
+
+def current():
+    return _current.get()
+
+@contextmanager
+def track(source, budget=None, scope=None):
+    stats = QueryStats(source, budget=budget, scope=scope, parent=_current.get())
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+        stats.finish()
+
+@contextmanager
+def assert_max_queries(limit):
+    """
+    Для перевірок у скриптах/тестах:
+        with assert_max_queries(3):
+            await client.get("/lots/1")
+    Рахує всі запити в поточному контексті, включно з вкладеними
+    лічильниками (QueryStatsMiddleware, track фонових задач).
+    """
+    stats = QueryStats("assert_max_queries", parent=_current.get())
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+    if stats.count > limit:
+        raise QueryBudgetExceeded(f"Expected at most {limit} SQL statements, got {stats.count}:\n{stats.report()}")
+
+# --- ХУКИ ДВИЖКА ---
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+    stats = _current.get()
+    if stats is not None:
+        stats.before(statement)
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.duration += time.perf_counter() - started
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    # Запит упав (або його зупинив бюджет) - after_cursor_execute не буде
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+# --- HTTP ---
+
+class QueryStatsMiddleware:
+    """Чистий ASGI middleware: окремий QueryStats на кожен HTTP-запит"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track("unmatched", scope=scope) as stats:
+            async def send_wrapper(message):
+                if SERVER_TIMING and message["type"] == "http.response.start":
+                    headers = list(message.get("headers", []))
+                    value = f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"'
+                    headers.append((b"server-timing", value.encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
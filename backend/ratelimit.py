@@ -0,0 +1,164 @@
+# backend/ratelimit.py
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from fastapi import Depends, HTTPException, Request
+
+from auth import get_current_user
+import metrics
+import sequencer
+
+logger = logging.getLogger(__name__)
+
+# Обмеження частоти запитів (token bucket) для дорогих POST/DELETE.
+#
+# Перевірка йде після JWT, але до get_current_user_db: перевищення ліміту
+# відповідає 429 з Retry-After без жодного запиту до БД. Відра - в пам'яті
+# воркера; спільного сховища в цьому стеку немає, тож за
+# RATE_LIMIT_SPLIT_WORKERS=1 ліміт ділиться на WORKER_COUNT - за рівномірного
+# балансування сума по воркерах дорівнює заданій. Ліміт на лот не ділиться,
+# якщо увімкнено BID_SEQUENCER: тоді /bids/{lot_id} і так приходить до одного
+# воркера (див. sequencer.py).
+#
+# Ліміти маршрутів - у RATE_LIMITS; RATE_LIMIT_OVERRIDES їх замінює, напр.
+#   "POST /bids/{lot_id}=user:2/5,lot:100/200;DELETE /bids/{bid_id}=user:0.5/3"
+# (scope:швидкість за секунду/розмір відра, обидва > 0; помилка в правилі
+# зупиняє старт, а не дає 500 на запитах).
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+RATE_LIMIT_SPLIT_WORKERS = os.getenv("RATE_LIMIT_SPLIT_WORKERS", "1") == "1"
+# IP клієнта з першої адреси X-Forwarded-For (лише за довіреним проксі)
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "0") == "1"
+# Скільки відер тримати; найдавніше використане витісняється (і рахується повним)
+RATE_LIMIT_MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", "100000"))
+
+SCOPES = ("user", "ip", "lot")
+
+@dataclass(frozen=True)
+class Limit:
+    scope: str  # user | ip | lot
+    rate: float  # токенів за секунду
+    burst: float  # розмір відра
+
+RATE_LIMITS = {
+    ("POST", "/bids/{lot_id}"): (Limit("user", 5, 10), Limit("ip", 50, 100), Limit("lot", 200, 400)),
+    ("DELETE", "/bids/{bid_id}"): (Limit("user", 1, 5), Limit("ip", 10, 20)),
+    ("POST", "/payments/"): (Limit("user", 1, 5), Limit("ip", 10, 20)),
+}
+
+rate_limited = metrics.Counter("rate_limited_total", "Requests rejected by rate limits", ["route", "scope"])
+
+def _parse_overrides(value):
+    limits = {}
+    for rule in filter(None, (part.strip() for part in value.split(";"))):
+        route, _, spec = rule.partition("=")
+        method, _, path = route.strip().partition(" ")
+        parsed = []
+        for item in spec.split(","):
+            scope, _, numbers = item.strip().partition(":")
+            rate, _, burst = numbers.partition("/")
+            limit = Limit(scope, float(rate), float(burst or rate))
+            # Швидкість 0 - ділення на нуль у check (500 замість 429); закрити маршрут так не можна
+            if limit.scope not in SCOPES or not limit.rate > 0 or not limit.burst > 0:
+                raise RuntimeError(f"Invalid RATE_LIMIT_OVERRIDES rule '{rule}': scope must be one of {', '.join(SCOPES)}, rate and burst must be positive")
+            parsed.append(limit)
+        limits[(method.upper(), path.strip())] = tuple(parsed)
+    return limits
+
+RATE_LIMITS.update(_parse_overrides(os.getenv("RATE_LIMIT_OVERRIDES", "")))
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, burst, now):
+        self.tokens = burst
+        self.updated = now
+
+    def refill(self, rate, burst, now):
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+
+_buckets = OrderedDict()
+
+metrics.Gauge("rate_limit_buckets", "Token buckets held in memory", function=lambda: len(_buckets))
+
+def _share(limit):
+    if not RATE_LIMIT_SPLIT_WORKERS or (limit.scope == "lot" and sequencer.BID_SEQUENCER):
+        return 1
+    return max(sequencer.WORKER_COUNT, 1)
+
+def _client_ip(request: Request):
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+def _subject(limit, request, token_data):
+    if limit.scope == "user":
+        return token_data.get("sub")
+    if limit.scope == "ip":
+        return _client_ip(request)
+    if limit.scope == "lot":
+        return request.path_params.get("lot_id")
+    return None
+
+def _bucket(key, burst, now):
+    bucket = _buckets.get(key)
+    if bucket is None:
+        bucket = _buckets[key] = TokenBucket(burst, now)
+        if len(_buckets) > RATE_LIMIT_MAX_BUCKETS:
+            _buckets.popitem(last=False)
+    else:
+        _buckets.move_to_end(key)
+    return bucket
+
+def check(route, limits, subjects, now=None):
+    """
+    Знімає по токену з кожного відра або з жодного.
+    subjects - значення scope для кожного ліміту (None - ліміт пропускається).
+    Повертає (None, None) або (секунд до повтору, scope, що не пройшов).
+    """
+    now = time.monotonic() if now is None else now
+    taken, retry_after, failed = [], 0.0, None
+    for limit, subject in zip(limits, subjects):
+        if subject is None:
+            continue
+        share = _share(limit)
+        rate, burst = limit.rate / share, max(limit.burst / share, 1)
+        bucket = _bucket((route, limit.scope, subject), burst, now)
+        bucket.refill(rate, burst, now)
+        if bucket.tokens < 1:
+            wait = (1 - bucket.tokens) / rate
+            if wait > retry_after:
+                retry_after, failed = wait, limit.scope
+        taken.append(bucket)
+
+    if failed is not None:
+        return retry_after, failed
+    # Жодне відро не порожнє - лише тоді знімаємо: відмова за лотом не витрачає ліміт користувача
+    for bucket in taken:
+        bucket.tokens -= 1
+    return None, None
+
+async def rate_limit(request: Request, token_data: dict = Depends(get_current_user)):
+    """Dependency: 429 з Retry-After, якщо маршрут вичерпав хоч один свій ліміт"""
+    if not RATE_LIMIT_ENABLED:
+        return
+    route = (request.method, request.scope["route"].path)
+    limits = RATE_LIMITS.get(route)
+    if not limits:
+        return
+
+    retry_after, scope = check(route, limits, [_subject(rule, request, token_data) for rule in limits])
+    if retry_after is not None:
+        rate_limited.inc(route=f"{route[0]} {route[1]}", scope=scope)
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many requests ({scope} limit)",
+            headers={"Retry-After": str(max(math.ceil(retry_after), 1))},
+        )
@@ -1,16 +1,28 @@
 # backend/routers/admin.py
 
+import os
+import time
+import logging
+
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import PlainTextResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import delete, update
-from datetime import datetime, timedelta, timezone
-from typing import List
+from sqlalchemy import delete
+from datetime import timedelta
+from typing import List, Optional
 
 from database import get_db
-from models import User, Lot, Bid, Notification, LotImage  # ДОДАНО LotImage
-from schemas import UserOut, BlockUserRequest
-from dependencies import get_current_user_db
+from models import User, Lot, Notification, LotImage, ProxyBid, BanJob
+from schemas import UserOut, BlockUserRequest, BanJobOut, BroadcastCreate, BroadcastOut
+from dependencies import get_current_user_db, get_user_read_db
+import ban_jobs
+import broadcasts
+import cache
+import clock
+import profiler
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/admin",
@@ -22,16 +34,7 @@ def check_admin(user: User):
     if not user.is_admin:
         raise HTTPException(status_code=403, detail="Admin privileges required")
 
-# 1. Список всіх користувачів
-@router.get("/users", response_model=List[UserOut])
-async def get_all_users(
-    search: str = "",
-    only_blocked: bool = False,
-    current_user: User = Depends(get_current_user_db),
-    db: AsyncSession = Depends(get_db)
-):
-    check_admin(current_user)
-    
+async def _list_users(db: AsyncSession, search: str = "", only_blocked: bool = False):
     query = select(User).order_by(User.id.desc())
     
     if search:
@@ -43,8 +46,19 @@ async def get_all_users(
     result = await db.execute(query)
     return result.scalars().all()
 
-# 2. Заблокувати користувача + ВИДАЛИТИ ЛОТИ + СКАСУВАТИ СТАВКИ
-@router.post("/users/{user_id}/block")
+# 1. Список всіх користувачів
+@router.get("/users", response_model=List[UserOut])
+async def get_all_users(
+    search: str = "",
+    only_blocked: bool = False,
+    current_user: User = Depends(get_current_user_db),
+    db: AsyncSession = Depends(get_user_read_db)
+):
+    check_admin(current_user)
+    return await _list_users(db, search, only_blocked)
+
+# 2. Заблокувати користувача; лоти і ставки прибирає фонова задача (ban_jobs.py)
+@router.post("/users/{user_id}/block", status_code=status.HTTP_202_ACCEPTED)
 async def block_user(
     user_id: int,
     block_data: BlockUserRequest,
@@ -53,8 +67,9 @@ async def block_user(
 ):
     check_admin(current_user)
     
-    # Знаходимо користувача
-    user_query = select(User).where(User.id == user_id)
+    # Знаходимо користувача (FOR UPDATE: ставки і нові лоти, що вже перевіряють
+    # бан під FOR SHARE, комітяться до нас, решта дочекається бану - ban_jobs.py)
+    user_query = select(User).where(User.id == user_id).with_for_update()
     result = await db.execute(user_query)
     target_user = result.scalar_one_or_none()
     
@@ -71,63 +86,57 @@ async def block_user(
     if block_data.is_permanent:
         target_user.ban_until = None
     else:
-        target_user.ban_until = datetime.now(timezone.utc) + timedelta(days=block_data.duration_days)
+        target_user.ban_until = clock.now() + timedelta(days=block_data.duration_days)
 
-    # 2. СПОЧАТКУ видаляємо зображення лотів (щоб уникнути ForeignKey error)
-    # Знаходимо всі лоти користувача
-    lots_query = select(Lot).where(Lot.seller_id == user_id)
-    lots_result = await db.execute(lots_query)
-    user_lots = lots_result.scalars().all()
-    
-    # Видаляємо зображення для кожного лота
-    for lot in user_lots:
-        delete_images_query = delete(LotImage).where(LotImage.lot_id == lot.id)
-        await db.execute(delete_images_query)
-    
-    # 3. Тепер видаляємо самі ЛОТИ (Hard Delete)
-    del_lots_query = delete(Lot).where(Lot.seller_id == user_id)
-    await db.execute(del_lots_query)
-    
-    # 4. Скасовуємо його СТАВКИ (Soft Delete + Recalculate Prices)
-    
-    # А) Спочатку знаходимо ID лотів, де цей юзер мав АКТИВНІ ставки
-    active_bids_query = select(Bid).where(Bid.user_id == user_id, Bid.is_active == True)
-    active_bids_res = await db.execute(active_bids_query)
-    bids_to_cancel = active_bids_res.scalars().all()
-    
-    affected_lot_ids = {bid.lot_id for bid in bids_to_cancel}
+    # 2. Автоматичні ставки забаненого більше не відповідають конкурентам - одразу, не чекаючи каскаду
+    await db.execute(delete(ProxyBid).where(ProxyBid.user_id == user_id))
 
-    # Б) Деактивуємо ставки
-    deactivate_query = update(Bid).where(Bid.user_id == user_id).values(is_active=False)
-    await db.execute(deactivate_query)
-    
-    # В) ПЕРЕРАХОВУЄМО ЦІНИ для постраждалих лотів
-    for lot_id in affected_lot_ids:
-        # Шукаємо лот
-        lot_q = select(Lot).where(Lot.id == lot_id)
-        lot_r = await db.execute(lot_q)
-        lot = lot_r.scalar_one_or_none()
-        
-        if lot and lot.status == "active":
-            # Шукаємо нову найвищу активну ставку
-            new_best_bid_q = select(Bid)\
-                .where(Bid.lot_id == lot_id, Bid.is_active == True)\
-                .order_by(Bid.amount.desc())\
-                .limit(1)
-            
-            new_best_bid_res = await db.execute(new_best_bid_q)
-            new_best_bid = new_best_bid_res.scalar_one_or_none()
-            
-            if new_best_bid:
-                lot.current_price = new_best_bid.amount
-                print(f"Recalculated Lot #{lot_id}: New price {lot.current_price} (User #{new_best_bid.user_id})")
-            else:
-                # Якщо ставок більше немає, повертаємось до стартової
-                lot.current_price = lot.start_price
-                print(f"Recalculated Lot #{lot_id}: Reset to start price {lot.start_price}")
+    # 3. Лоти, ставки і перерахунок цін - фоновою задачею, пакетами
+    job = await ban_jobs.create(db, target_user, current_user.id)
+    job_id, username = job.id, target_user.username
+    await db.commit()
+    ban_jobs.start(job_id)
+    logger.info("User blocked, cascade queued", extra={"user_id": user_id, "job_id": job_id})
+    return {"message": f"User {username} blocked. Lots and bids are being removed in the background.", "job_id": job_id}
 
+@router.get("/ban-jobs", response_model=List[BanJobOut])
+async def list_ban_jobs(
+    user_id: Optional[int] = None,
+    current_user: User = Depends(get_current_user_db),
+    db: AsyncSession = Depends(get_db)
+):
+    check_admin(current_user)
+    query = select(BanJob).order_by(BanJob.id.desc()).limit(50)
+    if user_id is not None:
+        query = query.where(BanJob.user_id == user_id)
+    return (await db.execute(query)).scalars().all()
+
+@router.get("/ban-jobs/{job_id}", response_model=BanJobOut)
+async def get_ban_job(
+    job_id: int,
+    current_user: User = Depends(get_current_user_db),
+    db: AsyncSession = Depends(get_db)
+):
+    check_admin(current_user)
+    job = (await db.execute(select(BanJob).where(BanJob.id == job_id))).scalar_one_or_none()
+    if not job:
+        raise HTTPException(status_code=404, detail="Ban job not found")
+    return job
+
+# Розсилка всім або сегменту (обслуговування, оголошення) - один рядок, див. broadcasts.py
+@router.post("/broadcasts", response_model=BroadcastOut, status_code=status.HTTP_201_CREATED)
+async def create_broadcast(
+    data: BroadcastCreate,
+    current_user: User = Depends(get_current_user_db),
+    db: AsyncSession = Depends(get_db)
+):
+    check_admin(current_user)
+    if data.segment not in broadcasts.SEGMENTS:
+        raise HTTPException(status_code=400, detail=f"Unknown segment. Allowed: {', '.join(broadcasts.SEGMENTS)}")
+    broadcast = broadcasts.create(db, data.message, data.segment)
     await db.commit()
-    return {"message": f"User {target_user.username} blocked. Lots deleted. Bids cancelled and prices updated."}
+    await db.refresh(broadcast)
+    return broadcast
 
 # 3. Розблокувати
 @router.post("/users/{user_id}/unblock")
@@ -148,7 +157,11 @@ async def unblock_user(
     target_user.is_blocked = False
     target_user.ban_reason = None
     target_user.ban_until = None
+    # Незавершений каскад бану більше не чистить його лоти і ставки
+    await ban_jobs.cancel(db, target_user.id)
     
+    # is_blocked продавця вбудований у картки його лотів
+    cache.invalidate_seller_lots(db, target_user.id)
     await db.commit()
     return {"message": "User unblocked"}
 
@@ -187,6 +200,40 @@ async def admin_delete_lot(
     )
     db.add(notification)
 
+    cache.invalidate_lot(db, lot_id)
     await db.commit()
     
-    return {"message": f"Lot #{lot_id} deleted. Notification sent to seller."}
\ No newline at end of file
+    return {"message": f"Lot #{lot_id} deleted. Notification sent to seller."}
+
+# 5. Семплюючий профіль воркера, що обробив запит (collapsed stacks для flamegraph)
+@router.get("/profile")
+async def profile_worker(
+    seconds: float = 10,
+    interval_ms: float = 5,
+    route: str = "",
+    task: str = "",
+    current_user: User = Depends(get_current_user_db),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    route - шаблон маршруту, напр. /bids/{lot_id}; task - ім'я фонової задачі,
+    напр. check_expired_payments. Профілюється лише поточний воркер.
+    """
+    check_admin(current_user)
+    # Не тримаємо з'єднання з БД відкритим на весь час профілювання
+    await db.rollback()
+
+    try:
+        result = await profiler.profile(seconds, interval_ms, route=route or None, task=task or None)
+    except profiler.ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    filename = f"profile-{os.getpid()}-{int(time.time())}.collapsed"
+    return PlainTextResponse(
+        result.collapsed(),
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Profile-Samples": str(result.samples),
+            "X-Profile-Skipped": str(result.skipped),
+        },
+    )
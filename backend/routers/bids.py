@@ -1,43 +1,68 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, status, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import joinedload
-from datetime import datetime, timezone, timedelta
+from sqlalchemy.orm import joinedload, contains_eager
+from sqlalchemy import delete
+from datetime import timedelta
 from typing import List
 
 from database import get_db
-from models import Bid, Lot, User
+from models import Bid, Lot, User, ProxyBid, ArchivedBid, ArchivedLot
 from schemas import BidCreate, BidOut, BidOutWithLot
-from dependencies import get_current_user_db
+from dependencies import get_current_user_db, get_user_read_db
+import ban_jobs
+import cache
+import clock
+import conditional
+import idempotency
+import metrics
+import outbid
+import proxy
+import ratelimit
+import sequencer
+
+logger = logging.getLogger(__name__)
+
+bids_accepted = metrics.Counter("bids_accepted_total", "Accepted bids", ["kind"])
+bids_rejected = metrics.Counter("bids_rejected_total", "Rejected bids", ["reason"])
 
 router = APIRouter(
     prefix="/bids",
     tags=["bids"]
 )
 
+async def _my_bids(db: AsyncSession, user_id: int):
+    query = select(Bid).options(joinedload(Bid.lot)).where(Bid.user_id == user_id).order_by(Bid.timestamp.desc())
+    result = await db.execute(query)
+    bids = result.scalars().all()
+    # Плюс ставки на архівні (давно завершені) лоти
+    query = select(ArchivedBid).options(joinedload(ArchivedBid.lot)).where(ArchivedBid.user_id == user_id)
+    result = await db.execute(query)
+    return sorted([*bids, *result.scalars().all()], key=lambda bid: bid.timestamp, reverse=True)
+
 # --- 1. СПОЧАТКУ РОУТИ З КОНКРЕТНИМИ ІМЕНАМИ (/my) ---
 
 @router.get("/my", response_model=list[BidOutWithLot])
 async def get_my_bids(
     current_user: User = Depends(get_current_user_db),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_user_read_db)
 ):
-    query = select(Bid).options(joinedload(Bid.lot)).where(Bid.user_id == current_user.id).order_by(Bid.timestamp.desc())
-    result = await db.execute(query)
-    bids = result.scalars().all()
-    return bids
+    return await _my_bids(db, current_user.id)
 
 # --- 2. ПОТІМ РОУТИ З ДИНАМІЧНИМИ ID ({id}) ---
 
 # Скасувати ставку (HARD DELETE + ОНОВЛЕННЯ ЦІНИ)
-@router.delete("/{bid_id}")
+@router.delete("/{bid_id}", dependencies=[Depends(ratelimit.rate_limit)])
 async def cancel_bid(
     bid_id: int,
     current_user: User = Depends(get_current_user_db),
     db: AsyncSession = Depends(get_db)
 ):
-    # 1. Знаходимо ставку разом з лотом
-    query = select(Bid).options(joinedload(Bid.lot)).where(Bid.id == bid_id)
+    # 1. Знаходимо ставку разом з лотом (FOR UPDATE на лоті, як у place_bid і
+    # sequencer: інакше перерахунок нижче перезапише ціну паралельної ставки)
+    query = select(Bid).join(Bid.lot).options(contains_eager(Bid.lot)).where(Bid.id == bid_id).with_for_update(of=Lot)
     result = await db.execute(query)
     bid = result.scalar_one_or_none()
 
@@ -62,8 +87,12 @@ async def cancel_bid(
         if current_winner and current_winner.id != bid.id:
              raise HTTPException(status_code=400, detail="You can only cancel if you are the current winner")
 
-    # 3. HARD DELETE - Фізично видаляємо ставку
-    await db.delete(bid)
+    # 3. HARD DELETE - Фізично видаляємо ставку (і автоматичну ставку на цей лот).
+    # Паралельне скасування могло видалити її, поки ми чекали на замок лота
+    deleted = await db.execute(delete(Bid).where(Bid.id == bid.id), execution_options={"synchronize_session": False})
+    if not deleted.rowcount:
+        raise HTTPException(status_code=404, detail="Bid not found")
+    await db.execute(delete(ProxyBid).where(ProxyBid.lot_id == lot.id, ProxyBid.user_id == current_user.id))
     
     # 4. ПЕРЕРАХУНОК ЦІНИ (Хто тепер лідер?)
     # Шукаємо наступну найвищу АКТИВНУ ставку
@@ -81,7 +110,7 @@ async def cancel_bid(
         
         # Якщо лот був у стані очікування оплати, оновлюємо таймер для нового переможця
         if lot.status == "pending_payment":
-            now = datetime.now(timezone.utc)
+            now = clock.now()
             lot.payment_deadline = now + timedelta(
                 days=lot.payment_deadline_days,
                 hours=lot.payment_deadline_hours,
@@ -96,86 +125,107 @@ async def cancel_bid(
             lot.status = "active"
             lot.payment_deadline = None
 
+    cache.invalidate_lot(db, lot.id)
     await db.commit()
     return {"message": "Bid cancelled successfully"}
 
-# Зробити ставку (POST)
-@router.post("/{lot_id}", response_model=BidOut)
-async def place_bid(
-    lot_id: int,
-    bid_data: BidCreate,
-    current_user: User = Depends(get_current_user_db),
-    db: AsyncSession = Depends(get_db)
-):
-    # 1. Знаходимо лот
-    query = select(Lot).where(Lot.id == lot_id)
+async def _place_bid_locked(db: AsyncSession, lot_id: int, user_id: int, amount, max_amount=None):
+    """Звичайний шлях: блокування рядка лота на час перевірки і запису ставки"""
+    # 1. Знаходимо лот (FOR UPDATE: конкурентні ставки на лот виконуються по черзі,
+    # інакше обидві бачать стару ціну і друга перезаписує першу)
+    query = select(Lot).where(Lot.id == lot_id).with_for_update()
     result = await db.execute(query)
     lot = result.scalar_one_or_none()
 
     if not lot:
-        raise HTTPException(status_code=404, detail="Lot not found")
-
-    # 2. Перевірки правил
-    if lot.seller_id == current_user.id:
-        raise HTTPException(status_code=400, detail="You cannot bid on your own lot")
-
-    if lot.status != "active":
-        raise HTTPException(status_code=400, detail="Auction is closed")
-    
-    # 3. Валідація суми (має бути більша за поточну ціну + крок)
-    min_bid_amount = lot.current_price + lot.min_step
-    
-    if bid_data.amount < min_bid_amount:
-        raise HTTPException(status_code=400, detail=f"Bid must be at least {min_bid_amount}")
-
-    # --- ПЕРЕВІРКА НА ІСНУЮЧУ СТАВКУ ---
-    existing_bid_query = select(Bid).where(
-        Bid.lot_id == lot.id,
-        Bid.user_id == current_user.id,
-        Bid.is_active == True
-    )
-    existing_bid_result = await db.execute(existing_bid_query)
-    existing_bid = existing_bid_result.scalar_one_or_none()
-
-    final_bid = None
-
-    if existing_bid:
-        # А) ОНОВЛЮЄМО ІСНУЮЧУ СТАВКУ
-        existing_bid.amount = bid_data.amount
-        existing_bid.timestamp = datetime.now(timezone.utc)
-        final_bid = existing_bid
-        print(f"Updated existing bid #{existing_bid.id} to {bid_data.amount}")
-    else:
-        # Б) СТВОРЮЄМО НОВУ СТАВКУ
-        new_bid = Bid(
-            amount=bid_data.amount,
-            user_id=current_user.id,
-            lot_id=lot.id,
-            timestamp=datetime.now(timezone.utc),
-            is_active=True
-        )
-        db.add(new_bid)
-        final_bid = new_bid
-        print(f"Created new bid for User #{current_user.id}")
-
-    # 4. Оновлюємо ціну лота
-    lot.current_price = bid_data.amount
-    
+        raise sequencer.BidRejected("lot_not_found", 404, "Lot not found")
+
+    # 2-3. Правила і мінімальна сума (спільні з sequencer)
+    sequencer.check_bid(lot, user_id, amount, max_amount)
+
+    # 4. Ставка + відповідь автоматичних ставок конкурентів, одна транзакція
+    proxies, bids = await proxy.load_state(db, lot.id, [user_id])
+    # Бан, закомічений після автентифікації: ставка відхиляється, автоматичні ставки забанених мовчать
+    blocked = await ban_jobs.blocked_users(db, {user_id, *proxies})
+    if user_id in blocked:
+        raise sequencer.BidRejected("blocked", 403, "Your account is blocked")
+    for blocked_id in blocked:
+        proxies.pop(blocked_id, None)
+    price_before = lot.current_price
+    final_bid, kind = proxy.apply_bid(db, lot, user_id, amount, max_amount, proxies, bids, clock.now())
+    logger.debug("Placed bid", extra={"user_id": user_id, "lot_id": lot.id, "amount": str(amount), "price": str(lot.current_price)})
+
+    cache.invalidate_lot(db, lot.id)
     await db.commit()
+    # 5. Перебитим учасникам - сповіщення у фоні (outbid.py)
+    outbid.record(lot_id, price_before)
     await db.refresh(final_bid)
-    
-    return final_bid
+    return final_bid, kind
 
-# Отримати історію ставок (GET)
-@router.get("/{lot_id}", response_model=List[BidOut])
-async def get_bids_by_lot(
-    lot_id: int, 
+# Зробити ставку (POST)
+@router.post("/{lot_id}", response_model=BidOut, dependencies=[Depends(ratelimit.rate_limit), Depends(idempotency.idempotent)])
+async def place_bid(
+    lot_id: int,
+    bid_data: BidCreate,
+    current_user: User = Depends(get_current_user_db),
     db: AsyncSession = Depends(get_db)
 ):
-    # Показуємо тільки АКТИВНІ ставки
-    query = select(Bid)\
-        .where(Bid.lot_id == lot_id, Bid.is_active == True)\
-        .order_by(Bid.amount.desc())
-        
-    result = await db.execute(query)
-    return result.scalars().all()
\ No newline at end of file
+    try:
+        if sequencer.owns(lot_id):
+            # Гарячий лот цього воркера: ставка йде в груповий коміт актора лота,
+            # з'єднання автентифікації на час очікування не тримаємо
+            await db.close()
+            bid, kind = await sequencer.submit(lot_id, current_user.id, bid_data.amount, bid_data.max_amount)
+        else:
+            bid, kind = await _place_bid_locked(db, lot_id, current_user.id, bid_data.amount, bid_data.max_amount)
+    except sequencer.BidRejected as e:
+        bids_rejected.inc(reason=e.reason)
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    bids_accepted.inc(kind=kind)
+    return bid
+
+async def _bids_version(db: AsyncSession, lot_id: int):
+    # Будь-яка зміна ставок лота змінює його версію
+    result = await db.execute(select(Lot.version).where(Lot.id == lot_id))
+    version = result.scalar_one_or_none()
+    if version is None:
+        # Давно завершений лот міг переїхати в архів (archive.py)
+        result = await db.execute(select(ArchivedLot.version).where(ArchivedLot.id == lot_id))
+        version = result.scalar_one_or_none()
+    return version
+
+async def _load_bids(lot_id: int):
+    async with cache.read_session(cache.bids_key(lot_id)) as db:
+        version = await _bids_version(db, lot_id)
+
+        # Показуємо тільки АКТИВНІ ставки
+        query = select(Bid)\
+            .where(Bid.lot_id == lot_id, Bid.is_active == True)\
+            .order_by(Bid.amount.desc())
+
+        result = await db.execute(query)
+        bids = result.scalars().all()
+        if not bids:
+            query = select(ArchivedBid)\
+                .where(ArchivedBid.lot_id == lot_id, ArchivedBid.is_active == True)\
+                .order_by(ArchivedBid.amount.desc())
+            result = await db.execute(query)
+            bids = result.scalars().all()
+        body = cache.dump_json([BidOut.model_validate(bid).model_dump(mode="json") for bid in bids])
+        return body, conditional.bids_etag(lot_id, version) if version is not None else None
+
+async def _bids_etag(lot_id: int):
+    async with cache.read_session(cache.bids_key(lot_id)) as db:
+        version = await _bids_version(db, lot_id)
+        return conditional.bids_etag(lot_id, version) if version is not None else None
+
+# Отримати історію ставок (GET, через кеш, з підтримкою If-None-Match)
+@router.get("/{lot_id}", response_model=List[BidOut])
+async def get_bids_by_lot(lot_id: int, request: Request):
+    return await cache.get_or_load(
+        cache.bids_key(lot_id),
+        lambda: _load_bids(lot_id),
+        request=request,
+        validator=lambda: _bids_etag(lot_id)
+    )
\ No newline at end of file
@@ -1,39 +1,96 @@
-from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Form
+from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Form, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from typing import List, Optional
-from datetime import datetime, timedelta, timezone
+from datetime import timedelta
 import shutil
 import uuid
 import os
 
 from database import get_db
-from models import Lot, User, Bid, LotImage, Notification
-from schemas import LotOut
-from dependencies import get_current_user_db 
+from models import Lot, User, Bid, LotImage, Notification, WatchlistItem, ArchivedLot
+from schemas import LotOut, LotSnapshotRequest
+from dependencies import get_current_user_db, get_user_read_db
 from sqlalchemy.orm import joinedload
+from sqlalchemy import func, literal_column
+import ban_jobs
+import cache
+import clock
+import conditional
+import tracing
 
 router = APIRouter(
     prefix="/lots",
     tags=["lots"]
 )
 
-# 1. Отримати всі лоти
-@router.get("/", response_model=List[LotOut])
-async def get_lots(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
-    query = select(Lot).options(joinedload(Lot.seller), joinedload(Lot.images)).order_by(Lot.id.desc()).offset(skip).limit(limit)
+async def _load_lots_page(skip: int, limit: int):
+    async with cache.read_session(cache.lots_page_key(skip, limit)) as db:
+        query = select(Lot).options(joinedload(Lot.seller), joinedload(Lot.images)).order_by(Lot.id.desc()).offset(skip).limit(limit)
+        result = await db.execute(query)
+        lots = result.unique().scalars().all()
+        body = cache.dump_json([LotOut.model_validate(lot).model_dump(mode="json") for lot in lots])
+        return body, conditional.lots_page_etag([(lot.id, lot.version) for lot in lots])
+
+async def _lots_page_etag(skip: int, limit: int):
+    # Тільки id і version - без join'ів та серіалізації
+    async with cache.read_session(cache.lots_page_key(skip, limit)) as db:
+        query = select(Lot.id, Lot.version).order_by(Lot.id.desc()).offset(skip).limit(limit)
+        result = await db.execute(query)
+        return conditional.lots_page_etag(result.all())
+
+async def _load_lot(lot_id: int):
+    async with cache.read_session(cache.lot_key(lot_id)) as db:
+        query = select(Lot).options(joinedload(Lot.seller), joinedload(Lot.images)).where(Lot.id == lot_id)
+        result = await db.execute(query)
+        lot = result.unique().scalar_one_or_none()
+
+        if not lot:
+            # Давно завершений лот міг переїхати в архів (archive.py)
+            query = select(ArchivedLot).options(joinedload(ArchivedLot.seller), joinedload(ArchivedLot.images)).where(ArchivedLot.id == lot_id)
+            result = await db.execute(query)
+            lot = result.unique().scalar_one_or_none()
+
+        if not lot:
+            raise HTTPException(status_code=404, detail="Lot not found")
+        body = cache.dump_json(LotOut.model_validate(lot).model_dump(mode="json"))
+        return body, conditional.lot_etag(lot.id, lot.version)
+
+async def _my_lots(db: AsyncSession, user_id: int):
+    query = select(Lot).options(joinedload(Lot.seller), joinedload(Lot.images)).where(Lot.seller_id == user_id).order_by(Lot.id.desc())
+    result = await db.execute(query)
+    lots = result.unique().scalars().all()
+    # Плюс архівні (давно завершені) лоти продавця
+    query = select(ArchivedLot).options(joinedload(ArchivedLot.seller), joinedload(ArchivedLot.images)).where(ArchivedLot.seller_id == user_id)
     result = await db.execute(query)
-    return result.unique().scalars().all()
+    return sorted([*lots, *result.unique().scalars().all()], key=lambda lot: lot.id, reverse=True)
+
+async def _lot_etag(lot_id: int):
+    async with cache.read_session(cache.lot_key(lot_id)) as db:
+        result = await db.execute(select(Lot.version).where(Lot.id == lot_id))
+        version = result.scalar_one_or_none()
+        if version is None:
+            result = await db.execute(select(ArchivedLot.version).where(ArchivedLot.id == lot_id))
+            version = result.scalar_one_or_none()
+        return conditional.lot_etag(lot_id, version) if version is not None else None
+
+# 1. Отримати всі лоти (через кеш, з підтримкою If-None-Match)
+@router.get("/", response_model=List[LotOut])
+async def get_lots(request: Request, skip: int = 0, limit: int = 100):
+    return await cache.get_or_load(
+        cache.lots_page_key(skip, limit),
+        lambda: _load_lots_page(skip, limit),
+        request=request,
+        validator=lambda: _lots_page_etag(skip, limit)
+    )
 
 # 2. Отримати мої лоти
 @router.get("/my", response_model=List[LotOut])
 async def get_my_lots(
     current_user: User = Depends(get_current_user_db),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_user_read_db)
 ):
-    query = select(Lot).options(joinedload(Lot.images)).where(Lot.seller_id == current_user.id).order_by(Lot.id.desc())
-    result = await db.execute(query)
-    return result.unique().scalars().all()
+    return await _my_lots(db, current_user.id)
 
 # 3. Створити лот
 @router.post("/", response_model=LotOut)
@@ -53,6 +110,10 @@ async def create_lot(
     if images and len(images) > 5:
         raise HTTPException(status_code=400, detail="Maximum 5 images allowed")
 
+    # Бан, закомічений після автентифікації, інакше не побачить каскад (ban_jobs.py)
+    if await ban_jobs.blocked_users(db, [current_user.id]):
+        raise HTTPException(status_code=403, detail="Your account is blocked")
+
     new_lot = Lot(
         title=title,
         description=description,
@@ -64,10 +125,13 @@ async def create_lot(
         payment_deadline_minutes=payment_deadline_minutes,
         lot_type=lot_type,
         seller_id=current_user.id,
-        status="active"
+        status="active",
+        created_at=clock.now()
     )
     
     db.add(new_lot)
+    # Новий лот з'являється на першій сторінці каталогу
+    cache.invalidate(db, prefixes=[cache.LOTS_PAGE_PREFIX])
     await db.commit()
     await db.refresh(new_lot)
 
@@ -78,7 +142,7 @@ async def create_lot(
                 file_name = f"{uuid.uuid4()}.{file_ext}"
                 file_path = f"uploads/{file_name}"
                 
-                with open(file_path, "wb") as buffer:
+                with tracing.span("file.write", path=file_path), open(file_path, "wb") as buffer:
                     shutil.copyfileobj(img.file, buffer)
                 
                 full_url = f"http://localhost:8000/uploads/{file_name}"
@@ -92,22 +156,22 @@ async def create_lot(
                 if index == 0:
                     new_lot.image_url = full_url
 
+        cache.invalidate_lot(db, new_lot.id)
         await db.commit()
     
     query = select(Lot).options(joinedload(Lot.images)).where(Lot.id == new_lot.id)
     result = await db.execute(query)
     return result.unique().scalar_one()
 
-# 4. Отримати лот за ID (ОСЬ ЦЕЙ ЕНДПОІНТ У ВАС ЗНИК)
+# 4. Отримати лот за ID (через кеш, з підтримкою If-None-Match)
 @router.get("/{lot_id}", response_model=LotOut)
-async def get_lot(lot_id: int, db: AsyncSession = Depends(get_db)):
-    query = select(Lot).options(joinedload(Lot.seller), joinedload(Lot.images)).where(Lot.id == lot_id)
-    result = await db.execute(query)
-    lot = result.unique().scalar_one_or_none()
-    
-    if not lot:
-        raise HTTPException(status_code=404, detail="Lot not found")
-    return lot
+async def get_lot(lot_id: int, request: Request):
+    return await cache.get_or_load(
+        cache.lot_key(lot_id),
+        lambda: _load_lot(lot_id),
+        request=request,
+        validator=lambda: _lot_etag(lot_id)
+    )
 
 # 5. Оновити лот (PATCH)
 @router.patch("/{lot_id}")
@@ -160,7 +224,8 @@ async def update_lot(
                 try:
                     filename = img.image_url.split("/")[-1]
                     if os.path.exists(f"uploads/{filename}"):
-                        os.remove(f"uploads/{filename}")
+                        with tracing.span("file.remove", path=f"uploads/{filename}"):
+                            os.remove(f"uploads/{filename}")
                 except Exception: pass
             await db.delete(img)
             if lot.image_url == img.image_url:
@@ -172,7 +237,7 @@ async def update_lot(
                 file_ext = img.filename.split(".")[-1]
                 file_name = f"{uuid.uuid4()}.{file_ext}"
                 file_path = f"uploads/{file_name}"
-                with open(file_path, "wb") as buffer:
+                with tracing.span("file.write", path=file_path), open(file_path, "wb") as buffer:
                     shutil.copyfileobj(img.file, buffer)
                 full_url = f"http://localhost:8000/uploads/{file_name}"
                 new_image_obj = LotImage(image_url=full_url, lot_id=lot.id)
@@ -180,11 +245,13 @@ async def update_lot(
                 if not lot.image_url:
                     lot.image_url = full_url
 
+    cache.invalidate_lot(db, lot.id)
     await db.commit()
     await db.refresh(lot)
     
     if not lot.image_url and lot.images:
         lot.image_url = lot.images[0].image_url
+        cache.invalidate_lot(db, lot.id)
         await db.commit()
 
     return lot
@@ -218,7 +285,7 @@ async def close_lot(
 
     # Якщо є переможець
     lot.status = "pending_payment"
-    now = datetime.now(timezone.utc)
+    now = clock.now()
     lot.payment_deadline = now + timedelta(
         days=lot.payment_deadline_days,
         hours=lot.payment_deadline_hours,
@@ -230,6 +297,7 @@ async def close_lot(
     )
     db.add(winner_notification)
     
+    cache.invalidate_lot(db, lot.id)
     await db.commit()
     return {"message": "Auction closed. Waiting for payment.", "status": lot.status}
 
@@ -256,10 +324,12 @@ async def delete_lot(
                 try:
                     filename = img.image_url.split("/")[-1]
                     if os.path.exists(f"uploads/{filename}"):
-                        os.remove(f"uploads/{filename}")
+                        with tracing.span("file.remove", path=f"uploads/{filename}"):
+                            os.remove(f"uploads/{filename}")
                 except Exception: pass
 
     await db.delete(lot)
+    cache.invalidate_lot(db, lot_id)
     await db.commit()
     return {"message": "Lot deleted"}
 
@@ -300,10 +370,84 @@ async def reopen_lot(
     )
     db.add(notification)
     
+    cache.invalidate_lot(db, lot.id)
     await db.commit()
     
     return {
         "message": "Lot reopened successfully", 
         "status": lot.status,
         "lot_id": lot.id
-    }
\ No newline at end of file
+    }
+
+def _snapshot_query(user_id: int, lot_ids=None, since_version=None):
+    """
+    Один рядок на лот без join'ів: ціна, статус, версія і чи лідирує
+    користувач (найвища активна ставка - через idx_bids_lot_active_amount)
+    """
+    leader = select(Bid.user_id)\
+        .where(Bid.lot_id == Lot.id, Bid.is_active == True)\
+        .order_by(Bid.amount.desc())\
+        .limit(1)\
+        .scalar_subquery()
+
+    query = select(
+        Lot.id, Lot.current_price, Lot.status, Lot.version,
+        func.coalesce(leader == user_id, False).label("is_leading"),
+    )
+    if lot_ids is None:
+        query = query.where(Lot.id.in_(select(WatchlistItem.lot_id).where(WatchlistItem.user_id == user_id)))
+    else:
+        query = query.where(Lot.id.in_(lot_ids))
+    if since_version is not None:
+        query = query.where(Lot.version_xid >= since_version)
+    return query
+
+# Найстаріша транзакція, що ще не завершилась на момент знімка: усі молодші
+# id транзакцій уже закомічені або відкочені і видимі наступному запиту
+_SNAPSHOT_XMIN = select(literal_column("pg_snapshot_xmin(pg_current_snapshot())::text::bigint"))
+
+# 9. Знімки лотів для тікерів і списку спостереження
+@router.post("/snapshots")
+async def get_lot_snapshots(
+    snapshot_request: LotSnapshotRequest,
+    current_user: User = Depends(get_current_user_db),
+    db: AsyncSession = Depends(get_user_read_db)
+):
+    """
+    Компактний стан багатьох лотів одним запитом замість GET /lots/{id} на кожен.
+    "version" з відповіді (непрозора межа, не версія лота) передається як
+    since_version: наступна відповідь міститиме всі лоти, змінені транзакціями,
+    які на момент попередньої відповіді ще не завершились, - жодна закомічена
+    зміна не пропускається, а лот може прийти повторно без змін. Видалені лоти
+    просто зникають з відповіді - їх видно при повному оновленні (без since_version).
+    """
+    lot_ids = snapshot_request.lot_ids
+    if lot_ids is not None:
+        lot_ids = list(dict.fromkeys(lot_ids))
+        if not lot_ids:
+            return conditional.json_response(
+                cache.dump_json({"version": snapshot_request.since_version or 0, "lots": []}),
+                None, conditional.CACHE_CONTROL_PRIVATE
+            )
+
+    # Межа - ДО вибірки: транзакції, молодші за неї, вже видимі запиту нижче.
+    # Зміни транзакцій, що тривають зараз, прийдуть наступного разу
+    version = (await db.execute(_SNAPSHOT_XMIN)).scalar()
+    result = await db.execute(_snapshot_query(current_user.id, lot_ids, snapshot_request.since_version))
+    rows = result.all()
+
+    body = cache.dump_json({
+        "version": version,
+        "lots": [
+            {
+                "id": row.id,
+                "current_price": str(row.current_price) if row.current_price is not None else None,
+                "status": row.status,
+                "is_leading": row.is_leading,
+                "version": row.version,
+            }
+            for row in rows
+        ],
+    })
+    return conditional.json_response(body, None, conditional.CACHE_CONTROL_PRIVATE)
+
@@ -1,19 +1,30 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.orm import aliased
+from datetime import timedelta
 from typing import List
 
 from database import get_db
 from models import Payment, Lot, User, Bid, Notification
 from schemas import PaymentCreate, PaymentOut
 from dependencies import get_current_user_db
+from background_tasks import payment_expirations
+import cache
+import clock
+import idempotency
+import metrics
+import ratelimit
+
+payments_total = metrics.Counter("payments_total", "Payment attempts", ["outcome"])
+payments_amount = metrics.Counter("payments_amount_total", "Sum of successful payments")
 
 router = APIRouter(
     prefix="/payments",
     tags=["payments"]
 )
-@router.post("/", response_model=PaymentOut)
+@router.post("/", response_model=PaymentOut, dependencies=[Depends(ratelimit.rate_limit), Depends(idempotency.idempotent)])
 async def process_payment(
     payment_data: PaymentCreate,
     current_user: User = Depends(get_current_user_db),
@@ -24,14 +35,18 @@ async def process_payment(
     lot = result.scalar_one_or_none()
 
     if not lot:
+        payments_total.inc(outcome="lot_not_found")
         raise HTTPException(status_code=404, detail="Lot not found")
 
     if lot.status == "sold":
+        payments_total.inc(outcome="already_sold")
         raise HTTPException(status_code=400, detail="Lot already sold")
     if not lot.payment_deadline:
+        payments_total.inc(outcome="deadline_expired")
         raise HTTPException(status_code=400, detail="Payment deadline expired")
     
-    if lot.payment_deadline.replace(tzinfo=None) < datetime.now():
+    if lot.payment_deadline < clock.now():
+         payments_total.inc(outcome="deadline_expired")
          raise HTTPException(status_code=400, detail="Payment deadline expired")
 
     bid_query = select(Bid)\
@@ -43,6 +58,7 @@ async def process_payment(
     winner_bid = bid_res.scalar_one_or_none()
 
     if not winner_bid or winner_bid.user_id != current_user.id:
+        payments_total.inc(outcome="not_winner")
         raise HTTPException(status_code=403, detail="Only the winner can pay for this lot")
 
     new_payment = Payment(
@@ -54,6 +70,8 @@ async def process_payment(
 
     lot.status = "sold"
     lot.payment_deadline = None 
+    # Відлік до перенесення в архів (archive.py)
+    lot.closed_at = clock.now()
 
     buyer_notification = Notification(
         user_id=current_user.id,
@@ -69,11 +87,22 @@ async def process_payment(
     db.add(seller_notification)
 
     # 9. Зберігаємо все
+    cache.invalidate_lot(db, lot.id)
     await db.commit()
     await db.refresh(new_payment)
+    payments_total.inc(outcome="paid")
+    payments_amount.inc(float(new_payment.amount))
     
     return new_payment
 
+def _top_two_bids(lot_ids):
+    """Дві найвищі активні ставки кожного лота, по лотах і від найвищої"""
+    ranked = select(
+        Bid, func.row_number().over(partition_by=Bid.lot_id, order_by=Bid.amount.desc()).label("rank")
+    ).where(Bid.lot_id.in_(lot_ids), Bid.is_active == True).subquery()
+    top_bid = aliased(Bid, ranked)
+    return select(top_bid).where(ranked.c.rank <= 2).order_by(ranked.c.lot_id, ranked.c.rank)
+
 # Endpoint для перевірки прострочених платежів та передачі перемоги наступному
 @router.post("/check-expired")
 async def check_expired_payments(
@@ -83,7 +112,7 @@ async def check_expired_payments(
     Перевіряє лоти з простроченим payment_deadline та передає перемогу наступному переможцю.
     Цей endpoint можна викликати періодично (наприклад, через cron job).
     """
-    now = datetime.utcnow()
+    now = clock.now()
     
     # Знаходимо лоти з простроченим payment_deadline, які ще не продані
     query = select(Lot).where(
@@ -94,27 +123,33 @@ async def check_expired_payments(
     result = await db.execute(query)
     expired_lots = result.scalars().all()
     
+    # Дві найвищі активні ставки всіх прострочених лотів - одним запитом,
+    # а не запитом на кожен лот
+    bids_result = await db.execute(_top_two_bids([lot.id for lot in expired_lots]))
+    top_bids = {}
+    for bid in bids_result.scalars():
+        top_bids.setdefault(bid.lot_id, []).append(bid)
+    
     updated_lots = []
     
     for lot in expired_lots:
-        # Знаходимо всі активні ставки для цього лота, відсортовані за сумою (від найвищої)
-        bids_query = select(Bid).where(
-            Bid.lot_id == lot.id,
-            Bid.is_active == True
-        ).order_by(Bid.amount.desc())
-        bids_result = await db.execute(bids_query)
-        all_bids = bids_result.scalars().all()
+        # Активні ставки лота, відсортовані за сумою (від найвищої), - не більше двох
+        all_bids = top_bids.get(lot.id, [])
         
         if len(all_bids) == 0:
             # Немає ставок - закриваємо лот
             lot.status = "closed"
             lot.payment_deadline = None
+            lot.closed_at = now
             updated_lots.append({"lot_id": lot.id, "action": "closed", "reason": "no_bids"})
+            payment_expirations.inc(outcome="closed")
         elif len(all_bids) == 1:
             # Тільки одна ставка - закриваємо лот (переможець не оплатив, інших немає)
             lot.status = "closed"
             lot.payment_deadline = None
+            lot.closed_at = now
             updated_lots.append({"lot_id": lot.id, "action": "closed", "reason": "only_one_bid"})
+            payment_expirations.inc(outcome="closed")
         else:
             # Є інші ставки - передаємо перемогу наступному
             # Деактивуємо попередню найвищу ставку
@@ -125,13 +160,14 @@ async def check_expired_payments(
             new_winner_bid = all_bids[1]
             
             # Встановлюємо новий payment_deadline = поточний час + дні + години + хвилини
-            now = datetime.utcnow()
+            now = clock.now()
             payment_deadline = now + timedelta(
                 days=lot.payment_deadline_days,
                 hours=lot.payment_deadline_hours,
                 minutes=lot.payment_deadline_minutes
             )
             lot.payment_deadline = payment_deadline
+            payment_expirations.inc(outcome="next_winner")
             
             updated_lots.append({
                 "lot_id": lot.id,
@@ -141,6 +177,7 @@ async def check_expired_payments(
                 "new_payment_deadline": lot.payment_deadline.isoformat() if lot.payment_deadline else None
             })
     
+    cache.invalidate_lot(db, *[lot.id for lot in expired_lots])
     await db.commit()
     
     return {
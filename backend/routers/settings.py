@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import update
@@ -7,23 +7,42 @@ from database import get_db
 from models import SiteSetting, User
 from schemas import RulesOut, RulesUpdate
 from dependencies import get_current_user_db
+import broadcasts
+import cache
+import conditional
 
 router = APIRouter(
     prefix="/settings",
     tags=["settings"]
 )
 
-# 1. Отримати правила (Публічний)
+async def _load_rules():
+    async with cache.read_session(cache.RULES_KEY) as db:
+        query = select(SiteSetting).where(SiteSetting.key == "rules")
+        result = await db.execute(query)
+        setting = result.scalar_one_or_none()
+
+        if not setting:
+            return cache.dump_json({"content": "Правила ще не встановлені."}), conditional.rules_etag(0)
+
+        return cache.dump_json({"content": setting.value}), conditional.rules_etag(setting.revision)
+
+async def _rules_etag():
+    async with cache.read_session(cache.RULES_KEY) as db:
+        result = await db.execute(select(SiteSetting.revision).where(SiteSetting.key == "rules"))
+        return conditional.rules_etag(result.scalar_one_or_none() or 0)
+
+# 1. Отримати правила (Публічний, через кеш, з підтримкою If-None-Match)
 @router.get("/rules", response_model=RulesOut)
-async def get_rules(db: AsyncSession = Depends(get_db)):
-    query = select(SiteSetting).where(SiteSetting.key == "rules")
-    result = await db.execute(query)
-    setting = result.scalar_one_or_none()
-    
-    if not setting:
-        return {"content": "Правила ще не встановлені."}
-    
-    return {"content": setting.value}
+async def get_rules(request: Request):
+    return await cache.get_or_load(
+        cache.RULES_KEY,
+        _load_rules,
+        ttl=cache.CACHE_TTL_SECONDS,
+        request=request,
+        validator=_rules_etag,
+        cache_control=conditional.CACHE_CONTROL_RULES
+    )
 
 # 2. Оновити правила (Тільки адмін)
 @router.put("/rules")
@@ -42,9 +61,13 @@ async def update_rules(
     
     if setting:
         setting.value = rules_data.content
+        setting.revision = SiteSetting.revision + 1
     else:
         new_setting = SiteSetting(key="rules", value=rules_data.content)
         db.add(new_setting)
-        
+
+    # Одна розсилка замість сповіщення кожному користувачу
+    broadcasts.create(db, "📜 Правила сайту оновлено. Ознайомтеся з новою редакцією.")
+    cache.invalidate_rules(db)
     await db.commit()
     return {"content": rules_data.content}
\ No newline at end of file
@@ -1,13 +1,16 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.dialects.postgresql import insert
 from typing import List
-from sqlalchemy import update
+from sqlalchemy import update, delete, func
 
 from database import get_db
-from models import User, Notification
-from schemas import UserOut, UserUpdate, NotificationOut
-from dependencies import get_current_user_db
+from models import User, Notification, Lot, WatchlistItem
+from schemas import UserOut, UserUpdate, NotificationOut, MAX_SNAPSHOT_LOTS
+from dependencies import get_current_user_db, get_user_read_db
+import broadcasts
+import cache
 
 router = APIRouter(
     prefix="/users",
@@ -31,6 +34,8 @@ async def update_user_me(
         setattr(current_user, key, value)
 
     db.add(current_user)
+    # Публічний профіль продавця вбудований у картки лотів
+    cache.invalidate_seller_lots(db, current_user.id)
     await db.commit()
     await db.refresh(current_user)
 
@@ -39,14 +44,19 @@ async def update_user_me(
 @router.get("/notifications", response_model=List[NotificationOut])
 async def get_my_notifications(
     current_user: User = Depends(get_current_user_db),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_user_read_db)
 ):
-    query = select(Notification)\
-        .where(Notification.user_id == current_user.id)\
-        .order_by(Notification.created_at.desc())
-        
-    result = await db.execute(query)
-    return result.scalars().all()
+    # Особисті сповіщення і розсилки - одним UNION ALL (див. broadcasts.py)
+    result = await db.execute(broadcasts.feed_query(current_user))
+    return result.all()
+
+@router.get("/notifications/unread-count")
+async def get_unread_count(
+    current_user: User = Depends(get_current_user_db),
+    db: AsyncSession = Depends(get_user_read_db)
+):
+    result = await db.execute(broadcasts.unread_count_query(current_user))
+    return {"count": result.scalar()}
 
 @router.post("/notifications/read")
 async def mark_notifications_read(
@@ -59,6 +69,53 @@ async def mark_notifications_read(
     ).values(is_read=True)
     
     await db.execute(stmt)
+    # Розсилки: лише водяний знак, без рядків на користувача
+    await db.execute(update(User).where(User.id == current_user.id).values(broadcasts_read_id=broadcasts.latest_id()))
     await db.commit()
     
-    return {"message": "All notifications marked as read"}
\ No newline at end of file
+    return {"message": "All notifications marked as read"}
+
+# --- СПИСОК СПОСТЕРЕЖЕННЯ ---
+# Зберігаються лише id лотів: живі ціни клієнт бере через POST /lots/snapshots
+
+@router.get("/watchlist", response_model=List[int])
+async def get_watchlist(
+    current_user: User = Depends(get_current_user_db),
+    db: AsyncSession = Depends(get_user_read_db)
+):
+    query = select(WatchlistItem.lot_id)\
+        .where(WatchlistItem.user_id == current_user.id)\
+        .order_by(WatchlistItem.created_at.desc())
+    result = await db.execute(query)
+    return result.scalars().all()
+
+@router.put("/watchlist/{lot_id}")
+async def add_to_watchlist(
+    lot_id: int,
+    current_user: User = Depends(get_current_user_db),
+    db: AsyncSession = Depends(get_db)
+):
+    lot_exists = await db.execute(select(Lot.id).where(Lot.id == lot_id))
+    if lot_exists.scalar_one_or_none() is None:
+        raise HTTPException(status_code=404, detail="Lot not found")
+
+    count = await db.execute(select(func.count()).select_from(WatchlistItem).where(WatchlistItem.user_id == current_user.id))
+    if count.scalar() >= MAX_SNAPSHOT_LOTS:
+        raise HTTPException(status_code=400, detail=f"Watchlist is limited to {MAX_SNAPSHOT_LOTS} lots")
+
+    # Повторне додавання - не помилка
+    stmt = insert(WatchlistItem).values(user_id=current_user.id, lot_id=lot_id)\
+        .on_conflict_do_nothing(constraint="uq_watchlist_user_lot")
+    await db.execute(stmt)
+    await db.commit()
+    return {"message": "Lot added to watchlist"}
+
+@router.delete("/watchlist/{lot_id}")
+async def remove_from_watchlist(
+    lot_id: int,
+    current_user: User = Depends(get_current_user_db),
+    db: AsyncSession = Depends(get_db)
+):
+    await db.execute(delete(WatchlistItem).where(WatchlistItem.user_id == current_user.id, WatchlistItem.lot_id == lot_id))
+    await db.commit()
+    return {"message": "Lot removed from watchlist"}
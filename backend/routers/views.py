@@ -0,0 +1,118 @@
+# backend/routers/views.py
+import asyncio
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_db, ReadSessionLocal
+from models import User
+from schemas import UserOut, LotOut, BidOutWithLot
+from dependencies import get_current_user_db
+from routers import lots, bids, admin, settings
+import cache
+import conditional
+import tracing
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/views",
+    tags=["views"]
+)
+
+# Складені сторінки: один запит замість ланцюжка запитів клієнта.
+# JWT і get_current_user_db виконуються один раз, далі незалежні секції
+# читаються паралельно, кожна на власній сесії (окреме з'єднання з пулу).
+# Помилка секції не валить сторінку: секція стає null, а причина
+# потрапляє в "errors" - {"lot": {...}, "bids": null, "errors": {"bids": {...}}}
+
+async def _section(name, load):
+    with tracing.span(f"view.{name}"):
+        try:
+            return name, await load(), None
+        except HTTPException as e:
+            return name, None, {"status": e.status_code, "detail": e.detail}
+        except Exception:
+            logger.exception("View section %s failed", name)
+            return name, None, {"status": 500, "detail": "Internal server error"}
+
+async def _render(sections):
+    """sections - назва -> корутинна функція, що повертає байти JSON"""
+    results = await asyncio.gather(*(_section(name, load) for name, load in sections.items()))
+
+    # Закешовані тіла вклеюються як є, без повторного розбору і серіалізації
+    parts, errors = [], {}
+    for name, body, error in results:
+        parts.append(cache.dump_json(name) + b":" + (body if body is not None else b"null"))
+        if error is not None:
+            errors[name] = error
+    parts.append(b'"errors":' + cache.dump_json(errors))
+    return conditional.json_response(b"{" + b",".join(parts) + b"}", None, conditional.CACHE_CONTROL_PRIVATE)
+
+def _dump(schema, rows):
+    return cache.dump_json([schema.model_validate(row).model_dump(mode="json") for row in rows])
+
+def _me(user: User):
+    body = cache.dump_json(UserOut.model_validate(user).model_dump(mode="json"))
+
+    async def load():
+        return body
+    return load
+
+async def _release(db: AsyncSession):
+    # Користувач уже завантажений: повертаємо з'єднання автентифікації
+    # в пул до того, як секції візьмуть свої
+    await db.close()
+
+# 1. Сторінка лота: лот + ставки + поточний користувач
+@router.get("/lot/{lot_id}")
+async def lot_view(
+    lot_id: int,
+    current_user: User = Depends(get_current_user_db),
+    db: AsyncSession = Depends(get_db)
+):
+    await _release(db)
+
+    async def lot():
+        body, _ = await cache.fetch(cache.lot_key(lot_id), lambda: lots._load_lot(lot_id))
+        return body
+
+    async def lot_bids():
+        body, _ = await cache.fetch(cache.bids_key(lot_id), lambda: bids._load_bids(lot_id))
+        return body
+
+    return await _render({"lot": lot, "bids": lot_bids, "me": _me(current_user)})
+
+# 2. Профіль: користувач, його лоти і ставки; для адміна - ще користувачі і правила
+@router.get("/profile")
+async def profile_view(
+    current_user: User = Depends(get_current_user_db),
+    db: AsyncSession = Depends(get_db)
+):
+    await _release(db)
+    user_id = current_user.id
+
+    async def my_lots():
+        async with ReadSessionLocal() as session:
+            return _dump(LotOut, await lots._my_lots(session, user_id))
+
+    async def my_bids():
+        async with ReadSessionLocal() as session:
+            return _dump(BidOutWithLot, await bids._my_bids(session, user_id))
+
+    sections = {"me": _me(current_user), "lots": my_lots, "bids": my_bids}
+
+    if current_user.is_admin:
+        async def admin_users():
+            async with ReadSessionLocal() as session:
+                return _dump(UserOut, await admin._list_users(session))
+
+        async def rules():
+            body, _ = await cache.fetch(cache.RULES_KEY, settings._load_rules, ttl=cache.CACHE_TTL_SECONDS)
+            return body
+
+        sections["admin_users"] = admin_users
+        sections["rules"] = rules
+
+    return await _render(sections)
@@ -1,5 +1,5 @@
 # backend/schemas.py
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 from decimal import Decimal
@@ -27,6 +27,7 @@ class UserOut(UserBase):
     is_blocked: bool = False
     ban_reason: Optional[str] = None
     ban_until: Optional[datetime] = None
+    notify_outbid: bool = True
     
     class Config:
         from_attributes = True
@@ -35,6 +36,7 @@ class UserUpdate(BaseModel):
     username: Optional[str] = None
     phone_number: Optional[str] = None
     bio: Optional[str] = None
+    notify_outbid: Optional[bool] = None
 
 class BlockUserRequest(BaseModel):
     reason: str
@@ -76,6 +78,7 @@ class LotOut(LotBase):
     seller_id: Optional[int] = None
     created_at: Optional[datetime] = None
     payment_deadline: Optional[datetime] = None
+    version: Optional[int] = None
     
     seller: Optional[UserPublic] = None 
     images: List[LotImageOut] = [] # Список картинок для галереї
@@ -94,6 +97,8 @@ class LotMinimal(BaseModel):
 
 class BidCreate(BaseModel):
     amount: Decimal
+    # Автоматична ставка: сервер перебиватиме конкурентів до цієї суми
+    max_amount: Optional[Decimal] = None
 
 class BidOut(BaseModel):
     id: Optional[int] = None
@@ -128,12 +133,56 @@ class NotificationOut(BaseModel):
     message: str
     is_read: bool
     created_at: datetime
+    # Розсилка (id - з broadcasts, не з notifications)
+    broadcast: bool = False
 
     class Config:
         from_attributes = True
         
+class BanJobOut(BaseModel):
+    id: int
+    user_id: int
+    admin_id: Optional[int] = None
+    status: str
+    lots_total: int
+    lots_deleted: int
+    bid_lots_total: int
+    bid_lots_done: int
+    notifications_sent: int
+    attempts: int
+    error: Optional[str] = None
+    created_at: datetime
+    heartbeat_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class BroadcastCreate(BaseModel):
+    message: str
+    segment: str = "all"
+
+class BroadcastOut(BaseModel):
+    id: int
+    message: str
+    segment: str
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
 class RulesUpdate(BaseModel):
     content: str
 
 class RulesOut(BaseModel):
-    content: str
\ No newline at end of file
+    content: str
+
+# --- Watchlist / Snapshot Schemas ---
+# Стільки лотів максимум у списку спостереження і в одному запиті знімків
+MAX_SNAPSHOT_LOTS = 300
+
+class LotSnapshotRequest(BaseModel):
+    # None - лоти зі списку спостереження користувача
+    lot_ids: Optional[List[int]] = Field(None, max_length=MAX_SNAPSHOT_LOTS)
+    # "version" з попередньої відповіді: лоти, що не змінились після неї, не повертаються
+    since_version: Optional[int] = None
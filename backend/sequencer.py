@@ -0,0 +1,301 @@
+# backend/sequencer.py
+import asyncio
+import bisect
+import contextvars
+import hashlib
+import logging
+import os
+import time
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Optional
+
+from sqlalchemy.future import select
+
+from database import AsyncSessionLocal
+from models import Lot
+from schemas import BidOut
+import ban_jobs
+import cache
+import clock
+import metrics
+import outbid
+import proxy
+
+logger = logging.getLogger(__name__)
+
+# Послідовник ставок для "гарячих" лотів (опційно, BID_SEQUENCER=1).
+#
+# Звичайний шлях (routers/bids.py) бере блокування рядка лота на кожну
+# ставку: сотні ставок за секунду на один лот стають у чергу за одним
+# рядком, і кожна тримає з'єднання, поки чекає. Тут ставки на лот
+# потрапляють до одного актора (asyncio-задачі), який:
+#   - відхиляє завідомо низькі ставки за станом у пам'яті, без БД
+#   - решту збирає в пакет і комітить одним груповим комітом
+#     (одне блокування рядка і одна транзакція на пакет)
+#   - відповідає на запити лише після коміту
+#
+# Стан у пам'яті - лише кеш. Джерело правди - БД: кожен пакет читає лот
+# під FOR UPDATE і перевіряє ставки заново, тому ставки через звичайний
+# шлях (інші воркери, скасування, бан) не порушують цін. Після падіння
+# актор просто перечитує стан з БД; непідтверджених прийнятих ставок не
+# буває - підтвердження йде після коміту.
+#
+# Лот належить одному воркеру (консистентне хешування по WORKER_INDEX /
+# WORKER_COUNT). Запит на чужий лот іде звичайним шляхом; щоб ставки
+# справді потрапляли до власника, балансувальник має маршрутизувати
+# /bids/{lot_id} тим самим хешем (або кожен воркер - окремий upstream).
+
+BID_SEQUENCER = os.getenv("BID_SEQUENCER", "0") == "1"
+WORKER_INDEX = int(os.getenv("WORKER_INDEX", "0"))
+WORKER_COUNT = int(os.getenv("WORKER_COUNT", "1"))
+# Вікно збору пакета після першої ставки, мс
+BID_SEQUENCER_WINDOW_MS = float(os.getenv("BID_SEQUENCER_WINDOW_MS", "2"))
+BID_SEQUENCER_MAX_BATCH = int(os.getenv("BID_SEQUENCER_MAX_BATCH", "256"))
+# Актор без ставок стільки секунд завершується
+BID_SEQUENCER_IDLE_SECONDS = float(os.getenv("BID_SEQUENCER_IDLE_SECONDS", "60"))
+# Стан старший за це (мс) не використовується для відхилення без БД:
+# межа застарівання, якщо інвалідація від іншого воркера не дійшла
+BID_SEQUENCER_STATE_TTL_MS = float(os.getenv("BID_SEQUENCER_STATE_TTL_MS", "1000"))
+
+RING_VNODES = 64
+CENTS = Decimal("0.01")
+
+batch_size = metrics.Histogram(
+    "bid_sequencer_batch_size", "Bids per group commit",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+commit_duration = metrics.Histogram(
+    "bid_sequencer_commit_seconds", "Group commit duration",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+)
+fast_rejects = metrics.Counter("bid_sequencer_fast_rejects_total", "Bids rejected from in-memory state")
+
+class BidRejected(Exception):
+    """Ставка не пройшла правила аукціону (відповідь 4xx)"""
+    def __init__(self, reason, status_code, detail):
+        super().__init__(detail)
+        self.reason = reason
+        self.status_code = status_code
+        self.detail = detail
+
+def check_bid(lot, user_id, amount, max_amount=None):
+    """Правила ставки; lot - модель Lot або LotState"""
+    if max_amount is not None and max_amount < amount:
+        raise BidRejected("bad_max_amount", 400, "max_amount must be at least the bid amount")
+    if lot.seller_id == user_id:
+        raise BidRejected("own_lot", 400, "You cannot bid on your own lot")
+    if lot.status != "active":
+        raise BidRejected("auction_closed", 400, "Auction is closed")
+    # Має бути більша за поточну ціну + крок
+    min_bid_amount = lot.current_price + lot.min_step
+    if amount < min_bid_amount:
+        raise BidRejected("too_low", 400, f"Bid must be at least {min_bid_amount}")
+
+@dataclass
+class LotState:
+    seller_id: int
+    status: str
+    current_price: object
+    min_step: object
+    loaded_at: float
+
+    @classmethod
+    def of(cls, lot):
+        return cls(lot.seller_id, lot.status, lot.current_price, lot.min_step, time.monotonic())
+
+    def fresh(self):
+        return (time.monotonic() - self.loaded_at) * 1000 < BID_SEQUENCER_STATE_TTL_MS
+
+# --- ВЛАСНІСТЬ ЛОТІВ ---
+
+def _hash(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+class HashRing:
+    """Зміна WORKER_COUNT переносить лише ~1/N лотів, а не майже всі, як lot_id % N"""
+    def __init__(self, workers, vnodes=RING_VNODES):
+        points = sorted((_hash(f"worker-{worker}-{vnode}"), worker) for worker in range(workers) for vnode in range(vnodes))
+        self._hashes = [point for point, _ in points]
+        self._workers = [worker for _, worker in points]
+
+    def owner(self, lot_id):
+        index = bisect.bisect(self._hashes, _hash(f"lot-{lot_id}")) % len(self._hashes)
+        return self._workers[index]
+
+ring = HashRing(WORKER_COUNT)
+
+def owns(lot_id):
+    return BID_SEQUENCER and ring.owner(lot_id) == WORKER_INDEX
+
+# --- АКТОР ЛОТА ---
+
+@dataclass
+class _Pending:
+    user_id: int
+    amount: object
+    max_amount: object
+    future: asyncio.Future
+
+class LotActor:
+    def __init__(self, lot_id):
+        self.lot_id = lot_id
+        self.queue = asyncio.Queue()
+        self.state: Optional[LotState] = None
+        # Росте з кожною інвалідацією лота: стан, прочитаний до неї, не зберігаємо
+        self.generation = 0
+        self._inflight = ()
+        # Порожній контекст: інакше актор успадкує лічильник запитів і трасу
+        # HTTP-запиту, що його створив, і рахуватиме туди всі наступні пакети.
+        # Context().run замість create_task(context=...) - той лише з Python 3.11
+        self.task = contextvars.Context().run(asyncio.create_task, self._run(), name=f"bid_sequencer:{lot_id}")
+
+    async def submit(self, user_id, amount, max_amount=None):
+        """Повертає (BidOut, "new" | "raised") після коміту або кидає BidRejected"""
+        if self.state is not None and self.state.fresh():
+            try:
+                check_bid(self.state, user_id, amount, max_amount)
+            except BidRejected:
+                fast_rejects.inc()
+                raise
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait(_Pending(user_id, amount, max_amount, future))
+        return await future
+
+    def invalidate(self):
+        self.generation += 1
+        self.state = None
+
+    async def _run(self):
+        try:
+            while True:
+                try:
+                    first = await asyncio.wait_for(self.queue.get(), BID_SEQUENCER_IDLE_SECONDS)
+                except asyncio.TimeoutError:
+                    # Без await між перевіркою і видаленням: submit() не встигне
+                    # покласти ставку в чергу актора, що вже завершується
+                    if self.queue.empty():
+                        del _actors[self.lot_id]
+                        return
+                    continue
+                self._inflight = [first]
+                if BID_SEQUENCER_WINDOW_MS > 0:
+                    await asyncio.sleep(BID_SEQUENCER_WINDOW_MS / 1000)
+                while len(self._inflight) < BID_SEQUENCER_MAX_BATCH and not self.queue.empty():
+                    self._inflight.append(self.queue.get_nowait())
+                await self._commit(self._inflight)
+                self._inflight = ()
+        finally:
+            if _actors.get(self.lot_id) is self:
+                del _actors[self.lot_id]
+            # Актор скасовано посеред пакета: запити не мають висіти вічно
+            stopped = list(self._inflight)
+            while not self.queue.empty():
+                stopped.append(self.queue.get_nowait())
+            for pending in stopped:
+                if not pending.future.done():
+                    pending.future.set_exception(RuntimeError("Bid sequencer stopped"))
+
+    async def _commit(self, batch):
+        started = time.perf_counter()
+        try:
+            async with AsyncSessionLocal() as db:
+                results = await self._apply(db, batch)
+        except Exception as e:
+            logger.exception("Group commit failed", extra={"lot_id": self.lot_id, "batch": len(batch)})
+            self.state = None
+            results = [(pending, e) for pending in batch]
+        finally:
+            commit_duration.observe(time.perf_counter() - started)
+            batch_size.observe(len(batch))
+
+        # 4. Відповіді - лише після коміту
+        for pending, result in results:
+            if pending.future.done():
+                continue
+            if isinstance(result, Exception):
+                pending.future.set_exception(result)
+            else:
+                pending.future.set_result(result)
+
+    async def _apply(self, db, batch):
+        # 1. Один замок рядка на весь пакет
+        lot = (await db.execute(select(Lot).where(Lot.id == self.lot_id).with_for_update())).scalar_one_or_none()
+        # Інвалідація після цієї точки означає, що прочитаний стан міг застаріти
+        generation = self.generation
+        if lot is None:
+            self.state = None
+            return [(pending, BidRejected("lot_not_found", 404, "Lot not found")) for pending in batch]
+
+        # 2. Автоматичні ставки лота і наявні ставки всіх учасників пакета;
+        # бан, закомічений після автентифікації, - як у звичайному шляху
+        proxies, bids = await proxy.load_state(db, lot.id, {pending.user_id for pending in batch})
+        blocked = await ban_jobs.blocked_users(db, {pending.user_id for pending in batch} | set(proxies))
+        for blocked_id in blocked:
+            proxies.pop(blocked_id, None)
+
+        # 3. Перевіряємо по черзі, як якби ставки приходили окремо
+        price_before = lot.current_price
+        results, accepted = [], []
+        for pending in batch:
+            try:
+                if pending.user_id in blocked:
+                    raise BidRejected("blocked", 403, "Your account is blocked")
+                check_bid(lot, pending.user_id, pending.amount, pending.max_amount)
+            except BidRejected as e:
+                results.append((pending, e))
+                continue
+            bid, kind = proxy.apply_bid(db, lot, pending.user_id, pending.amount, pending.max_amount, proxies, bids, clock.now())
+            # Наступна ставка пакета може змінити цей рядок (автоматична відповідь) -
+            # у відповідь іде стан на момент цієї ставки
+            accepted.append((pending, bid, kind, bid.amount, bid.timestamp))
+
+        state = LotState.of(lot)
+        if accepted:
+            cache.invalidate_lot(db, lot.id)
+            await db.commit()
+            # Власний коміт інвалідує лот рівно раз; більше - його змінили паралельно
+            generation += 1
+            outbid.record(lot.id, price_before)
+        else:
+            await db.rollback()
+        self.state = state if self.generation == generation else None
+
+        # Той самий користувач двічі в пакеті - кожна відповідь зі своєю сумою
+        for pending, bid, kind, amount, timestamp in accepted:
+            out = BidOut(id=bid.id, amount=amount, timestamp=timestamp, user_id=pending.user_id, lot_id=self.lot_id, is_active=True)
+            results.append((pending, (out, kind)))
+        return results
+
+_actors = {}
+
+metrics.Gauge("bid_sequencer_actors", "Active per-lot bid actors", function=lambda: len(_actors))
+
+def _cents(amount):
+    # Як NUMERIC(10, 2) у БД: стан у пам'яті і відповідь мають збігатися з тим, що запишеться
+    return amount.quantize(CENTS, rounding=ROUND_HALF_UP) if amount is not None else None
+
+async def submit(lot_id, user_id, amount, max_amount=None):
+    amount, max_amount = _cents(amount), _cents(max_amount)
+    actor = _actors.get(lot_id)
+    if actor is None or actor.task.done():
+        actor = _actors[lot_id] = LotActor(lot_id)
+    return await actor.submit(user_id, amount, max_amount)
+
+_LOT_PREFIX = cache.lot_key("")
+
+def _on_invalidate(keys, prefixes):
+    if not _actors:
+        return
+    # invalidate_seller_lots ("lot:") і повне очищення ("") - скидаємо стан усіх акторів
+    if any(_LOT_PREFIX.startswith(prefix) or prefix.startswith(_LOT_PREFIX) for prefix in prefixes):
+        for actor in _actors.values():
+            actor.invalidate()
+        return
+    for key in keys:
+        if key.startswith(_LOT_PREFIX):
+            actor = _actors.get(int(key[len(_LOT_PREFIX):]))
+            if actor is not None:
+                actor.invalidate()
+
+cache.on_invalidate(_on_invalidate)
@@ -0,0 +1,51 @@
+# backend/singleflight.py
+import asyncio
+
+import metrics
+
+coalesced_requests = metrics.Counter(
+    "singleflight_coalesced_total", "Callers that joined an in-flight load", ["group"]
+)
+flight_timeouts = metrics.Counter(
+    "singleflight_timeouts_total", "Callers that gave up waiting for an in-flight load", ["group"]
+)
+
+class SingleFlight:
+    """
+    Об'єднує конкурентні однакові читання: перший виклик з ключем запускає
+    завантаження, решта чекають на той самий результат.
+
+    - Скасування одного з клієнтів (обрив з'єднання) не скасовує спільне
+      завантаження - воно захищене asyncio.shield.
+    - timeout обмежує очікування конкретного клієнта; саме завантаження
+      продовжується для інших.
+    - Після завершення ключ звільняється, тож наступний виклик читає свіжі дані.
+    """
+    def __init__(self, group):
+        self.group = group
+        self._inflight = {}
+
+    def _forget(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Помилку могли ніхто не дочекатись (усі клієнти відвалились)
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key, fn, timeout=None):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, key=key: self._forget(key, t))
+        else:
+            coalesced_requests.inc(group=self.group)
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            flight_timeouts.inc(group=self.group)
+            raise
+
+    def inflight(self):
+        return len(self._inflight)
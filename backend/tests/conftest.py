@@ -0,0 +1,112 @@
+# backend/tests/conftest.py
+"""
+Спільні фікстури тестів.
+
+Застосунок працює в процесі (httpx.ASGITransport) проти окремої бази
+з TEST_DATABASE_URL - на старті вона очищується (drop_all), тому не
+вказуйте тут робочу базу. Без змінної тести пропускаються.
+Auth0 не потрібен: get_current_user підмінено, користувач - із заголовка
+X-Test-User. Фонові задачі (lifespan) не запускаються.
+
+Запуск (з папки backend):
+    TEST_DATABASE_URL=postgresql+asyncpg://postgres@localhost/bidbuy_test python -m pytest -q
+"""
+import os
+import sys
+import itertools
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+if TEST_DATABASE_URL:
+    # До імпорту застосунку: database.py і ratelimit.py читають змінні при імпорті
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+    os.environ["RATE_LIMIT_ENABLED"] = "0"
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+class Api:
+    """Клієнт застосунку і підготовка даних для тестів"""
+    def __init__(self, client, engine):
+        self.client = client
+        self.engine = engine
+        self.users = {}
+        self._names = itertools.count(1)
+
+    def headers(self, user):
+        return {"X-Test-User": user} if user else {}
+
+    async def request(self, method, url, user=None, **kwargs):
+        headers = {**self.headers(user), **kwargs.pop("headers", {})}
+        return await self.client.request(method, url, headers=headers, **kwargs)
+
+    async def ok(self, method, url, user=None, **kwargs):
+        response = await self.request(method, url, user=user, **kwargs)
+        assert response.status_code < 400, f"{method} {url}: {response.status_code} {response.text}"
+        return response
+
+    async def user(self, name=None, is_admin=False):
+        """Створює користувача (перший вхід); повертає ім'я для X-Test-User"""
+        name = name or f"user{next(self._names)}"
+        if name not in self.users:
+            self.users[name] = (await self.ok("GET", "/users/me", user=name)).json()["id"]
+            if is_admin:
+                await self.sql("UPDATE users SET is_admin = true WHERE id = :id", id=self.users[name])
+        return name
+
+    async def lot(self, seller="seller", bids=(), **fields):
+        """Активний лот зі ставками bids - [(покупець, сума), ...]"""
+        data = {"title": "Test lot", "start_price": "100", "min_step": "10", **fields}
+        lot_id = (await self.ok("POST", "/lots/", user=seller, data=data)).json()["id"]
+        for bidder, amount in bids:
+            await self.ok("POST", f"/bids/{lot_id}", user=bidder, json={"amount": amount})
+        return lot_id
+
+    async def sql(self, statement, **params):
+        from sqlalchemy import text
+        async with self.engine.begin() as conn:
+            result = await conn.execute(text(statement), params)
+            return result.all() if result.returns_rows else None
+
+@pytest.fixture(scope="session")
+def app():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    from main import app
+    return app
+
+@pytest.fixture(scope="module")
+async def api(anyio_backend, app):
+    import httpx
+    from fastapi import Request, HTTPException
+    from auth import get_current_user
+    from database import engine
+    from models import Base
+
+    async def test_user(request: Request):
+        sub = request.headers.get("x-test-user")
+        if not sub:
+            raise HTTPException(status_code=401, detail="Not authenticated")
+        return {"sub": f"test|{sub}", "email": f"{sub}@example.com", "nickname": sub}
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    app.dependency_overrides[get_current_user] = test_user
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            api = Api(client, engine)
+            for name in ("seller", "buyer", "rival"):
+                await api.user(name)
+            await api.user("admin", is_admin=True)
+            yield api
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+        # Наступний модуль працює в іншому event loop - з'єднання пулу звідси непридатні
+        await engine.dispose()
@@ -0,0 +1,33 @@
+# backend/tests/test_admission.py
+"""
+Класи пріоритету admission.classify: оплати не відкидаються, а фоновий
+POST /payments/check-expired іде в звичайний клас і оплатам не конкурент.
+"""
+import pytest
+
+@pytest.fixture(scope="module")
+def admission(app):
+    # database.py читає DATABASE_URL при імпорті - лише разом із застосунком
+    import admission
+    return admission
+
+def _scope(method, path, token=False):
+    headers = [(b"authorization", b"Bearer token")] if token else []
+    return {"method": method, "path": path, "headers": headers}
+
+@pytest.mark.parametrize("method, path, token, expected", [
+    ("POST", "/payments/", True, "PAYMENTS"),
+    ("POST", "/payments", True, "PAYMENTS"),
+    ("POST", "/payments/check-expired", False, "BROWSE"),
+    ("POST", "/payments/check-expired", True, "READS"),
+    ("POST", "/bids/7", True, "BIDS"),
+    ("DELETE", "/bids/7", True, "BIDS"),
+    ("GET", "/bids/7", False, "BROWSE"),
+    ("GET", "/lots/my", True, "READS"),
+])
+def test_classify(admission, method, path, token, expected):
+    assert admission.classify(_scope(method, path, token)) is getattr(admission, expected)
+
+@pytest.mark.parametrize("method, path", [("GET", "/"), ("GET", "/metrics"), ("GET", "/uploads/a.png"), ("OPTIONS", "/payments/")])
+def test_exempt(admission, method, path):
+    assert admission.classify(_scope(method, path)) is None
@@ -0,0 +1,93 @@
+# backend/tests/test_idempotency.py
+"""
+Idempotency-Key на POST /bids/{lot_id} (idempotency.py): повтор віддає
+збережену відповідь, інше тіло з тим самим ключем - 422, паралельний
+дублікат чекає на перший запит, прострочені ключі прибирає sweep.
+"""
+import uuid
+import asyncio
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture(scope="module")
+def idempotency(app):
+    # database.py читає DATABASE_URL при імпорті - лише разом із застосунком
+    import idempotency
+    return idempotency
+
+async def _bid(api, lot_id, amount, key, user="buyer"):
+    return await api.request(
+        "POST", f"/bids/{lot_id}", user=user, json={"amount": amount}, headers={"Idempotency-Key": key}
+    )
+
+async def _bid_count(api, lot_id):
+    return (await api.sql("SELECT count(*) FROM bids WHERE lot_id = :id", id=lot_id))[0][0]
+
+async def test_repeat_returns_stored_response(api):
+    lot_id = await api.lot()
+    key = str(uuid.uuid4())
+
+    first = await _bid(api, lot_id, 150, key)
+    assert first.status_code == 200, first.text
+    repeat = await _bid(api, lot_id, 150, key)
+
+    assert repeat.status_code == 200
+    assert repeat.headers["idempotent-replayed"] == "true"
+    assert repeat.json() == first.json()
+    # Обробник вдруге не виконувався
+    assert await _bid_count(api, lot_id) == 1
+
+async def test_key_with_different_payload_is_rejected(api):
+    lot_id = await api.lot()
+    key = str(uuid.uuid4())
+    assert (await _bid(api, lot_id, 150, key)).status_code == 200
+
+    response = await _bid(api, lot_id, 170, key)
+    assert response.status_code == 422
+    # Інший лот - інший шлях, теж інший запит
+    other = await _bid(api, await api.lot(), 150, key)
+    assert other.status_code == 422
+    assert await _bid_count(api, lot_id) == 1
+
+async def test_keys_are_per_user(api):
+    lot_id = await api.lot()
+    key = str(uuid.uuid4())
+    assert (await _bid(api, lot_id, 150, key)).status_code == 200
+    response = await _bid(api, lot_id, 170, key, user="rival")
+    assert response.status_code == 200
+    assert "idempotent-replayed" not in response.headers
+
+async def test_concurrent_duplicate_waits_for_first(api):
+    from sqlalchemy import text
+
+    lot_id = await api.lot()
+    key = str(uuid.uuid4())
+
+    # Замок на лоті тримає перший запит в обробнику, поки приходить дублікат
+    async with api.engine.connect() as conn:
+        await conn.execute(text("SELECT 1 FROM lots WHERE id = :id FOR UPDATE"), {"id": lot_id})
+        requests = [asyncio.create_task(_bid(api, lot_id, 150, key)) for _ in range(2)]
+        await asyncio.sleep(0.3)
+        assert not any(task.done() for task in requests), "duplicate must wait while the first is running"
+        await conn.rollback()
+    responses = await asyncio.gather(*requests)
+
+    assert [r.status_code for r in responses] == [200, 200]
+    assert responses[0].json() == responses[1].json()
+    assert sorted("idempotent-replayed" in r.headers for r in responses) == [False, True]
+    assert await _bid_count(api, lot_id) == 1
+
+async def test_expired_keys_are_swept(api, idempotency):
+    lot_id = await api.lot()
+    expired, fresh = str(uuid.uuid4()), str(uuid.uuid4())
+    assert (await _bid(api, lot_id, 150, expired)).status_code == 200
+    assert (await _bid(api, lot_id, 170, fresh, user="rival")).status_code == 200
+    await api.sql(
+        "UPDATE idempotency_keys SET expires_at = now() - interval '1 minute' WHERE key = :key", key=expired
+    )
+
+    assert await idempotency.sweep_expired_keys() >= 1
+    rows = await api.sql("SELECT key FROM idempotency_keys WHERE key IN (:expired, :fresh)", expired=expired, fresh=fresh)
+    assert rows == [(fresh,)]
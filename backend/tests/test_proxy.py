@@ -0,0 +1,92 @@
+# backend/tests/test_proxy.py
+"""
+proxy.resolve() проти покрокової симуляції війни автоматичних ставок.
+
+Покроково: поки є учасник (не лідер) з максимумом >= ціна + крок,
+найпріоритетніший з них (більший максимум, за рівності - раніший)
+ставить ціна + крок. Закрита форма має дати ту саму ціну, того самого
+лідера і ті самі останні видимі ставки кожного учасника.
+
+Випадки генеруються з фіксованим seed і перекосом на межові: однакові
+максимуми, максимуми точно на сітці кроків і поруч з нею, лідер з власною
+автоматичною ставкою, один учасник, жодного. БД не потрібна.
+"""
+import random
+from datetime import datetime, timezone, timedelta
+from decimal import Decimal
+
+import pytest
+
+from proxy import Contender, resolve, _priority
+
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+SEED = 1
+CASES = 20000
+
+def naive_resolve(price, step, leader_id, proxies):
+    raised = {}
+    while True:
+        candidates = [p for p in proxies if p.user_id != leader_id and p.max_amount >= price + step]
+        if not candidates:
+            return price, leader_id, raised
+        bidder = min(candidates, key=_priority)
+        price += step
+        leader_id = bidder.user_id
+        raised[leader_id] = price
+
+def random_case(rng):
+    step = Decimal(rng.choice((1, 5, 10, 25))) * Decimal(rng.choice(("1", "0.01", "0.5")))
+    price = Decimal(rng.randint(1, 200)) * step + Decimal(rng.choice((0, 0, 0, rng.randint(1, 99)))) / 100
+    leader_id = rng.choice((1, 2, 3, 99))
+
+    proxies = []
+    for user_id in rng.sample((1, 2, 3, 4, 5), rng.randint(0, 5)):
+        kind = rng.random()
+        if kind < 0.3:
+            # Точно на сітці кроків від поточної ціни
+            max_amount = price + step * rng.randint(0, 40)
+        elif kind < 0.5 and proxies:
+            # Той самий максимум, що в іншого учасника
+            max_amount = rng.choice(proxies).max_amount
+        else:
+            max_amount = price + step * rng.randint(-2, 40) + Decimal(rng.randint(-99, 99)) / 100
+        if user_id == leader_id and max_amount < price:
+            # Лідер не може мати максимум нижче власної видимої ставки
+            max_amount = price
+        placed_at = START + timedelta(seconds=rng.choice((0, 0, rng.randint(1, 100))))
+        proxies.append(Contender(user_id, max_amount, placed_at))
+    return price, step, leader_id, proxies
+
+def _describe(case):
+    price, step, leader_id, proxies = case
+    lines = [f"price={price} step={step} leader={leader_id}"]
+    lines += [f"    user {p.user_id}: max {p.max_amount} placed {p.placed_at:%H:%M:%S}" for p in proxies]
+    return "\n".join(lines)
+
+@pytest.mark.parametrize("case", [
+    # Жодного учасника, лише лідер, рівні максимуми (виграє раніший)
+    (Decimal("100"), Decimal("10"), 99, []),
+    (Decimal("100"), Decimal("10"), 1, [Contender(1, Decimal("500"), START)]),
+    (Decimal("100"), Decimal("10"), 99, [
+        Contender(1, Decimal("200"), START + timedelta(seconds=5)), Contender(2, Decimal("200"), START),
+    ]),
+], ids=["no proxies", "leader only", "equal maximums"])
+def test_edge_cases(case):
+    assert resolve(*case) == naive_resolve(*case)
+
+def test_matches_step_by_step_simulation():
+    rng = random.Random(SEED)
+    failures = []
+    for _ in range(CASES):
+        case = random_case(rng)
+        expected, actual = naive_resolve(*case), resolve(*case)
+        if actual != expected:
+            failures.append((case, expected, actual))
+
+    if failures:
+        # Найкоротший приклад - найлегше розібрати
+        case, expected, actual = min(failures, key=lambda failure: (len(failure[0][3]), failure[1][0]))
+        pytest.fail(
+            f"{len(failures)} of {CASES} mismatches, e.g. {_describe(case)}\n"
+            f"  step by step: {expected}\n  closed form:  {actual}"
+        )
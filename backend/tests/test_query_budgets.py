@@ -0,0 +1,245 @@
+# backend/tests/test_query_budgets.py
+"""
+Бюджети SQL-запитів маршрутів (querystats.QUERY_BUDGETS).
+
+Кожен маршрут викликається на холодному шляху - кеш порожній, користувач
+уже існує - під assert_max_queries(бюджет). Маршрут без бюджету або без
+сценарію тут валить тест, тож новий ендпоінт не пройде CI непоміченим.
+"""
+import uuid
+
+import pytest
+
+import querystats
+
+pytestmark = pytest.mark.anyio
+
+# --- СЦЕНАРІЇ ---
+# Підготовка (не рахується) і запит: (url, користувач, kwargs для httpx)
+
+async def _lot_with_winner(api):
+    """Закритий лот, що чекає оплати від buyer"""
+    lot_id = await api.lot(bids=[("rival", 110), ("buyer", 120)])
+    await api.ok("POST", f"/lots/{lot_id}/close", user="seller")
+    return lot_id
+
+async def _expired_lots(api, count):
+    """count лотів із простроченою оплатою, по дві ставки на кожному"""
+    lot_ids = [await _lot_with_winner(api) for _ in range(count)]
+    await api.sql(
+        "UPDATE lots SET payment_deadline = now() - interval '1 minute' WHERE id = ANY(:ids)", ids=lot_ids
+    )
+    return lot_ids
+
+async def _blocked_user(api):
+    target = await api.user()
+    job_id = (await api.ok(
+        "POST", f"/admin/users/{api.users[target]}/block", user="admin", json={"reason": "test", "is_permanent": True}
+    )).json()["job_id"]
+    return target, job_id
+
+async def get_lots(api):
+    await api.lot()
+    return "/lots/", None, {}
+
+async def get_my_lots(api):
+    await api.lot()
+    return "/lots/my", "seller", {}
+
+async def create_lot(api):
+    return "/lots/", "seller", {"data": {"title": "New lot", "start_price": "50"}}
+
+async def get_lot(api):
+    return f"/lots/{await api.lot(bids=[('buyer', 110)])}", None, {}
+
+async def update_lot(api):
+    return f"/lots/{await api.lot()}", "seller", {"data": {"title": "Renamed"}}
+
+async def close_lot(api):
+    return f"/lots/{await api.lot(bids=[('buyer', 110)])}/close", "seller", {}
+
+async def delete_lot(api):
+    return f"/lots/{await api.lot(bids=[('buyer', 110)])}", "seller", {}
+
+async def reopen_lot(api):
+    lot_id = await api.lot()
+    await api.sql("UPDATE lots SET status = 'closed_unsold' WHERE id = :id", id=lot_id)
+    return f"/lots/{lot_id}/reopen", "seller", {}
+
+async def get_my_bids(api):
+    await api.lot(bids=[("buyer", 110)])
+    return "/bids/my", "buyer", {}
+
+async def get_bids(api):
+    return f"/bids/{await api.lot(bids=[('buyer', 110), ('rival', 120)])}", None, {}
+
+async def place_bid(api):
+    lot_id = await api.lot(bids=[("rival", 110)])
+    return f"/bids/{lot_id}", "buyer", {"json": {"amount": 150}, "headers": {"Idempotency-Key": str(uuid.uuid4())}}
+
+async def cancel_bid(api):
+    lot_id = await api.lot()
+    bid = await api.ok("POST", f"/bids/{lot_id}", user="buyer", json={"amount": 110})
+    return f"/bids/{bid.json()['id']}", "buyer", {}
+
+async def pay(api):
+    lot_id = await _lot_with_winner(api)
+    return "/payments/", "buyer", {"json": {"lot_id": lot_id}, "headers": {"Idempotency-Key": str(uuid.uuid4())}}
+
+async def check_expired(api):
+    await _expired_lots(api, 3)
+    return "/payments/check-expired", None, {}
+
+async def get_me(api):
+    return "/users/me", "buyer", {}
+
+async def update_me(api):
+    return "/users/me", "buyer", {"json": {"bio": "Collector"}}
+
+async def get_notifications(api):
+    return "/users/notifications", "buyer", {}
+
+async def get_unread_count(api):
+    return "/users/notifications/unread-count", "buyer", {}
+
+async def read_notifications(api):
+    return "/users/notifications/read", "buyer", {}
+
+async def get_watchlist(api):
+    return "/users/watchlist", "buyer", {}
+
+async def watch_lot(api):
+    return f"/users/watchlist/{await api.lot()}", "buyer", {}
+
+async def unwatch_lot(api):
+    lot_id = await api.lot()
+    await api.ok("PUT", f"/users/watchlist/{lot_id}", user="buyer")
+    return f"/users/watchlist/{lot_id}", "buyer", {}
+
+async def lot_snapshots(api):
+    lot_ids = [await api.lot(bids=[("buyer", 110)]) for _ in range(3)]
+    return "/lots/snapshots", "buyer", {"json": {"lot_ids": lot_ids}}
+
+async def get_rules(api):
+    return "/settings/rules", None, {}
+
+async def update_rules(api):
+    return "/settings/rules", "admin", {"json": {"content": "Be nice"}}
+
+async def admin_users(api):
+    return "/admin/users", "admin", {}
+
+async def block_user(api):
+    target = await api.user()
+    await api.lot(seller=target)
+    return f"/admin/users/{api.users[target]}/block", "admin", {"json": {"reason": "spam", "is_permanent": True}}
+
+async def unblock_user(api):
+    target, _ = await _blocked_user(api)
+    return f"/admin/users/{api.users[target]}/unblock", "admin", {}
+
+async def ban_jobs(api):
+    await _blocked_user(api)
+    return "/admin/ban-jobs", "admin", {}
+
+async def ban_job(api):
+    _, job_id = await _blocked_user(api)
+    return f"/admin/ban-jobs/{job_id}", "admin", {}
+
+async def broadcast(api):
+    return "/admin/broadcasts", "admin", {"json": {"message": "Maintenance tonight"}}
+
+async def admin_delete_lot(api):
+    return f"/admin/lots/{await api.lot(bids=[('buyer', 110)])}", "admin", {}
+
+async def admin_profile(api):
+    return "/admin/profile", "admin", {"params": {"seconds": 0.05}}
+
+async def lot_view(api):
+    return f"/views/lot/{await api.lot(bids=[('buyer', 110), ('rival', 120)])}", "buyer", {}
+
+async def profile_view(api):
+    await api.lot(bids=[("buyer", 110)])
+    return "/views/profile", "buyer", {}
+
+SCENARIOS = {
+    ("GET", "/lots/"): get_lots,
+    ("GET", "/lots/my"): get_my_lots,
+    ("POST", "/lots/"): create_lot,
+    ("GET", "/lots/{lot_id}"): get_lot,
+    ("PATCH", "/lots/{lot_id}"): update_lot,
+    ("POST", "/lots/{lot_id}/close"): close_lot,
+    ("DELETE", "/lots/{lot_id}"): delete_lot,
+    ("POST", "/lots/{lot_id}/reopen"): reopen_lot,
+    ("GET", "/bids/my"): get_my_bids,
+    ("GET", "/bids/{lot_id}"): get_bids,
+    ("POST", "/bids/{lot_id}"): place_bid,
+    ("DELETE", "/bids/{bid_id}"): cancel_bid,
+    ("POST", "/payments/"): pay,
+    ("POST", "/payments/check-expired"): check_expired,
+    ("GET", "/users/me"): get_me,
+    ("PATCH", "/users/me"): update_me,
+    ("GET", "/users/notifications"): get_notifications,
+    ("GET", "/users/notifications/unread-count"): get_unread_count,
+    ("POST", "/users/notifications/read"): read_notifications,
+    ("GET", "/users/watchlist"): get_watchlist,
+    ("PUT", "/users/watchlist/{lot_id}"): watch_lot,
+    ("DELETE", "/users/watchlist/{lot_id}"): unwatch_lot,
+    ("POST", "/lots/snapshots"): lot_snapshots,
+    ("GET", "/settings/rules"): get_rules,
+    ("PUT", "/settings/rules"): update_rules,
+    ("GET", "/admin/users"): admin_users,
+    ("POST", "/admin/users/{user_id}/block"): block_user,
+    ("POST", "/admin/users/{user_id}/unblock"): unblock_user,
+    ("GET", "/admin/ban-jobs"): ban_jobs,
+    ("GET", "/admin/ban-jobs/{job_id}"): ban_job,
+    ("POST", "/admin/broadcasts"): broadcast,
+    ("DELETE", "/admin/lots/{lot_id}"): admin_delete_lot,
+    ("GET", "/admin/profile"): admin_profile,
+    ("GET", "/views/lot/{lot_id}"): lot_view,
+    ("GET", "/views/profile"): profile_view,
+}
+
+async def _count(api, route):
+    """Запитів на холодному шляху маршруту (відповідь має бути успішною)"""
+    import cache
+
+    method, _ = route
+    url, user, kwargs = await SCENARIOS[route](api)
+    cache.backend.clear()
+    with querystats.assert_max_queries(querystats.QUERY_BUDGETS[route]) as stats:
+        response = await api.request(method, url, user=user, **kwargs)
+    assert response.status_code < 400, f"{method} {url}: {response.status_code} {response.text}"
+    return stats.count
+
+# --- ТЕСТИ ---
+
+def test_every_route_has_a_budget(app):
+    # Зі схеми OpenAPI: app.routes містить вкладені роутери
+    routes = {
+        (method.upper(), path)
+        for path, operations in app.openapi()["paths"].items()
+        for method in operations
+    }
+    routes.discard(("GET", "/"))
+    assert routes - set(querystats.QUERY_BUDGETS) == set(), "routes without a query budget"
+    assert set(querystats.QUERY_BUDGETS) - routes == set(), "budgets for routes that no longer exist"
+    assert set(querystats.QUERY_BUDGETS) == set(SCENARIOS), "budgets without a scenario in this test"
+
+@pytest.mark.parametrize("route", sorted(SCENARIOS), ids=" ".join)
+async def test_route_within_budget(api, route):
+    await _count(api, route)
+
+async def test_check_expired_does_not_grow_with_lots(api):
+    # Раніше - запит ставок на кожен лот (N+1)
+    await _count(api, ("POST", "/payments/check-expired"))
+    await _expired_lots(api, 1)
+    one = await _count(api, ("POST", "/payments/check-expired"))
+    lot_ids = await _expired_lots(api, 5)
+    assert await _count(api, ("POST", "/payments/check-expired")) == one
+
+    # Перемога перейшла до другої ставки кожного лота
+    rows = await api.sql(
+        "SELECT b.lot_id, b.user_id FROM bids b WHERE b.lot_id = ANY(:ids) AND b.is_active", ids=lot_ids
+    )
+    assert sorted(rows) == [(lot_id, api.users["rival"]) for lot_id in lot_ids]
@@ -0,0 +1,85 @@
+# backend/tests/test_ratelimit.py
+"""
+Token bucket (ratelimit.py): вичерпане відро - 429 з Retry-After,
+RATE_LIMIT_OVERRIDES замінює ліміти маршруту, а правила з нульовою чи
+від'ємною швидкістю, нульовим відром або невідомим scope зупиняють старт.
+"""
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+BID_ROUTE = ("POST", "/bids/{lot_id}")
+
+@pytest.fixture
+def ratelimit(app, monkeypatch):
+    # conftest вимикає ліміти для решти тестів; тут - увімкнені, відра з нуля
+    import ratelimit
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_SPLIT_WORKERS", False)
+    ratelimit._buckets.clear()
+    yield ratelimit
+    ratelimit._buckets.clear()
+
+def _override(ratelimit, monkeypatch, rule):
+    for route, limits in ratelimit._parse_overrides(rule).items():
+        monkeypatch.setitem(ratelimit.RATE_LIMITS, route, limits)
+
+# --- ПРАВИЛА ---
+
+def test_parse_overrides(ratelimit):
+    Limit = ratelimit.Limit
+    assert ratelimit._parse_overrides(
+        "post /bids/{lot_id}=user:2/5, lot:100/200; DELETE /bids/{bid_id}=ip:0.5"
+    ) == {
+        BID_ROUTE: (Limit("user", 2, 5), Limit("lot", 100, 200)),
+        # Без розміру відра - дорівнює швидкості
+        ("DELETE", "/bids/{bid_id}"): (Limit("ip", 0.5, 0.5),),
+    }
+    assert ratelimit._parse_overrides("") == {}
+
+@pytest.mark.parametrize("spec", ["user:0/5", "user:-1/5", "user:2/0", "user:2/-3", "user:0", "tenant:2/5"])
+def test_invalid_override_is_rejected(ratelimit, spec):
+    with pytest.raises(RuntimeError, match="Invalid RATE_LIMIT_OVERRIDES rule"):
+        ratelimit._parse_overrides(f"POST /bids/{{lot_id}}={spec}")
+
+def test_check_takes_all_or_nothing(ratelimit):
+    Limit = ratelimit.Limit
+    limits = (Limit("user", 1, 1), Limit("lot", 1, 1))
+
+    assert ratelimit.check(BID_ROUTE, limits, ["u1", "7"], now=100.0) == (None, None)
+    # Лот вичерпано: відмова не знімає токен з відра користувача u2
+    retry_after, scope = ratelimit.check(BID_ROUTE, limits, ["u2", "7"], now=100.0)
+    assert (retry_after, scope) == (pytest.approx(1.0), "lot")
+    assert ratelimit.check(BID_ROUTE, limits, ["u2", "8"], now=100.0) == (None, None)
+    # Через секунду відро лота знову має токен
+    assert ratelimit.check(BID_ROUTE, limits, ["u3", "7"], now=101.0) == (None, None)
+
+# --- HTTP ---
+
+async def test_drained_bucket_returns_429_with_retry_after(api, ratelimit, monkeypatch):
+    _override(ratelimit, monkeypatch, "POST /bids/{lot_id}=user:0.1/2")
+    lot_ids = [await api.lot() for _ in range(3)]
+
+    for lot_id in lot_ids[:2]:
+        await api.ok("POST", f"/bids/{lot_id}", user="buyer", json={"amount": 110})
+    response = await api.request("POST", f"/bids/{lot_ids[2]}", user="buyer", json={"amount": 110})
+
+    assert response.status_code == 429
+    assert response.json()["detail"] == "Too many requests (user limit)"
+    # Один токен за 10 секунд
+    assert response.headers["retry-after"] == "10"
+    assert await api.sql("SELECT count(*) FROM bids WHERE lot_id = :id", id=lot_ids[2]) == [(0,)]
+    # Відро - своє в кожного користувача
+    await api.ok("POST", f"/bids/{lot_ids[2]}", user="rival", json={"amount": 110})
+
+async def test_override_replaces_route_limits(api, ratelimit, monkeypatch):
+    # Лише ліміт на лот: користувач не обмежений, лот - одна ставка
+    _override(ratelimit, monkeypatch, "POST /bids/{lot_id}=lot:0.5/1")
+    first, second = await api.lot(), await api.lot()
+
+    await api.ok("POST", f"/bids/{first}", user="buyer", json={"amount": 110})
+    response = await api.request("POST", f"/bids/{first}", user="rival", json={"amount": 120})
+    assert response.status_code == 429
+    assert response.json()["detail"] == "Too many requests (lot limit)"
+    assert response.headers["retry-after"] == "2"
+    await api.ok("POST", f"/bids/{second}", user="rival", json={"amount": 120})
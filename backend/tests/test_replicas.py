@@ -0,0 +1,209 @@
+# backend/tests/test_replicas.py
+"""
+Репліки для читання на справжній парі primary + standby.
+
+Фікстура піднімає локальний кластер (initdb, pg_basebackup -R) зі
+standby, що застосовує WAL із затримкою (recovery_min_apply_delay), тож
+репліка гарантовано відстає, і запускає uvicorn з двома воркерами:
+    - читання від імені користувача обслуговує репліка - primary розвантажено
+      (без X-Last-Write щойно створений лот ще не видно)
+    - з X-Last-Write із відповіді на запис кожне читання бачить запис,
+      на якому б воркері воно не виконувалось, а коли репліка наздогнала -
+      знову читає з неї
+
+Потрібні бінарники PostgreSQL (PG_BIN або pg_ctl у PATH), uvicorn і
+python-jose, а initdb не запускається від root; інакше тест пропускається.
+TEST_DATABASE_URL не потрібен.
+"""
+import os
+import sys
+import time
+import shutil
+import socket
+import subprocess
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APPLY_DELAY_SECONDS = 2
+
+pytestmark = pytest.mark.anyio
+
+def _pg_bin():
+    if os.getenv("PG_BIN"):
+        return os.getenv("PG_BIN")
+    pg_ctl = shutil.which("pg_ctl")
+    return os.path.dirname(pg_ctl) if pg_ctl else None
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _run(pg_bin, tool, *args):
+    subprocess.run([os.path.join(pg_bin, tool), *args], check=True, capture_output=True)
+
+def _configure(data_dir, **settings):
+    with open(os.path.join(data_dir, "postgresql.conf"), "a", encoding="utf-8") as f:
+        for name, value in settings.items():
+            f.write(f"{name} = '{value}'\n")
+
+class Cluster:
+    def __init__(self, pg_bin, root):
+        self.pg_bin = pg_bin
+        self.root = str(root)
+        self.primary_dir = os.path.join(self.root, "primary")
+        self.standby_dir = os.path.join(self.root, "standby")
+        self.primary_port, self.standby_port = _free_port(), _free_port()
+
+    def url(self, port):
+        return f"postgresql+asyncpg://postgres@/postgres?host={self.root}&port={port}"
+
+    def start(self):
+        _run(self.pg_bin, "initdb", "-D", self.primary_dir, "-U", "postgres", "-A", "trust", "-N")
+        _configure(
+            self.primary_dir, port=self.primary_port, listen_addresses="", unix_socket_directories=self.root,
+            wal_level="replica", max_wal_senders=4, fsync="off",
+        )
+        self._pg_ctl(self.primary_dir, "start")
+        _run(self.pg_bin, "pg_basebackup", "-h", self.root, "-p", str(self.primary_port), "-U", "postgres",
+             "-D", self.standby_dir, "-R", "-X", "stream")
+        _configure(self.standby_dir, port=self.standby_port, recovery_min_apply_delay=f"{APPLY_DELAY_SECONDS}s")
+        self._pg_ctl(self.standby_dir, "start")
+
+    def stop(self):
+        for data_dir in (self.standby_dir, self.primary_dir):
+            if os.path.exists(os.path.join(data_dir, "postmaster.pid")):
+                self._pg_ctl(data_dir, "stop", "-m", "immediate")
+
+    def _pg_ctl(self, data_dir, *args):
+        _run(self.pg_bin, "pg_ctl", "-D", data_dir, "-l", f"{data_dir}.log", "-w", *args)
+
+async def _scalar(cluster, port, query):
+    import asyncpg
+    conn = await asyncpg.connect(host=cluster.root, port=port, user="postgres", database="postgres")
+    try:
+        return await conn.fetchval(query)
+    finally:
+        await conn.close()
+
+@pytest.fixture(scope="module")
+async def server(anyio_backend, tmp_path_factory):
+    pg_bin = _pg_bin()
+    if not pg_bin:
+        pytest.skip("PostgreSQL binaries not found: set PG_BIN or put pg_ctl on PATH")
+    if hasattr(os, "geteuid") and os.geteuid() == 0:
+        pytest.skip("initdb refuses to run as root")
+    pytest.importorskip("uvicorn")
+    pytest.importorskip("jose")
+
+    import httpx
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from models import Base
+    from tools.loadtest import ensure_keys, Tokens, LOADTEST_DOMAIN, LOADTEST_AUDIENCE
+
+    root = tmp_path_factory.mktemp("pg")
+    cluster = Cluster(pg_bin, root)
+    process = None
+    try:
+        cluster.start()
+        # Схема - до старту воркерів, щоб їхні create_all не змагались
+        engine = create_async_engine(cluster.url(cluster.primary_port))
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        await engine.dispose()
+
+        private_pem, jwks_path = ensure_keys(str(root / "keys"))
+        port = _free_port()
+        env = {
+            **os.environ,
+            "DATABASE_URL": cluster.url(cluster.primary_port),
+            "DATABASE_REPLICA_URLS": cluster.url(cluster.standby_port),
+            # Затримка standby не виключає його з ротації; монітор міряє часто
+            "REPLICA_MAX_LAG_SECONDS": "60",
+            "REPLICA_LAG_CHECK_SECONDS": "0.2",
+            "DB_PROFILE": "bench",
+            "DB_POOL_SIZE": "5",
+            "AUTH0_JWKS_FILE": jwks_path,
+            "AUTH0_DOMAIN": LOADTEST_DOMAIN,
+            "AUTH0_API_AUDIENCE": LOADTEST_AUDIENCE,
+            "AUTH0_ALGORITHM": "RS256",
+            "RATE_LIMIT_ENABLED": "0",
+            "LOG_LEVEL": "WARNING",
+        }
+        with open(root / "uvicorn.log", "wb") as log:
+            process = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", "2"],
+                cwd=BACKEND, env=env, stdout=log, stderr=subprocess.STDOUT,
+            )
+
+        # Без keep-alive: кожен запит - нове з'єднання, його приймає будь-який воркер
+        limits = httpx.Limits(max_keepalive_connections=0)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=10) as client:
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    if (await client.get("/")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.monotonic() > deadline or process.poll() is not None:
+                    pytest.fail(f"uvicorn did not start:\n{(root / 'uvicorn.log').read_text()}")
+                time.sleep(0.2)
+            yield client, cluster, Tokens(private_pem)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(10)
+        cluster.stop()
+
+async def _wait_replayed(cluster):
+    """Поки standby не застосує весь WAL primary (і монітор це не помітить)"""
+    lsn = await _scalar(cluster, cluster.primary_port, "SELECT pg_current_wal_lsn()::text")
+    deadline = time.monotonic() + APPLY_DELAY_SECONDS * 5
+    while not await _scalar(cluster, cluster.standby_port, f"SELECT pg_last_wal_replay_lsn() >= '{lsn}'::pg_lsn"):
+        assert time.monotonic() < deadline, "standby did not catch up"
+        time.sleep(0.1)
+    time.sleep(0.5)
+
+async def _lot_scans(cluster):
+    return await _scalar(
+        cluster, cluster.standby_port,
+        "SELECT COALESCE(seq_scan, 0) + COALESCE(idx_scan, 0) FROM pg_stat_user_tables WHERE relname = 'lots'",
+    )
+
+async def test_reads_offloaded_and_see_own_writes(server):
+    client, cluster, tokens = server
+    auth = {"Authorization": f"Bearer {tokens.for_user('test|seller')}"}
+
+    # Користувач створюється записом - чекаємо, поки standby його отримає
+    assert (await client.get("/users/me", headers=auth)).status_code == 200
+    await _wait_replayed(cluster)
+
+    created = await client.post("/lots/", data={"title": "Fresh lot", "start_price": "10"}, headers=auth)
+    assert created.status_code == 200, created.text
+    lot_id = created.json()["id"]
+    last_write = created.headers.get("x-last-write")
+    assert last_write, "write response must carry X-Last-Write"
+
+    async def my_lot_ids(headers):
+        response = await client.get("/lots/my", headers=headers)
+        assert response.status_code == 200, response.text
+        return {lot["id"] for lot in response.json()}
+
+    # Без заголовка читання йде на репліку, яка запис ще не застосувала
+    assert lot_id not in await my_lot_ids(auth)
+    # З заголовком - бачимо свій запис на будь-якому воркері
+    for _ in range(6):
+        assert lot_id in await my_lot_ids({**auth, "X-Last-Write": last_write})
+
+    # Репліка наздогнала: читання з заголовком знову йдуть на неї
+    await _wait_replayed(cluster)
+    scans_before = await _lot_scans(cluster)
+    for _ in range(6):
+        assert lot_id in await my_lot_ids({**auth, "X-Last-Write": last_write})
+    # Монітор відставання таблиць не читає - скани lots на standby від цих запитів
+    deadline = time.monotonic() + 5
+    while await _lot_scans(cluster) == scans_before:
+        assert time.monotonic() < deadline, "reads after catch-up did not reach the standby"
+        time.sleep(0.2)
@@ -0,0 +1,131 @@
+# backend/tools/bench_bids.py
+"""
+Стеля пропускної здатності ставок на ОДИН гарячий лот:
+блокування рядка (routers/bids.py) проти послідовника з груповим
+комітом (sequencer.py).
+
+Без HTTP і JWT - викликається та сама логіка, що й у place_bid, щоб
+міряти саме запис ставки. Кожен покупець у циклі ставить
+"відома ціна + 1..3 кроки" (відома ціна - остання прийнята, як у
+клієнта з живим тікером), тож частина ставок програє гонку і
+відхиляється - як в останню хвилину справжнього аукціону.
+
+Після кожного прогону перевіряється, що ціна лота дорівнює найвищій
+активній ставці і найбільшій прийнятій сумі.
+
+Запуск (з папки backend, потрібна БД з DATABASE_URL; створює свої лоти і користувачів):
+    python -m tools.bench_bids --concurrency 8,32,128 --seconds 10
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+
+os.environ.setdefault("DB_PROFILE", "bench")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from sqlalchemy import func
+from sqlalchemy.future import select
+
+from database import engine, AsyncSessionLocal
+from models import Base, User, Lot, Bid
+from routers.bids import _place_bid_locked
+from tools.loadtest import percentile
+import sequencer
+
+MIN_STEP = Decimal("1.00")
+
+async def setup(bidders, run_id):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as db:
+        seller = User(auth0_sub=f"bench|{run_id}|seller", email=f"seller-{run_id}@bench.local", username="seller")
+        users = [User(auth0_sub=f"bench|{run_id}|{i}", email=f"b{i}-{run_id}@bench.local", username=f"b{i}") for i in range(bidders)]
+        db.add_all([seller, *users])
+        await db.flush()
+        lot = Lot(title=f"Bench {run_id}", start_price=Decimal("10.00"), current_price=Decimal("10.00"), min_step=MIN_STEP, status="active", seller_id=seller.id)
+        db.add(lot)
+        await db.commit()
+        return lot.id, [user.id for user in users]
+
+async def place_locked(lot_id, user_id, amount):
+    async with AsyncSessionLocal() as db:
+        return await _place_bid_locked(db, lot_id, user_id, amount)
+
+async def run_mode(mode, concurrency, seconds, seed):
+    run_id = f"{mode}-{concurrency}-{int(time.time() * 1000)}"
+    lot_id, user_ids = await setup(concurrency, run_id)
+    place = place_locked if mode == "lock" else sequencer.submit
+    rng = random.Random(seed)
+
+    known = {"price": Decimal("10.00")}
+    accepted, rejected, errors, latencies = [], 0, 0, []
+    deadline = time.perf_counter() + seconds
+
+    async def bidder(user_id):
+        nonlocal rejected, errors
+        while time.perf_counter() < deadline:
+            amount = known["price"] + MIN_STEP * rng.randint(1, 3)
+            started = time.perf_counter()
+            try:
+                await place(lot_id, user_id, amount)
+            except sequencer.BidRejected:
+                rejected += 1
+            except Exception:
+                errors += 1
+            else:
+                accepted.append(amount)
+                known["price"] = max(known["price"], amount)
+            latencies.append(time.perf_counter() - started)
+            # Відхилення з пам'яті повертається без жодного await - даємо циклу
+            # виконати інших (у справжньому сервері між запитами є мережа)
+            await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(bidder(user_id) for user_id in user_ids))
+    elapsed = time.perf_counter() - started
+
+    # Ціна лота = найвища активна ставка = найбільша прийнята
+    async with AsyncSessionLocal() as db:
+        price = (await db.execute(select(Lot.current_price).where(Lot.id == lot_id))).scalar()
+        top = (await db.execute(select(func.max(Bid.amount)).where(Bid.lot_id == lot_id, Bid.is_active == True))).scalar()
+    consistent = price == top == max(accepted, default=Decimal("10.00"))
+
+    total = len(accepted) + rejected + errors
+    return {
+        "mode": mode, "concurrency": concurrency,
+        "attempts_s": total / elapsed, "accepted_s": len(accepted) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000, "p99_ms": percentile(latencies, 99) * 1000,
+        "errors": errors, "consistent": consistent,
+    }
+
+async def run(args):
+    rows = []
+    for concurrency in args.concurrency:
+        for mode in args.modes:
+            rows.append(await run_mode(mode, concurrency, args.seconds, args.seed))
+            row = rows[-1]
+            print(
+                f"{row['mode']:10} {row['concurrency']:>5} {row['attempts_s']:>10.0f} {row['accepted_s']:>10.0f} "
+                f"{row['p50_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['errors']:>6}  {'ok' if row['consistent'] else 'INCONSISTENT'}",
+                flush=True,
+            )
+    await engine.dispose()
+    return 0 if all(row["consistent"] and not row["errors"] for row in rows) else 1
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=lambda value: [int(v) for v in value.split(",")], default=[8, 32, 128],
+                        help="кількість одночасних покупців (через кому)")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--modes", type=lambda value: value.split(","), default=["lock", "sequencer"])
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    print(f"{'mode':10} {'conc':>5} {'attempts/s':>10} {'accepted/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6}  prices")
+    sys.exit(asyncio.run(run(args)))
+
+if __name__ == "__main__":
+    main()
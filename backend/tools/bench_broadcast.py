@@ -0,0 +1,136 @@
+# backend/tools/bench_broadcast.py
+"""
+Оголошення для всіх користувачів: рядок notifications на кожного
+(як було) проти одного рядка broadcasts (broadcasts.py).
+
+Для обох підходів міряє запис (час, рядки, обсяг WAL, ріст таблиці з
+індексами) і читання від імені випадкових користувачів: список
+сповіщень, лічильник непрочитаних і "прочитати все".
+
+Усе виконується в одній транзакції, яка в кінці відкочується, - дані
+БД не змінюються (лише мертві рядки після fan-out, їх прибирає VACUUM
+наприкінці). Якщо користувачів менше за --users, бракуючі створюються
+в тій самій транзакції.
+
+Запуск (з папки backend, потрібна БД з DATABASE_URL, напр. з tools.datagen):
+    python -m tools.bench_broadcast --users 1000000 --readers 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+os.environ.setdefault("DB_PROFILE", "bench")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from sqlalchemy import func, insert, text, update
+from sqlalchemy.future import select
+
+from database import engine
+from models import Base, Broadcast, Notification, User
+from tools.loadtest import percentile
+import broadcasts
+
+MESSAGE = "📜 Правила сайту оновлено. Ознайомтеся з новою редакцією."
+
+async def _wal_lsn(conn):
+    return (await conn.execute(text("SELECT pg_current_wal_insert_lsn()"))).scalar()
+
+async def _write(conn, statement):
+    """(секунд, рядків, байт WAL) для одного запису"""
+    lsn = await _wal_lsn(conn)
+    started = time.perf_counter()
+    result = await conn.execute(statement)
+    elapsed = time.perf_counter() - started
+    wal = (await conn.execute(text("SELECT pg_wal_lsn_diff(pg_current_wal_insert_lsn(), :lsn)"), {"lsn": lsn})).scalar()
+    return elapsed, result.rowcount, int(wal)
+
+async def _size(conn, table):
+    return (await conn.execute(text("SELECT pg_total_relation_size(:table)"), {"table": table})).scalar()
+
+async def _timed(conn, readers, build):
+    latencies = []
+    for reader in readers:
+        started = time.perf_counter()
+        await conn.execute(build(reader))
+        latencies.append(time.perf_counter() - started)
+    return percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000
+
+async def ensure_users(conn, count):
+    existing = (await conn.execute(select(func.count()).select_from(User))).scalar()
+    if existing < count:
+        started = time.perf_counter()
+        await conn.execute(text(
+            "INSERT INTO users (auth0_sub, email, username) "
+            "SELECT 'bench-broadcast|' || g, 'bb' || g || '@bench.local', 'bb' || g FROM generate_series(1, :missing) g"
+        ), {"missing": count - existing})
+        print(f"created {count - existing} users ({time.perf_counter() - started:.1f}s)")
+    return max(existing, count)
+
+async def sample_readers(conn, count, seed):
+    ids = list((await conn.execute(select(User.id))).scalars())
+    chosen = random.Random(seed).sample(ids, min(count, len(ids)))
+    rows = await conn.execute(select(User.id, User.created_at, User.broadcasts_read_id).where(User.id.in_(chosen)))
+    return rows.all()
+
+def report(name, seconds, rows, wal, growth):
+    print(f"{name:28} {seconds * 1000:>10.1f} {rows:>10} {wal / 2**20:>9.1f} {growth / 2**20:>9.1f}")
+
+async def run(args):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with engine.connect() as conn:
+        await conn.begin()
+        users = await ensure_users(conn, args.users)
+        readers = await sample_readers(conn, args.readers, args.seed)
+        print(f"users: {users}, readers: {len(readers)}\n")
+        print(f"{'write':28} {'ms':>10} {'rows':>10} {'WAL MB':>9} {'+size MB':>9}")
+
+        # 1. Fan-out: рядок на користувача (відкочується до savepoint)
+        savepoint = await conn.begin_nested()
+        size = await _size(conn, "notifications")
+        seconds, rows, wal = await _write(conn, insert(Notification).from_select(
+            ["user_id", "message"], select(User.id, text(":message")).params(message=MESSAGE)
+        ))
+        report("fan-out notifications", seconds, rows, wal, await _size(conn, "notifications") - size)
+        fanout_list = await _timed(conn, readers, lambda user: select(Notification).where(Notification.user_id == user.id).order_by(Notification.created_at.desc()))
+        fanout_count = await _timed(conn, readers, lambda user: select(func.count()).select_from(Notification).where(Notification.user_id == user.id, Notification.is_read == False))
+        fanout_read = await _timed(conn, readers, lambda user: update(Notification).where(Notification.user_id == user.id, Notification.is_read == False).values(is_read=True))
+        await savepoint.rollback()
+
+        # 2. Розсилка: один рядок
+        size = await _size(conn, "broadcasts")
+        seconds, rows, wal = await _write(conn, insert(Broadcast).values(message=MESSAGE, segment="all"))
+        report("broadcast", seconds, rows, wal, await _size(conn, "broadcasts") - size)
+        broadcast_list = await _timed(conn, readers, broadcasts.feed_query)
+        broadcast_count = await _timed(conn, readers, broadcasts.unread_count_query)
+        broadcast_read = await _timed(conn, readers, lambda user: update(User).where(User.id == user.id).values(broadcasts_read_id=broadcasts.latest_id()))
+
+        print(f"\n{'read (per user)':28} {'fan-out p50':>12} {'p99':>8} {'broadcast p50':>14} {'p99':>8}")
+        for name, old, new in (("list notifications", fanout_list, broadcast_list),
+                               ("unread count", fanout_count, broadcast_count),
+                               ("mark all read", fanout_read, broadcast_read)):
+            print(f"{name:28} {old[0]:>12.2f} {old[1]:>8.2f} {new[0]:>14.2f} {new[1]:>8.2f}")
+
+        await conn.rollback()
+
+    if not args.no_vacuum:
+        # Відкочений fan-out лишив мільйон мертвих рядків
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text("VACUUM ANALYZE notifications"))
+    await engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000000, help="скільки користувачів отримують оголошення")
+    parser.add_argument("--readers", type=int, default=200, help="вибірка користувачів для замірів читання")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-vacuum", action="store_true", help="не запускати VACUUM notifications після прогону")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# backend/tools/bench_coalescing.py
+"""
+Бенчмарк об'єднання конкурентних читань (single-flight).
+
+1000 одночасних клієнтів читають один лот (GET /lots/{id}) з вимкненим кешем,
+спочатку без об'єднання, потім з ним. Виводить кількість SQL-запитів і p50/p99.
+
+Запуск (з папки backend, потрібна БД з DATABASE_URL):
+    python -m tools.bench_coalescing --readers 1000
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+import httpx
+from sqlalchemy import event
+
+import cache
+from database import engine, AsyncSessionLocal
+from main import app
+from models import Base, Lot, User
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+async def create_lot():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as db:
+        seller = User(auth0_sub=f"bench|{time.time_ns()}", email="bench@example.com", username="bench")
+        db.add(seller)
+        await db.flush()
+        lot = Lot(title="Bench lot", start_price=100, current_price=100, seller_id=seller.id)
+        db.add(lot)
+        await db.commit()
+        return lot.id
+
+async def run(lot_id, readers, coalesce):
+    cache.CACHE_ENABLED = False
+    cache.COALESCE_ENABLED = coalesce
+
+    queries = 0
+    def count(*args):
+        nonlocal queries
+        queries += 1
+    event.listen(engine.sync_engine, "before_cursor_execute", count)
+
+    latencies = []
+    errors = 0
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def reader():
+            nonlocal errors
+            start = time.perf_counter()
+            response = await client.get(f"/lots/{lot_id}")
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(reader() for _ in range(readers)))
+        elapsed = time.perf_counter() - started
+
+    event.remove(engine.sync_engine, "before_cursor_execute", count)
+    label = "coalescing ON " if coalesce else "coalescing OFF"
+    print(
+        f"{label}: {readers} readers, {queries} SQL queries, errors={errors}, "
+        f"p50={percentile(latencies, 50) * 1000:.1f}ms p99={percentile(latencies, 99) * 1000:.1f}ms "
+        f"total={elapsed:.2f}s"
+    )
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--readers", type=int, default=1000)
+    args = parser.parse_args()
+
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
+    lot_id = await create_lot()
+    await run(lot_id, args.readers, coalesce=False)
+    await run(lot_id, args.readers, coalesce=True)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+# backend/tools/bench_logging.py
+"""
+Бенчмарк пропускної здатності POST /bids/{lot_id}: синхронний вивід у stdout
+(як колишні print + echo SQL) проти логування через чергу.
+
+В обох режимах логується те саме: SQL (sqlalchemy.engine=INFO, як у dev)
+і кожна ставка (routers.bids=DEBUG). Різниця лише в тому, хто пише в stdout:
+event loop чи окремий потік. Щоб побачити ефект повільного споживача логів,
+направте stdout у файл або pipe; звіт друкується в stderr.
+
+Аутентифікація підмінена (заголовок x-bench-user) - Auth0 не потрібен.
+
+Запуск (з папки backend, потрібна БД з DATABASE_URL):
+    python -m tools.bench_logging --bidders 50 --bids 20 > /tmp/bench-logs.jsonl
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+
+import httpx
+from fastapi import Request
+
+import logging_setup
+from auth import get_current_user
+from database import engine, AsyncSessionLocal
+from main import app
+from models import Base, Lot, User
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+async def bench_user(request: Request):
+    sub = request.headers["x-bench-user"]
+    return {"sub": sub, "email": f"{sub}@bench.local", "nickname": sub}
+
+async def create_lots(bidders):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    run = time.time_ns()
+    async with AsyncSessionLocal() as db:
+        seller = User(auth0_sub=f"bench-seller|{run}", email="seller@bench.local", username="bench-seller")
+        db.add(seller)
+        await db.flush()
+        lots = [Lot(title=f"Bench lot {i}", start_price=100, current_price=100, min_step=1, seller_id=seller.id) for i in range(bidders)]
+        db.add_all(lots)
+        await db.commit()
+        return run, [lot.id for lot in lots]
+
+async def run(mode, bidders, bids):
+    # print не мав обмеження частоти - порівнюємо без нього
+    logging_setup.LOG_RATE_LIMIT = 0
+    logging_setup.setup_logging(queued=(mode == "queued"))
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO)
+    logging.getLogger("routers.bids").setLevel(logging.DEBUG)
+
+    run_id, lot_ids = await create_lots(bidders)
+    latencies = []
+    errors = 0
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def bidder(index, lot_id):
+            nonlocal errors
+            headers = {"x-bench-user": f"bench-bidder-{index}|{run_id}"}
+            for amount in range(101, 101 + bids):
+                start = time.perf_counter()
+                response = await client.post(f"/bids/{lot_id}", json={"amount": amount}, headers=headers)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(bidder(i, lot_id) for i, lot_id in enumerate(lot_ids)))
+        elapsed = time.perf_counter() - started
+
+    # Дочекатись, поки слухач допише чергу, - вже поза вимірюванням
+    logging_setup.stop_logging()
+    print(
+        f"{mode:6}: {len(latencies)} bids in {elapsed:.2f}s = {len(latencies) / elapsed:.0f} bids/s, "
+        f"errors={errors}, p50={percentile(latencies, 50) * 1000:.1f}ms p99={percentile(latencies, 99) * 1000:.1f}ms",
+        file=sys.stderr,
+    )
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bidders", type=int, default=50)
+    parser.add_argument("--bids", type=int, default=20)
+    args = parser.parse_args()
+
+    app.dependency_overrides[get_current_user] = bench_user
+    await run("sync", args.bidders, args.bids)
+    await run("queued", args.bidders, args.bids)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+# backend/tools/bench_metrics.py
+"""
+Бенчмарк накладних витрат на запис метрик.
+
+1. Вартість одного Counter.inc / Histogram.observe з мітками.
+2. Запит через HTTPMetricsMiddleware проти того ж ASGI-додатку без нього
+   (мінімальний Starlette-роутер, щоб міряти саме middleware, а не БД).
+
+Запуск (з папки backend, БД не потрібна):
+    python -m tools.bench_metrics --iterations 200000 --requests 20000
+"""
+import argparse
+import asyncio
+import time
+
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+import metrics
+
+def bench_primitives(iterations):
+    counter = metrics.Counter("bench_counter_total", "bench", ["reason"])
+    histogram = metrics.Histogram("bench_latency_seconds", "bench", ["method", "route", "status"])
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        counter.inc(reason="too_low")
+    counter_ns = (time.perf_counter() - started) / iterations * 1e9
+
+    started = time.perf_counter()
+    for i in range(iterations):
+        histogram.observe(i % 1000 / 10000, method="GET", route="/lots/{lot_id}", status="200")
+    histogram_ns = (time.perf_counter() - started) / iterations * 1e9
+
+    print(f"Counter.inc:       {counter_ns:8.0f} ns/op")
+    print(f"Histogram.observe: {histogram_ns:8.0f} ns/op")
+
+def build_app():
+    async def lot(request):
+        return PlainTextResponse("ok")
+    return Starlette(routes=[Route("/lots/{lot_id}", lot)])
+
+async def drive(app, requests):
+    """Викликає ASGI-додаток напряму - без мережі і HTTP-клієнта"""
+    scope = {
+        "type": "http", "method": "GET", "path": "/lots/1", "raw_path": b"/lots/1",
+        "root_path": "", "query_string": b"", "headers": [], "scheme": "http",
+        "server": ("bench", 80), "client": ("127.0.0.1", 1), "http_version": "1.1",
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - started) / requests * 1e6
+
+async def bench_middleware(requests):
+    bare = build_app()
+    metered = metrics.HTTPMetricsMiddleware(build_app())
+
+    # Прогрів
+    await drive(bare, 1000)
+    await drive(metered, 1000)
+
+    bare_us = await drive(bare, requests)
+    metered_us = await drive(metered, requests)
+    overhead = metered_us - bare_us
+    print(f"request without middleware: {bare_us:8.2f} us")
+    print(f"request with middleware:    {metered_us:8.2f} us")
+    print(f"overhead: {overhead:.2f} us/request ({overhead / bare_us * 100:.1f}% of a no-op route)")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    bench_primitives(args.iterations)
+    asyncio.run(bench_middleware(args.requests))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# backend/tools/bench_tracing.py
+"""
+Бенчмарк накладних витрат трасування при різних TRACE_SAMPLE_RATE.
+
+Маршрут-заглушка відкриває стільки ж спанів, скільки типовий POST /bids
+(user.resolve + ~8 SQL + commit + serialize), але без БД - тож вимірюється
+саме трасування. Відсоток рахується від --baseline-ms: типової латентності
+реального маршруту (див. http_request_duration_seconds в /metrics).
+
+Запуск (з папки backend, БД не потрібна):
+    python -m tools.bench_tracing --requests 20000 --baseline-ms 5
+"""
+import argparse
+import asyncio
+import time
+
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+import tracing
+
+SPANS_PER_REQUEST = 10
+
+def build_app():
+    async def bid(request):
+        with tracing.span("user.resolve"):
+            pass
+        for _ in range(SPANS_PER_REQUEST - 1):
+            with tracing.span("db.query", statement="SELECT 1"):
+                pass
+        return PlainTextResponse("ok")
+    return tracing.TracingMiddleware(Starlette(routes=[Route("/bids/{lot_id}", bid, methods=["POST"])]))
+
+async def drive(app, requests):
+    scope = {
+        "type": "http", "method": "POST", "path": "/bids/1", "raw_path": b"/bids/1",
+        "root_path": "", "query_string": b"", "headers": [], "scheme": "http",
+        "server": ("bench", 80), "client": ("127.0.0.1", 1), "http_version": "1.1",
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    started = time.perf_counter()
+    for i in range(requests):
+        await app(dict(scope), receive, send)
+        if i % 1000 == 0:
+            # Експортер тут не працює - просто звільняємо чергу
+            tracing._queue.clear()
+    tracing._queue.clear()
+    return (time.perf_counter() - started) / requests * 1e6
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--baseline-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    app = build_app()
+    tracing.TRACE_SAMPLE_RATE = 0
+    await drive(app, 1000)
+    untraced = await drive(app, args.requests)
+    print(f"rate=0     {untraced:8.2f} us/request (no-op route)")
+
+    for rate in (0.01, 0.1, 1.0):
+        tracing.TRACE_SAMPLE_RATE = rate
+        await drive(app, 1000)
+        cost = await drive(app, args.requests)
+        overhead = cost - untraced
+        print(
+            f"rate={rate:<5} {cost:8.2f} us/request, +{overhead:.2f} us "
+            f"= {overhead / (args.baseline_ms * 1000) * 100:.2f}% of a {args.baseline_ms:g} ms request"
+        )
+
+if __name__ == "__main__":
+    asyncio.run(main())
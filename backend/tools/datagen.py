@@ -0,0 +1,202 @@
+# backend/tools/datagen.py
+"""
+Детермінований генератор великого набору даних (COPY).
+
+Той самий --seed і --anchor дають ті самі рядки з тими самими id.
+Розподіли з перекосом, як у живому аукціоні:
+    - продавці: кілька "магазинів" з тисячами лотів, більшість - 1-2 лоти
+    - ставки: більшість лотів без ставок або з кількома, одиниці - з тисячами
+    - покупці і сповіщення: степеневий розподіл по користувачах
+Ціни узгоджені: current_price = найвища активна ставка, у проданих лотів
+є оплата від власника найвищої ставки, частина pending_payment - прострочена.
+
+Запуск (з папки backend, потрібна БД з DATABASE_URL; --reset перестворює таблиці!):
+    python -m tools.datagen --reset --users 1000000 --lots 500000 --bids 5000000 --notifications 2000000
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timezone, timedelta
+from decimal import Decimal
+
+from database import engine
+from models import Base
+
+CHUNK = 20000
+
+NAMES = ["olena", "taras", "iryna", "andrii", "oksana", "dmytro", "kateryna", "serhii", "natalia", "bohdan"]
+WORDS = ["vintage", "camera", "guitar", "watch", "bicycle", "lamp", "vinyl", "book", "coin", "poster",
+         "chair", "laptop", "ring", "painting", "jacket", "drone", "stamp", "radio", "vase", "clock"]
+
+USER_COLUMNS = ["id", "auth0_sub", "email", "username", "is_admin", "is_blocked", "created_at"]
+LOT_COLUMNS = ["id", "title", "description", "start_price", "current_price", "min_step", "status",
+               "payment_deadline_days", "payment_deadline_hours", "payment_deadline_minutes",
+               "payment_deadline", "lot_type", "seller_id", "created_at", "closed_at"]
+IMAGE_COLUMNS = ["id", "image_url", "lot_id"]
+BID_COLUMNS = ["id", "amount", "timestamp", "is_active", "user_id", "lot_id"]
+PAYMENT_COLUMNS = ["id", "amount", "created_at", "user_id", "lot_id"]
+NOTIFICATION_COLUMNS = ["id", "user_id", "message", "is_read", "created_at"]
+BROADCAST_COLUMNS = ["id", "message", "segment", "created_at"]
+
+TABLES = ["payments", "bids", "lot_images", "lots", "notifications", "broadcasts", "users"]
+
+def skewed(rng, n, power):
+    """Id від 1 до n; чим більший power, тим сильніше перевага малих id"""
+    return 1 + int(n * rng.random() ** power)
+
+class Generator:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.anchor = args.anchor
+        self.ids = {"image": 0, "bid": 0, "payment": 0}
+        # Середнє Pareto(alpha) = alpha / (alpha - 1): нормуємо до --bids на лот
+        self.bid_alpha = 1.3
+        self.bids_per_weight = args.bids / args.lots / (self.bid_alpha / (self.bid_alpha - 1))
+
+    def users(self, start, stop):
+        rng, anchor = self.rng, self.anchor
+        for user_id in range(start, stop):
+            yield (
+                user_id, f"gen|{user_id}", f"user{user_id}@example.com",
+                f"{rng.choice(NAMES)}{user_id}", user_id == 1, rng.random() < 0.01,
+                anchor - timedelta(days=rng.random() * 730),
+            )
+
+    def lots(self, start, stop):
+        """Лоти разом з їхніми ставками, фото та оплатами"""
+        rng, anchor, users = self.rng, self.anchor, self.args.users
+        lots, images, bids, payments = [], [], [], []
+
+        for lot_id in range(start, stop):
+            seller_id = skewed(rng, users, 4)
+            created_at = anchor - timedelta(days=rng.random() * 365)
+            start_price = Decimal(rng.randint(1, 200) * 5)
+            min_step = Decimal(rng.choice((5, 10, 10, 25, 50)))
+
+            count = min(5000, int(rng.paretovariate(self.bid_alpha) * self.bids_per_weight))
+            amount, stamp, top_user = start_price, created_at, None
+            for _ in range(count):
+                amount += min_step * rng.randint(1, 3)
+                stamp += timedelta(seconds=rng.randint(1, 3600))
+                bidder = skewed(rng, users, 3)
+                if bidder == seller_id:
+                    bidder = bidder % users + 1
+                self.ids["bid"] += 1
+                bids.append((self.ids["bid"], amount, min(stamp, anchor), True, bidder, lot_id))
+                top_user = bidder
+
+            age_days = (anchor - created_at).days
+            payment_deadline = closed_at = None
+            status = "active"
+            roll = rng.random()
+            if count and age_days > 14 and roll < 0.6:
+                status, closed_at = "sold", min(stamp + timedelta(days=1), anchor)
+                self.ids["payment"] += 1
+                payments.append((self.ids["payment"], amount, closed_at, top_user, lot_id))
+            elif count and age_days > 7 and roll < 0.7:
+                status = "pending_payment"
+                # Кожен п'ятий - прострочений: робота для sweep_expired_payments
+                payment_deadline = anchor + timedelta(hours=rng.randint(1, 24) * (-1 if rng.random() < 0.2 else 1))
+            elif not count and age_days > 7 and roll < 0.5:
+                status, closed_at = "closed_unsold", created_at + timedelta(days=7)
+
+            title = f"{rng.choice(WORDS).capitalize()} {rng.choice(WORDS)} #{lot_id}"
+            lots.append((
+                lot_id, title, f"Generated lot {lot_id}", start_price, amount, min_step, status,
+                0, 24, 0, payment_deadline, rng.choice(("private", "private", "business")),
+                seller_id, created_at, closed_at,
+            ))
+            for _ in range(rng.choice((0, 0, 1, 1, 2))):
+                self.ids["image"] += 1
+                images.append((self.ids["image"], f"/uploads/gen_{self.ids['image']}.jpg", lot_id))
+
+        return lots, images, bids, payments
+
+    def notifications(self, start, stop):
+        rng, anchor = self.rng, self.anchor
+        for notification_id in range(start, stop):
+            created_at = anchor - timedelta(days=rng.random() * 180)
+            yield (
+                notification_id, skewed(rng, self.args.users, 3),
+                f"Generated notification {notification_id}",
+                rng.random() < 0.7, created_at,
+            )
+
+    def broadcasts(self, count):
+        rng, anchor = self.rng, self.anchor
+        for broadcast_id in range(1, count + 1):
+            yield (
+                broadcast_id, f"Generated broadcast {broadcast_id}",
+                rng.choice(("all", "all", "all", "sellers", "bidders")),
+                anchor - timedelta(days=rng.random() * 730),
+            )
+
+async def load(args):
+    async with engine.begin() as conn:
+        if args.reset:
+            # Схема з нуля: create_all не додає нових індексів до наявних таблиць
+            await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    generator = Generator(args)
+    started = time.perf_counter()
+    totals = dict.fromkeys(TABLES, 0)
+
+    async with engine.connect() as conn:
+        raw = await conn.get_raw_connection()
+        pg = raw.driver_connection
+
+        if not args.reset and await pg.fetchval("SELECT EXISTS (SELECT 1 FROM users)"):
+            raise SystemExit("Tables are not empty: use --reset (generated ids start from 1)")
+
+        async def copy(table, columns, records):
+            if records:
+                await pg.copy_records_to_table(table, records=records, columns=columns)
+                totals[table] += len(records)
+
+        for start in range(1, args.users + 1, CHUNK):
+            await copy("users", USER_COLUMNS, list(generator.users(start, min(start + CHUNK, args.users + 1))))
+        print(f"users: {totals['users']} ({time.perf_counter() - started:.0f}s)")
+
+        for start in range(1, args.lots + 1, CHUNK):
+            lots, images, bids, payments = generator.lots(start, min(start + CHUNK, args.lots + 1))
+            await copy("lots", LOT_COLUMNS, lots)
+            await copy("lot_images", IMAGE_COLUMNS, images)
+            await copy("bids", BID_COLUMNS, bids)
+            await copy("payments", PAYMENT_COLUMNS, payments)
+        print(f"lots: {totals['lots']}, bids: {totals['bids']}, payments: {totals['payments']} ({time.perf_counter() - started:.0f}s)")
+
+        for start in range(1, args.notifications + 1, CHUNK):
+            await copy("notifications", NOTIFICATION_COLUMNS, list(generator.notifications(start, min(start + CHUNK, args.notifications + 1))))
+        print(f"notifications: {totals['notifications']} ({time.perf_counter() - started:.0f}s)")
+
+        await copy("broadcasts", BROADCAST_COLUMNS, list(generator.broadcasts(args.broadcasts)))
+
+        # Id задані явно - підтягуємо послідовності, щоб нові рядки не конфліктували
+        for table in TABLES:
+            await pg.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), GREATEST((SELECT max(id) FROM {table}), 1))")
+        await pg.execute(f"ANALYZE {', '.join(TABLES)}")
+
+    print(f"done in {time.perf_counter() - started:.0f}s: " + ", ".join(f"{table}={count}" for table, count in totals.items()))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000000)
+    parser.add_argument("--lots", type=int, default=500000)
+    parser.add_argument("--bids", type=int, default=5000000, help="приблизна загальна кількість ставок")
+    parser.add_argument("--notifications", type=int, default=2000000)
+    parser.add_argument("--broadcasts", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--anchor", type=lambda value: datetime.fromisoformat(value).replace(tzinfo=timezone.utc),
+        default=datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0),
+        help="'зараз' для згенерованих дат (ISO, за замовчуванням - сьогодні 00:00 UTC)",
+    )
+    parser.add_argument("--reset", action="store_true", help="перестворити таблиці перед завантаженням")
+    args = parser.parse_args()
+    asyncio.run(load(args))
+
+if __name__ == "__main__":
+    main()
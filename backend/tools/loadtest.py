@@ -0,0 +1,534 @@
+# backend/tools/loadtest.py
+"""
+Навантажувальний тест: сценарії, латентності та перевірка інваріантів.
+
+Auth0 не потрібен: скрипт генерує RSA-ключ і JWKS у --keys, підписує
+токени сам, а застосунок читає ключі з AUTH0_JWKS_FILE.
+
+Сценарії:
+    browse  - каталог, картка лота, ставки, правила
+    bidwar  - багато покупців б'ються за один лот
+    cascade - закриття аукціонів і ланцюжок прострочених оплат
+              (sweep_expired_payments передає перемогу наступному)
+    ban     - адмін банить учасника посеред торгів
+    overload - анонімний перегляд каталогу в рази понад пул, поки покупці
+              б'ються за лот і переможці платять (admission.py: p99 ставок
+              і оплат лишається обмеженим, перегляд отримує 503)
+
+Інваріанти (для всіх лотів цього запуску):
+    - ціна активного лота = максимальна активна ставка (або стартова)
+    - ціна лота з bidwar = максимальна прийнята (200) ставка
+    - не більше одного переможця: максимальна ставка унікальна, оплат <= 1,
+      оплатив саме власник найвищої ставки
+    - у забаненого користувача немає активних ставок
+
+Запуск (з папки backend, потрібна БД з DATABASE_URL):
+    python -m tools.loadtest --scenario all --users 40 --seed 1
+
+Перевантаження з малим пулом, з контролем допуску і без:
+    DB_POOL_SIZE=10 python -m tools.loadtest --scenario overload --requests 20
+    DB_POOL_SIZE=10 python -m tools.loadtest --scenario overload --requests 20 --no-admission
+
+Проти запущеного сервера (БД та сама, сервер стартує з ключами з --keys):
+    AUTH0_JWKS_FILE=.loadtest/jwks.json AUTH0_DOMAIN=loadtest.local \\
+    AUTH0_API_AUDIENCE=https://loadtest.local/api AUTH0_ALGORITHM=RS256 uvicorn main:app
+    python -m tools.loadtest --url http://localhost:8000
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+import httpx
+
+LOADTEST_DOMAIN = "loadtest.local"
+LOADTEST_AUDIENCE = "https://loadtest.local/api"
+KEY_ID = "loadtest-key"
+
+# --- КЛЮЧІ ТА ТОКЕНИ ---
+
+def _b64url_uint(value):
+    raw = value.to_bytes((value.bit_length() + 7) // 8, "big")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+def ensure_keys(directory):
+    """Створює (один раз) RSA-ключ і JWKS; повертає приватний ключ у PEM"""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    os.makedirs(directory, exist_ok=True)
+    private_path = os.path.join(directory, "private.pem")
+    jwks_path = os.path.join(directory, "jwks.json")
+
+    if not os.path.exists(private_path):
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        with open(private_path, "wb") as f:
+            f.write(key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.PKCS8,
+                serialization.NoEncryption(),
+            ))
+        numbers = key.public_key().public_numbers()
+        jwks = {"keys": [{
+            "kty": "RSA", "kid": KEY_ID, "use": "sig", "alg": "RS256",
+            "n": _b64url_uint(numbers.n), "e": _b64url_uint(numbers.e),
+        }]}
+        with open(jwks_path, "w", encoding="utf-8") as f:
+            json.dump(jwks, f)
+
+    with open(private_path, "rb") as f:
+        return f.read().decode(), jwks_path
+
+class Tokens:
+    def __init__(self, private_pem):
+        self.private_pem = private_pem
+        self._cache = {}
+
+    def for_user(self, sub):
+        token = self._cache.get(sub)
+        if token is None:
+            from jose import jwt
+            now = int(time.time())
+            name = sub.split("|")[-1]
+            claims = {
+                "sub": sub, "email": f"{sub.replace('|', '.')}@{LOADTEST_DOMAIN}", "nickname": name,
+                "aud": LOADTEST_AUDIENCE, "iss": f"https://{LOADTEST_DOMAIN}/",
+                "iat": now, "exp": now + 3600,
+            }
+            token = jwt.encode(claims, self.private_pem, algorithm="RS256", headers={"kid": KEY_ID})
+            self._cache[sub] = token
+        return token
+
+# --- СТАТИСТИКА ---
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.started = time.perf_counter()
+
+    def record(self, label, status, seconds):
+        self.latencies[label].append(seconds)
+        self.statuses[label][status] += 1
+
+    def server_errors(self):
+        # 503 - відкинуто контролем допуску (admission.py), це очікувана відповідь під перевантаженням
+        return sum(count for codes in self.statuses.values() for code, count in codes.items() if code == "exc" or (int(code) >= 500 and code != 503))
+
+    def shed(self):
+        return sum(codes.get(503, 0) for codes in self.statuses.values())
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        total = sum(len(values) for values in self.latencies.values())
+        lines = [f"{total} requests in {elapsed:.1f}s = {total / elapsed:.0f} req/s", ""]
+        lines.append(f"{'endpoint':34} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  statuses")
+        for label in sorted(self.latencies):
+            values = self.latencies[label]
+            codes = " ".join(f"{code}:{count}" for code, count in sorted(self.statuses[label].items(), key=lambda item: str(item[0])))
+            lines.append(
+                f"{label:34} {len(values):>6} {percentile(values, 50) * 1000:>8.1f} "
+                f"{percentile(values, 95) * 1000:>8.1f} {percentile(values, 99) * 1000:>8.1f}  {codes}"
+            )
+        return "\n".join(lines)
+
+# --- КЛІЄНТ ---
+
+class Harness:
+    def __init__(self, client, tokens, seed, run_id):
+        self.client = client
+        self.tokens = tokens
+        self.rng = random.Random(seed)
+        self.run_id = run_id
+        self.stats = Stats()
+        self.lot_ids = set()
+        self.bidwar_accepted = defaultdict(list)
+        self.banned_user_ids = set()
+
+    def sub(self, name):
+        return f"loadtest|{self.run_id}|{name}"
+
+    async def call(self, method, label, url, user=None, **kwargs):
+        headers = kwargs.pop("headers", {})
+        if user is not None:
+            headers["Authorization"] = f"Bearer {self.tokens.for_user(self.sub(user))}"
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=headers, **kwargs)
+        except httpx.HTTPError:
+            self.stats.record(label, "exc", time.perf_counter() - started)
+            return None
+        self.stats.record(label, response.status_code, time.perf_counter() - started)
+        return response
+
+    async def setup_call(self, method, label, url, user=None, **kwargs):
+        """Підготовчий запит сценарію: після 503 (admission.py) повторюється через Retry-After"""
+        while True:
+            response = await self.call(method, label, url, user=user, **kwargs)
+            if response is None or response.status_code != 503:
+                return response
+            await asyncio.sleep(float(response.headers.get("retry-after", 1)))
+
+    async def user_id(self, user):
+        response = await self.setup_call("GET", "GET /users/me", "/users/me", user=user)
+        return response.json()["id"]
+
+    async def create_lot(self, seller, start_price=100, min_step=10):
+        response = await self.setup_call(
+            "POST", "POST /lots/", "/lots/", user=seller,
+            data={"title": f"Load lot {self.rng.randint(0, 10**6)}", "start_price": str(start_price), "min_step": str(min_step)},
+        )
+        lot_id = response.json()["id"]
+        self.lot_ids.add(lot_id)
+        return lot_id
+
+    async def bid(self, bidder, lot_id, step_multiplier=None):
+        """Читає поточну ціну і перебиває її на 1-3 кроки"""
+        response = await self.call("GET", "GET /lots/{lot_id}", f"/lots/{lot_id}")
+        if response is None or response.status_code != 200:
+            return None
+        lot = response.json()
+        if lot["status"] != "active":
+            return None
+        steps = step_multiplier or self.rng.randint(1, 3)
+        amount = Decimal(lot["current_price"]) + Decimal(lot["min_step"]) * steps
+        response = await self.call("POST", "POST /bids/{lot_id}", f"/bids/{lot_id}", user=bidder, json={"amount": str(amount)})
+        if response is not None and response.status_code == 200:
+            return amount
+        return None
+
+# --- СЦЕНАРІЇ ---
+
+async def scenario_browse(h, users, requests_per_user):
+    lot_ids = sorted(h.lot_ids) or [await h.create_lot("browse-seller")]
+
+    async def visitor(index):
+        rng = random.Random(h.rng.random())
+        for _ in range(requests_per_user):
+            choice = rng.random()
+            if choice < 0.4:
+                await h.call("GET", "GET /lots/", f"/lots/?skip={rng.randint(0, 3) * 20}&limit=20")
+            elif choice < 0.75:
+                await h.call("GET", "GET /lots/{lot_id}", f"/lots/{rng.choice(lot_ids)}")
+            elif choice < 0.95:
+                await h.call("GET", "GET /bids/{lot_id}", f"/bids/{rng.choice(lot_ids)}")
+            else:
+                await h.call("GET", "GET /settings/rules", "/settings/rules")
+
+    await asyncio.gather(*(visitor(i) for i in range(users)))
+
+async def scenario_bidwar(h, users, attempts):
+    lot_id = await h.create_lot("war-seller", start_price=100, min_step=5)
+
+    async def bidder(index):
+        for _ in range(attempts):
+            amount = await h.bid(f"war-{index}", lot_id)
+            if amount is not None:
+                h.bidwar_accepted[lot_id].append(amount)
+
+    await asyncio.gather(*(bidder(i) for i in range(users)))
+
+    # Сповіщення "перебито" (outbid.py): війна ставок має давати не більше одного на учасника
+    import outbid
+    sent = await outbid.flush(drain=True)
+    print(f"bidwar: {len(h.bidwar_accepted[lot_id])} accepted bids -> {sent} outbid notifications", file=sys.stderr)
+
+async def scenario_cascade(h, users, lots):
+    """Закриття аукціонів, частина переможців не платить - перемога переходить далі"""
+    from datetime import datetime, timezone, timedelta
+    from sqlalchemy import update
+    from background_tasks import sweep_expired_payments
+    from database import AsyncSessionLocal
+    from models import Lot
+
+    bidders = [f"cascade-{i}" for i in range(max(3, users // 4))]
+    names_by_id = {await h.user_id(name): name for name in bidders}
+    lot_ids = [await h.create_lot("cascade-seller") for _ in range(lots)]
+
+    # Кожен лот отримує ставки від кількох покупців
+    async def bid_on(lot_id):
+        for bidder in h.rng.sample(bidders, 3):
+            await h.bid(bidder, lot_id, step_multiplier=1)
+    await asyncio.gather(*(bid_on(lot_id) for lot_id in lot_ids))
+
+    await asyncio.gather(*(
+        h.call("POST", "POST /lots/{lot_id}/close", f"/lots/{lot_id}/close", user="cascade-seller")
+        for lot_id in lot_ids
+    ))
+
+    # Кілька раундів: частина переможців платить, решта "прострочує"
+    for _ in range(3):
+        async def maybe_pay(lot_id):
+            response = await h.call("GET", "GET /bids/{lot_id}", f"/bids/{lot_id}")
+            if response is None or response.status_code != 200 or not response.json():
+                return
+            top = max(response.json(), key=lambda bid: Decimal(bid["amount"]))
+            winner = names_by_id.get(top["user_id"])
+            if winner is not None and h.rng.random() < 0.3:
+                await h.call("POST", "POST /payments/", "/payments/", user=winner, json={"lot_id": lot_id})
+
+        await asyncio.gather(*(maybe_pay(lot_id) for lot_id in lot_ids))
+
+        # Решта переможців "не встигла": дедлайн у минулому
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Lot)
+                .where(Lot.id.in_(lot_ids), Lot.status == "pending_payment")
+                .values(payment_deadline=datetime.now(timezone.utc) - timedelta(seconds=1))
+            )
+            await db.commit()
+        # Конкурентні проходи, як у кількох воркерів
+        await asyncio.gather(sweep_expired_payments(), sweep_expired_payments())
+
+async def scenario_ban(h, users, attempts):
+    from sqlalchemy import update
+    from database import AsyncSessionLocal
+    from models import User
+
+    admin_id = await h.user_id("admin")
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(User).where(User.id == admin_id).values(is_admin=True))
+        await db.commit()
+
+    victim = "ban-victim"
+    victim_id = await h.user_id(victim)
+    h.banned_user_ids.add(victim_id)
+    lot_ids = [await h.create_lot("ban-seller") for _ in range(3)]
+    await h.create_lot(victim)
+    bidders = [f"ban-{i}" for i in range(max(2, users // 4))] + [victim]
+
+    cascade_done = asyncio.Event()
+
+    async def bidder(name):
+        # Ставки до, під час і ще attempts після каскаду: запізнілі ставки
+        # забаненого не мають лишитися активними
+        while not cascade_done.is_set():
+            await h.bid(name, h.rng.choice(lot_ids))
+        for _ in range(attempts):
+            await h.bid(name, h.rng.choice(lot_ids))
+
+    async def ban_midway():
+        try:
+            await asyncio.sleep(0.05)
+            response = await h.setup_call(
+                "POST", "POST /admin/users/{user_id}/block", f"/admin/users/{victim_id}/block", user="admin",
+                json={"reason": "load test", "is_permanent": True},
+            )
+            # Каскад іде у фоні (ban_jobs.py) - інваріанти перевіряємо після нього
+            job_id = response.json()["job_id"]
+            while True:
+                job = await h.setup_call("GET", "GET /admin/ban-jobs/{job_id}", f"/admin/ban-jobs/{job_id}", user="admin")
+                if job.json()["status"] in ("done", "failed", "cancelled"):
+                    return
+                await asyncio.sleep(0.05)
+        finally:
+            cascade_done.set()
+
+    await asyncio.gather(ban_midway(), *(bidder(name) for name in bidders))
+
+async def scenario_overload(h, users, requests_per_user):
+    """Перегляд з кратним перевищенням пулу; ставки і оплати мають проходити"""
+    # Переможці для оплат: лоти з однією ставкою, закриті продавцем
+    payers = []
+    for index in range(max(5, users // 4)):
+        payer = f"overload-payer-{index}"
+        lot_id = await h.create_lot("overload-seller")
+        if await h.bid(payer, lot_id, step_multiplier=1) is not None:
+            await h.setup_call("POST", "POST /lots/{lot_id}/close", f"/lots/{lot_id}/close", user="overload-seller")
+            payers.append((payer, lot_id))
+    war_lot = await h.create_lot("overload-seller", start_price=100, min_step=5)
+    browsing = asyncio.Event()
+
+    async def visitor():
+        # Різні сторінки - промахи кешу, кожен запит іде в БД
+        rng = random.Random(h.rng.random())
+        for _ in range(requests_per_user):
+            response = await h.call("GET", "GET /lots/", f"/lots/?skip={rng.randint(0, 5000)}&limit={rng.randint(20, 60)}")
+            await backoff(response, rng)
+
+    async def backoff(response, rng):
+        # Клієнт поважає Retry-After (з розкидом, щоб повтори не прийшли разом)
+        if response is not None and response.status_code == 503:
+            await asyncio.sleep(rng.uniform(0, float(response.headers.get("retry-after", 1))))
+
+    async def bidder(index):
+        # Покупець читає лот від свого імені (клас "читання користувача", не анонімний перегляд)
+        name = f"overload-war-{index}"
+        rng = random.Random(h.rng.random())
+        while browsing.is_set():
+            response = await h.call("GET", "GET /lots/{lot_id} (auth)", f"/lots/{war_lot}", user=name)
+            if response is not None and response.status_code == 200:
+                lot = response.json()
+                amount = Decimal(lot["current_price"]) + Decimal(lot["min_step"]) * rng.randint(1, 3)
+                response = await h.call("POST", "POST /bids/{lot_id}", f"/bids/{war_lot}", user=name, json={"amount": str(amount)})
+                if response is not None and response.status_code == 200:
+                    h.bidwar_accepted[war_lot].append(amount)
+            await backoff(response, rng)
+            await asyncio.sleep(0.02)
+
+    async def payer(name, lot_id):
+        await asyncio.sleep(h.rng.uniform(0.1, 1.0))
+        await h.call("POST", "POST /payments/", "/payments/", user=name, json={"lot_id": lot_id})
+
+    async def browse():
+        browsing.set()
+        await asyncio.gather(*(visitor() for _ in range(users * 5)))
+        browsing.clear()
+
+    browse_task = asyncio.create_task(browse())
+    await asyncio.sleep(0)
+    await asyncio.gather(
+        browse_task,
+        *(bidder(i) for i in range(max(2, users // 4))),
+        *(payer(name, lot_id) for name, lot_id in payers),
+    )
+
+# --- ІНВАРІАНТИ ---
+
+async def check_invariants(h):
+    from sqlalchemy import select, func
+    from database import AsyncSessionLocal
+    from models import Lot, Bid, Payment
+
+    violations = []
+    async with AsyncSessionLocal() as db:
+        lots = (await db.execute(select(Lot).where(Lot.id.in_(h.lot_ids)))).scalars().all()
+        for lot in lots:
+            bids = (await db.execute(
+                select(Bid).where(Bid.lot_id == lot.id, Bid.is_active == True).order_by(Bid.amount.desc())
+            )).scalars().all()
+            top = bids[0].amount if bids else None
+
+            if lot.status == "active":
+                expected = top if top is not None else lot.start_price
+                if lot.current_price != expected:
+                    violations.append(f"lot #{lot.id}: current_price {lot.current_price} != max active bid {expected}")
+
+            if lot.id in h.bidwar_accepted:
+                best = max(h.bidwar_accepted[lot.id])
+                if lot.current_price != best:
+                    violations.append(f"lot #{lot.id}: current_price {lot.current_price} != max accepted bid {best}")
+
+            if len(bids) > 1 and bids[0].amount == bids[1].amount:
+                violations.append(f"lot #{lot.id}: two active bids share the top amount {top}")
+
+            payments = (await db.execute(select(Payment).where(Payment.lot_id == lot.id))).scalars().all()
+            if len(payments) > 1:
+                violations.append(f"lot #{lot.id}: {len(payments)} payments")
+            if lot.status == "sold" and payments and bids and payments[0].user_id != bids[0].user_id:
+                violations.append(f"lot #{lot.id}: paid by user #{payments[0].user_id}, top bid is user #{bids[0].user_id}")
+
+        if h.banned_user_ids:
+            active = (await db.execute(
+                select(func.count()).select_from(Bid).where(Bid.user_id.in_(h.banned_user_ids), Bid.is_active == True)
+            )).scalar()
+            if active:
+                violations.append(f"banned users still have {active} active bids")
+    return violations
+
+# --- ЗАПУСК ---
+
+SCENARIOS = ("browse", "bidwar", "cascade", "ban", "overload")
+
+async def run(args, private_pem):
+    from database import engine
+    from models import Base
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    run_id = f"{args.seed}-{time.time_ns()}"
+    tokens = Tokens(private_pem)
+    scenarios = SCENARIOS if args.scenario == "all" else (args.scenario,)
+
+    async def execute(client):
+        h = Harness(client, tokens, args.seed, run_id)
+        for name in scenarios:
+            print(f"--- {name}", file=sys.stderr)
+            if name == "browse":
+                await scenario_browse(h, args.users, args.requests)
+            elif name == "bidwar":
+                await scenario_bidwar(h, args.users, args.attempts)
+            elif name == "cascade":
+                await scenario_cascade(h, args.users, args.lots)
+            elif name == "ban":
+                await scenario_ban(h, args.users, args.attempts)
+            elif name == "overload":
+                if not args.url:
+                    import admission
+                    admission.ADMISSION_ENABLED = not args.no_admission
+                await scenario_overload(h, args.users, args.requests)
+        return h
+
+    limits = httpx.Limits(max_connections=args.users * 2)
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30) as client:
+            h = await execute(client)
+    else:
+        from main import app
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=30) as client:
+                h = await execute(client)
+
+    print(h.stats.report())
+    violations = await check_invariants(h)
+    print()
+    if violations:
+        print(f"INVARIANTS VIOLATED ({len(violations)}):")
+        for violation in violations:
+            print(f"  - {violation}")
+    else:
+        print(f"Invariants OK for {len(h.lot_ids)} lots")
+
+    if h.stats.shed():
+        print(f"{h.stats.shed()} requests shed under overload (503)")
+    server_errors = h.stats.server_errors()
+    if server_errors:
+        print(f"{server_errors} server errors / transport failures")
+    return 1 if violations or server_errors else 0
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenario", choices=("all",) + SCENARIOS, default="all")
+    parser.add_argument("--users", type=int, default=40, help="конкурентні віртуальні користувачі")
+    parser.add_argument("--requests", type=int, default=25, help="запитів на відвідувача (browse)")
+    parser.add_argument("--attempts", type=int, default=10, help="спроб ставки на покупця (bidwar, ban)")
+    parser.add_argument("--lots", type=int, default=10, help="лотів у cascade")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--keys", default=".loadtest")
+    parser.add_argument("--url", help="адреса запущеного сервера; без неї застосунок піднімається в процесі")
+    parser.add_argument("--no-admission", action="store_true", help="overload без контролю допуску - для порівняння")
+    args = parser.parse_args()
+
+    private_pem, jwks_path = ensure_keys(args.keys)
+    # До імпорту застосунку: auth читає ці змінні при імпорті
+    os.environ["AUTH0_JWKS_FILE"] = os.path.abspath(jwks_path)
+    os.environ["AUTH0_DOMAIN"] = LOADTEST_DOMAIN
+    os.environ["AUTH0_API_AUDIENCE"] = LOADTEST_AUDIENCE
+    os.environ["AUTH0_ALGORITHM"] = "RS256"
+    # Без SQL-ехо і шуму в логах, якщо не задано явно
+    os.environ.setdefault("DB_PROFILE", "bench")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    # Усі віртуальні користувачі йдуть з однієї IP - міряємо застосунок, а не ліміти
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+    # Клієнт і застосунок ділять один event loop - його lag тут артефакт тесту.
+    # Контроль допуску вмикає лише сценарій overload
+    os.environ.setdefault("ADMISSION_ENABLED", "0")
+
+    sys.exit(asyncio.run(run(args, private_pem)))
+
+if __name__ == "__main__":
+    main()
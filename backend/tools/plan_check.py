@@ -0,0 +1,236 @@
+# backend/tools/plan_check.py
+"""
+Регресійна перевірка планів запитів.
+
+Для кожного запиту, який виконують роутери та фонові задачі, знімає
+EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) і порівнює з базовою лінією
+в tools/plan_baselines.json:
+    - форма плану (типи вузлів, таблиці, індекси) має збігатися
+    - час виконання (мінімум з --runs) не більший за budget_ms
+Помилка - код виходу 1. Запит без базової лінії лише показується (NEW).
+
+Параметри беруться з даних: "гарячий" лот з найбільшою кількістю ставок,
+продавець з найбільшою кількістю лотів, найактивніший покупець тощо -
+саме там проявляється перекіс. Запити нижче дзеркалять код роутерів:
+змінюючи запит у роутері, онови його і тут (і базову лінію).
+
+Запуск (з папки backend, на даних з tools.datagen):
+    python -m tools.plan_check              # перевірка
+    python -m tools.plan_check --update     # прийняти поточні плани як базові
+    python -m tools.plan_check --only lots.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+from datetime import datetime, timezone, timedelta
+from decimal import Decimal
+
+from sqlalchemy import select, func, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import joinedload
+
+from database import AsyncSessionLocal
+from models import User, Notification, Lot, Bid, Payment, SiteSetting, WatchlistItem, ProxyBid, BanJob, ArchivedLot, ArchivedBid
+from routers.lots import _snapshot_query
+from routers.payments import _top_two_bids
+import archive
+import ban_jobs
+import broadcasts
+import outbid
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "plan_baselines.json")
+# Бюджет для нового запиту: у стільки разів повільніше за виміряне, але не менше MIN_BUDGET_MS
+BUDGET_FACTOR = 3
+MIN_BUDGET_MS = 5
+
+# Назва -> запит (p - параметри з sample_params). Назва: <роутер або задача>.<що робить>
+QUERIES = {
+    # routers/lots.py
+    "lots.list_first_page": lambda p: select(Lot).options(joinedload(Lot.seller), joinedload(Lot.images)).order_by(Lot.id.desc()).offset(0).limit(20),
+    "lots.list_deep_page": lambda p: select(Lot).options(joinedload(Lot.seller), joinedload(Lot.images)).order_by(Lot.id.desc()).offset(p["deep_skip"]).limit(20),
+    "lots.list_etag_deep_page": lambda p: select(Lot.id, Lot.version).order_by(Lot.id.desc()).offset(p["deep_skip"]).limit(20),
+    "lots.get": lambda p: select(Lot).options(joinedload(Lot.seller), joinedload(Lot.images)).where(Lot.id == p["hot_lot"]),
+    "lots.version": lambda p: select(Lot.version).where(Lot.id == p["hot_lot"]),
+    "lots.my": lambda p: select(Lot).options(joinedload(Lot.seller), joinedload(Lot.images)).where(Lot.seller_id == p["top_seller"]).order_by(Lot.id.desc()),
+    "lots.my_archive": lambda p: select(ArchivedLot).options(joinedload(ArchivedLot.seller), joinedload(ArchivedLot.images)).where(ArchivedLot.seller_id == p["top_seller"]),
+    "lots.get_archived": lambda p: select(ArchivedLot).options(joinedload(ArchivedLot.seller), joinedload(ArchivedLot.images)).where(ArchivedLot.id == p["hot_lot"]),
+    "lots.delete_bids": lambda p: select(Bid).where(Bid.lot_id == p["hot_lot"]),
+    "lots.snapshots": lambda p: _snapshot_query(p["top_bidder"], p["snapshot_lots"]),
+    "lots.snapshots_since": lambda p: _snapshot_query(p["top_bidder"], p["snapshot_lots"], p["recent_xid"]),
+    "lots.snapshots_watchlist": lambda p: _snapshot_query(p["top_bidder"]),
+    # routers/bids.py
+    "bids.for_lot": lambda p: select(Bid).where(Bid.lot_id == p["hot_lot"], Bid.is_active == True).order_by(Bid.amount.desc()),
+    "bids.best": lambda p: select(Bid).where(Bid.lot_id == p["hot_lot"], Bid.is_active == True).order_by(Bid.amount.desc()).limit(1),
+    "bids.existing": lambda p: select(Bid).where(Bid.lot_id == p["hot_lot"], Bid.user_id == p["top_bidder"], Bid.is_active == True),
+    # proxy.load_state
+    "bids.proxies": lambda p: select(ProxyBid).where(ProxyBid.lot_id == p["hot_lot"]),
+    "bids.participants": lambda p: select(Bid).where(Bid.lot_id == p["hot_lot"], Bid.user_id.in_([p["top_bidder"], p["top_seller"]]), Bid.is_active == True),
+    "bids.my": lambda p: select(Bid).options(joinedload(Bid.lot)).where(Bid.user_id == p["top_bidder"]).order_by(Bid.timestamp.desc()),
+    "bids.my_archive": lambda p: select(ArchivedBid).options(joinedload(ArchivedBid.lot)).where(ArchivedBid.user_id == p["top_bidder"]),
+    "bids.for_archived_lot": lambda p: select(ArchivedBid).where(ArchivedBid.lot_id == p["hot_lot"], ArchivedBid.is_active == True).order_by(ArchivedBid.amount.desc()),
+    # routers/users.py
+    "users.by_sub": lambda p: select(User).where(User.auth0_sub == p["top_bidder_sub"]),
+    "users.notifications": lambda p: broadcasts.feed_query(p["top_reader_user"]),
+    "users.unread_count": lambda p: broadcasts.unread_count_query(p["top_reader_user"]),
+    "users.watchlist": lambda p: select(WatchlistItem.lot_id).where(WatchlistItem.user_id == p["top_bidder"]).order_by(WatchlistItem.created_at.desc()),
+    # routers/admin.py
+    "admin.users_all": lambda p: select(User).order_by(User.id.desc()),
+    "admin.users_search": lambda p: select(User).order_by(User.id.desc()).where(User.username.ilike("%olena12%") | User.email.ilike("%olena12%")),
+    "admin.users_blocked": lambda p: select(User).order_by(User.id.desc()).where(User.is_blocked == True),
+    "admin.block_lots_count": lambda p: select(func.count()).select_from(Lot).where(Lot.seller_id == p["top_seller"]),
+    "admin.block_bid_lots_count": lambda p: select(func.count(func.distinct(Bid.lot_id))).where(Bid.user_id == p["top_bidder"], Bid.is_active == True),
+    "admin.ban_jobs": lambda p: select(BanJob).order_by(BanJob.id.desc()).limit(50),
+    # ban_jobs.py
+    "ban_jobs.lots_batch": lambda p: select(Lot.id).where(Lot.seller_id == p["top_seller"], Lot.created_at <= p["now"]).order_by(Lot.id).limit(ban_jobs.BAN_JOB_BATCH_SIZE).with_for_update(),
+    "ban_jobs.blocked_users": lambda p: select(User.id, User.is_blocked).where(User.id.in_([p["top_bidder"], p["top_seller"]])).order_by(User.id).with_for_update(read=True),
+    "ban_jobs.bid_lots_batch": lambda p: select(Bid.lot_id).where(Bid.user_id == p["top_bidder"], Bid.is_active == True, Bid.timestamp <= p["now"]).distinct().order_by(Bid.lot_id).limit(ban_jobs.BAN_JOB_BATCH_SIZE),
+    # routers/payments.py
+    "payments.for_lot": lambda p: select(Payment).where(Payment.lot_id == p["hot_lot"]),
+    "payments.expired_lots": lambda p: select(Lot).where(Lot.payment_deadline.isnot(None), Lot.payment_deadline < p["now"], Lot.status != "sold"),
+    "payments.expired_top_bids": lambda p: _top_two_bids(p["snapshot_lots"]),
+    # routers/settings.py
+    "settings.rules": lambda p: select(SiteSetting).where(SiteSetting.key == "rules"),
+    # outbid.py: подія на найгарячішому активному лоті, вікно з самого початку торгів
+    "tasks.outbid_notify": lambda p: outbid._notify_query([(p["hot_active_lot"], Decimal("0"))]),
+    # archive.py
+    "tasks.archive_candidates": lambda p: archive._candidates(p["now"] - timedelta(days=archive.ARCHIVE_AFTER_DAYS)),
+    # background_tasks.py
+    "tasks.expired_payments": lambda p: select(Lot).where(Lot.status == "pending_payment", Lot.payment_deadline < p["now"]),
+    "tasks.old_cancelled_bids": lambda p: select(Bid).where(Bid.is_active == False, Bid.timestamp < p["now"] - timedelta(minutes=10)),
+    "tasks.inactive_lots": lambda p: select(Lot).where(
+        Lot.status == "active", Lot.created_at < p["now"] - timedelta(days=7),
+        ~select(Bid.id).where(Bid.lot_id == Lot.id, Bid.is_active == True).exists(),
+    ),
+}
+
+async def sample_params(db):
+    async def scalar(query):
+        return (await db.execute(query)).scalar()
+
+    top_bidder = await scalar(select(Bid.user_id).group_by(Bid.user_id).order_by(func.count().desc()).limit(1))
+    top_reader = await scalar(select(Notification.user_id).group_by(Notification.user_id).order_by(func.count().desc()).limit(1))
+    return {
+        "now": datetime.now(timezone.utc),
+        "hot_lot": await scalar(select(Bid.lot_id).group_by(Bid.lot_id).order_by(func.count().desc()).limit(1)),
+        "hot_active_lot": await scalar(
+            select(Bid.lot_id).join(Lot, Lot.id == Bid.lot_id).where(Lot.status == "active").group_by(Bid.lot_id).order_by(func.count().desc()).limit(1)
+        ),
+        "top_seller": await scalar(select(Lot.seller_id).group_by(Lot.seller_id).order_by(func.count().desc()).limit(1)),
+        "top_bidder": top_bidder,
+        "top_bidder_sub": await scalar(select(User.auth0_sub).where(User.id == top_bidder)),
+        "top_reader": top_reader,
+        # Розсилки фільтруються за датою реєстрації і прочитаним id - потрібен сам користувач
+        "top_reader_user": await db.get(User, top_reader),
+        "deep_skip": (await scalar(select(func.count()).select_from(Lot))) // 2,
+        # Тікер на 300 лотів, де найактивніший покупець робив ставки
+        "snapshot_lots": list((await db.execute(
+            select(Bid.lot_id).where(Bid.user_id == top_bidder).group_by(Bid.lot_id).order_by(Bid.lot_id.desc()).limit(300)
+        )).scalars()),
+        # since_version - межа з попередньої відповіді: беремо недавні транзакції
+        "recent_xid": await scalar(select(func.max(Lot.version_xid))),
+    }
+
+def plan_shape(node, depth=0):
+    """Форма плану без оцінок і таймінгів: вузол, таблиця, індекс"""
+    line = node["Node Type"]
+    if "Join Type" in node and node["Node Type"] != "Hash":
+        line += f" ({node['Join Type']})"
+    if "Index Name" in node:
+        line += f" using {node['Index Name']}"
+    if "Relation Name" in node:
+        line += f" on {node['Relation Name']}"
+    lines = ["  " * depth + line]
+    for child in node.get("Plans", []):
+        lines.extend(plan_shape(child, depth + 1))
+    return lines
+
+async def explain(db, query, runs):
+    sql = query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    best = None
+    for _ in range(runs):
+        result = await db.execute(text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}"))
+        plan = result.scalar()
+        plan = (json.loads(plan) if isinstance(plan, str) else plan)[0]
+        if best is None or plan["Execution Time"] < best["Execution Time"]:
+            best = plan
+    root = best["Plan"]
+    return {
+        "shape": plan_shape(root),
+        "time_ms": round(best["Execution Time"], 3),
+        "buffers": root.get("Shared Hit Blocks", 0) + root.get("Shared Read Blocks", 0),
+        "rows": root.get("Actual Rows", 0),
+    }
+
+def load_baselines():
+    if not os.path.exists(BASELINE_FILE):
+        return {}
+    with open(BASELINE_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+async def run(args):
+    baselines = load_baselines()
+    names = [name for name in QUERIES if not args.only or name.startswith(args.only)]
+    results = {}
+
+    async with AsyncSessionLocal() as db:
+        params = await sample_params(db)
+        if params["hot_lot"] is None:
+            raise SystemExit("No data: generate it first with python -m tools.datagen")
+        for name in names:
+            results[name] = await explain(db, QUERIES[name](params), args.runs)
+        await db.rollback()
+
+    failures = 0
+    print(f"{'query':28} {'time ms':>9} {'budget':>8} {'buffers':>9} {'rows':>7}  status")
+    for name in names:
+        current = results[name]
+        baseline = baselines.get(name)
+        budget = baseline["budget_ms"] if baseline else None
+
+        if baseline is None:
+            status = "NEW"
+        elif current["shape"] != baseline["shape"]:
+            status = "PLAN CHANGED"
+        elif current["time_ms"] > budget:
+            status = "OVER BUDGET"
+        else:
+            status = "ok"
+        if status in ("PLAN CHANGED", "OVER BUDGET") and not args.update:
+            failures += 1
+
+        print(f"{name:28} {current['time_ms']:>9.2f} {budget if budget is not None else '-':>8} {current['buffers']:>9} {current['rows']:>7}  {status}")
+        if status == "PLAN CHANGED" or args.verbose:
+            if baseline is not None and status == "PLAN CHANGED":
+                print("    baseline:")
+                print("\n".join(f"      {line}" for line in baseline["shape"]))
+            print("    current:")
+            print("\n".join(f"      {line}" for line in current["shape"]))
+
+    if args.update:
+        for name in names:
+            previous = baselines.get(name, {})
+            # Вручну виставлений бюджет зберігається
+            budget = previous.get("budget_ms") or max(MIN_BUDGET_MS, math.ceil(results[name]["time_ms"] * BUDGET_FACTOR))
+            baselines[name] = {**results[name], "budget_ms": budget}
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump(dict(sorted(baselines.items())), f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"\nBaselines written to {BASELINE_FILE}")
+    elif failures:
+        print(f"\n{failures} regression(s)")
+    return 1 if failures else 0
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--update", action="store_true", help="записати поточні плани як базові")
+    parser.add_argument("--only", help="лише запити з цим префіксом назви")
+    parser.add_argument("--runs", type=int, default=3, help="скільки разів виконати кожен запит (береться найшвидший)")
+    parser.add_argument("--verbose", action="store_true", help="показати всі плани")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+if __name__ == "__main__":
+    main()
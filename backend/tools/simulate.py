@@ -0,0 +1,378 @@
+# backend/tools/simulate.py
+"""
+Симулятор життєвого циклу аукціонів на віртуальному годиннику.
+
+Годинник (clock.VirtualClock) іде кроками по --tick-minutes. На кожному кроці:
+    - продавці виставляють нові лоти, покупці перебивають ціни
+      (масові COPY/UPDATE - сумарний результат POST /lots і POST /bids)
+    - продавці закривають торги, частина переможців платить вчасно,
+      частина запізнюється або не платить зовсім
+    - справжні sweep-и з background_tasks.py працюють над реальною БД:
+      прострочені оплати (передача перемоги / повернення в active),
+      автозакриття лотів без ставок через 7 днів
+Стан ставок відкритих лотів симулятор тримає в пам'яті і сам таблицю bids
+не сканує - тож час і SQL у звіті належать sweep-ам.
+
+Звіт за періоди: активність і вартість sweep-ів на віртуальну добу -
+секунди, SQL-запити, оброблені рядки. Sweep виконується не частіше разу
+за крок (у продакшні - кожні 10 с / 60 с), тож менший --tick-minutes
+дає картину, ближчу до реальної.
+
+Запуск (з папки backend, окрема БД з DATABASE_URL; --reset перестворює таблиці!):
+    python -m tools.simulate --reset --days 90 --lots-per-day 3000 --bids-per-day 20000
+Без --reset симулятор не стартує, а з ним відмовляється, якщо в users є
+хтось, крім користувачів попереднього запуску (sim|...), - справжню базу
+він не зітре.
+"""
+import argparse
+import asyncio
+import heapq
+import logging
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timezone, timedelta
+from decimal import Decimal
+
+import background_tasks
+import clock
+import querystats
+from database import engine
+from models import Base
+from tools.datagen import TABLES, USER_COLUMNS, LOT_COLUMNS, BID_COLUMNS
+
+# Сповіщення й оплати створюють і sweep-и - id для них видає БД
+NOTIFICATION_COLUMNS = ["user_id", "message", "is_read", "created_at"]
+PAYMENT_COLUMNS = ["amount", "created_at", "user_id", "lot_id"]
+
+# Інтервали проходів у продакшні (див. start_background_tasks)
+SWEEPS = {
+    "check_expired_payments": (background_tasks.sweep_expired_payments, 10),
+    "delete_old_cancelled_bids": (background_tasks.sweep_old_cancelled_bids, 60),
+    "close_inactive_lots": (background_tasks.sweep_inactive_lots, 3600),
+}
+
+class SimLot:
+    __slots__ = ("id", "seller_id", "created_at", "price", "step", "deadline", "close_at", "deadline_at", "bids", "bid_by_user")
+
+    def __init__(self, lot_id, seller_id, created_at, price, step, deadline, close_at):
+        self.id = lot_id
+        self.created_at = created_at
+        self.seller_id = seller_id
+        self.price = price
+        self.step = step
+        self.deadline = deadline        # тривалість вікна оплати
+        self.close_at = close_at        # коли продавець закриє торги (None - ніколи)
+        self.deadline_at = None         # поточний дедлайн оплати
+        self.bids = []                  # [id, сума, user_id] за зростанням суми
+        self.bid_by_user = {}
+
+class Simulation:
+    def __init__(self, args, pg):
+        self.args = args
+        self.pg = pg
+        self.rng = random.Random(args.seed)
+        self.clock = clock.VirtualClock(args.start)
+        self.next_ids = defaultdict(lambda: 1)
+        self.open_lots = {}       # торги йдуть
+        self.open_order = []      # id у порядку створення - для перекосу в бік свіжих
+        self.pending = {}         # чекають оплати
+        self.payments_due = []    # heap: (коли, id лота, id ставки переможця)
+        self.period = defaultdict(int)
+        self.sweeps = defaultdict(lambda: [0, 0.0, 0, 0])  # назва -> [проходи, секунди, SQL, рядки]
+
+    def new_id(self, table):
+        value = self.next_ids[table]
+        self.next_ids[table] += 1
+        return value
+
+    def per_tick(self, per_day):
+        """Кількість подій на крок; дробова частина - з відповідною ймовірністю"""
+        expected = per_day * self.args.tick_minutes / 1440
+        count = int(expected)
+        return count + (1 if self.rng.random() < expected - count else 0)
+
+    async def copy(self, table, columns, records):
+        if records:
+            await self.pg.copy_records_to_table(table, records=records, columns=columns)
+
+    # --- АКТИВНІСТЬ КОРИСТУВАЧІВ ---
+
+    async def create_users(self):
+        now = self.clock.now()
+        await self.copy("users", USER_COLUMNS, [
+            (user_id, f"sim|{user_id}", f"sim{user_id}@example.com", f"sim{user_id}", False, False, now)
+            for user_id in range(1, self.args.users + 1)
+        ])
+
+    async def create_lots(self, now):
+        records = []
+        for _ in range(self.per_tick(self.args.lots_per_day)):
+            lot_id = self.new_id("lots")
+            seller_id = 1 + int(self.args.users * self.rng.random() ** 4)
+            price = Decimal(self.rng.randint(1, 200) * 5)
+            step = Decimal(self.rng.choice((5, 10, 10, 25, 50)))
+            hours = self.rng.choice((1, 6, 24, 24, 48))
+            close_at = None
+            if self.rng.random() > self.args.abandon_rate:
+                close_at = now + timedelta(hours=self.rng.uniform(12, 240))
+            self.open_lots[lot_id] = SimLot(lot_id, seller_id, now, price, step, timedelta(hours=hours), close_at)
+            self.open_order.append(lot_id)
+            records.append((
+                lot_id, f"Sim lot {lot_id}", None, price, price, step, "active",
+                0, hours, 0, None, "private", seller_id, now, None,
+            ))
+        await self.copy("lots", LOT_COLUMNS, records)
+        self.period["lots"] += len(records)
+
+    async def place_bids(self, now):
+        if len(self.open_order) > 2 * len(self.open_lots) + 1000:
+            self.open_order = [lot_id for lot_id in self.open_order if lot_id in self.open_lots]
+        if not self.open_lots:
+            return
+
+        new_bids, raised, prices = [], {}, {}
+        for _ in range(self.per_tick(self.args.bids_per_day)):
+            # Більшість ставок - на нещодавно виставлені лоти
+            index = len(self.open_order) - 1 - int(len(self.open_order) * self.rng.random() ** 3)
+            lot = self.open_lots.get(self.open_order[index])
+            user_id = 1 + int(self.args.users * self.rng.random() ** 2)
+            if lot is None or user_id == lot.seller_id:
+                continue
+            lot.price += lot.step * self.rng.randint(1, 3)
+            bid = lot.bid_by_user.get(user_id)
+            if bid is None:
+                bid = [self.new_id("bids"), lot.price, user_id]
+                lot.bid_by_user[user_id] = bid
+                new_bids.append((bid[0], lot.price, now, True, user_id, lot.id))
+            else:
+                # Як у POST /bids: власна активна ставка оновлюється
+                lot.bids.remove(bid)
+                bid[1] = lot.price
+                raised[bid[0]] = lot.price
+            lot.bids.append(bid)
+            prices[lot.id] = lot.price
+
+        await self.copy("bids", BID_COLUMNS, new_bids)
+        if raised:
+            await self.pg.execute(
+                "UPDATE bids SET amount = t.amount, timestamp = $3 "
+                "FROM unnest($1::int[], $2::numeric[]) AS t(id, amount) WHERE bids.id = t.id",
+                list(raised), list(raised.values()), now,
+            )
+        if prices:
+            await self.pg.execute(
+                "UPDATE lots SET current_price = t.price, version = nextval('lot_version_seq'), version_xid = pg_current_xact_id()::text::bigint "
+                "FROM unnest($1::int[], $2::numeric[]) AS t(id, price) WHERE lots.id = t.id",
+                list(prices), list(prices.values()),
+            )
+        self.period["bids"] += len(new_bids) + len(raised)
+
+    def plan_payment(self, lot, now):
+        """Переможець платить вчасно, із запізненням або не платить"""
+        lot.deadline_at = now + lot.deadline
+        if lot.bids and self.rng.random() < self.args.pay_rate:
+            heapq.heappush(self.payments_due, (now + lot.deadline * self.rng.uniform(0.05, 1.2), lot.id, lot.bids[-1][0]))
+
+    async def close_auctions(self, now):
+        closing = [lot for lot in self.open_lots.values() if lot.close_at is not None and lot.close_at <= now and lot.bids]
+        if not closing:
+            return
+        for lot in closing:
+            del self.open_lots[lot.id]
+            self.pending[lot.id] = lot
+            self.plan_payment(lot, now)
+        # Як у POST /lots/{id}/close: статус, дедлайн, сповіщення переможцю
+        await self.pg.execute(
+            "UPDATE lots SET status = 'pending_payment', payment_deadline = t.deadline, version = nextval('lot_version_seq'), version_xid = pg_current_xact_id()::text::bigint "
+            "FROM unnest($1::int[], $2::timestamptz[]) AS t(id, deadline) WHERE lots.id = t.id",
+            [lot.id for lot in closing], [lot.deadline_at for lot in closing],
+        )
+        await self.copy("notifications", NOTIFICATION_COLUMNS, [
+            (lot.bids[-1][2], f"Sim: won lot {lot.id}", False, now)
+            for lot in closing
+        ])
+        self.period["closed"] += len(closing)
+
+    async def pay(self, now):
+        due = []
+        while self.payments_due and self.payments_due[0][0] <= now:
+            due.append(heapq.heappop(self.payments_due))
+        if not due:
+            return
+        # Як у POST /payments: поки дедлайн не минув і ставка переможця ще жива
+        rows = await self.pg.fetch(
+            "UPDATE lots SET status = 'sold', closed_at = $3, version = nextval('lot_version_seq'), version_xid = pg_current_xact_id()::text::bigint "
+            "FROM unnest($1::int[], $2::int[]) AS t(lot_id, bid_id) "
+            "WHERE lots.id = t.lot_id AND lots.status = 'pending_payment' AND lots.payment_deadline >= $3 "
+            "AND EXISTS (SELECT 1 FROM bids WHERE bids.id = t.bid_id AND bids.is_active) "
+            "RETURNING lots.id, lots.current_price",
+            [item[1] for item in due], [item[2] for item in due], now,
+        )
+        records = []
+        for row in rows:
+            lot = self.pending.pop(row["id"])
+            records.append((row["current_price"], now, lot.bids[-1][2], lot.id))
+        await self.copy("payments", PAYMENT_COLUMNS, records)
+        self.period["paid"] += len(records)
+        self.period["late"] += len(due) - len(records)
+
+    # --- ФОНОВІ ЗАДАЧІ ---
+
+    async def run_sweeps(self, tick):
+        for name, (sweep, interval) in SWEEPS.items():
+            if tick % max(1, interval // (self.args.tick_minutes * 60)):
+                continue
+            started = time.perf_counter()
+            with querystats.track(f"sim:{name}") as stats:
+                rows = await sweep()
+            totals = self.sweeps[name]
+            totals[0] += 1
+            totals[1] += time.perf_counter() - started
+            totals[2] += stats.count
+            totals[3] += rows or 0
+
+            if name == "close_inactive_lots":
+                # Лоти без ставок старші за 7 днів sweep щойно закрив
+                cutoff = self.clock.now() - timedelta(days=7)
+                for lot in [lot for lot in self.open_lots.values() if not lot.bids and lot.created_at < cutoff]:
+                    del self.open_lots[lot.id]
+
+    async def reconcile(self, now):
+        """Звіряє пам'ять з тим, що зробив sweep прострочених оплат"""
+        expired = [lot_id for lot_id, lot in self.pending.items() if lot.deadline_at < now]
+        if not expired:
+            return
+        rows = await self.pg.fetch("SELECT id, status, payment_deadline FROM lots WHERE id = ANY($1::int[])", expired)
+        for row in rows:
+            lot = self.pending[row["id"]]
+            if row["status"] != "pending_payment":
+                # Ставок не лишилось - лот знову active; далі на нього не ставимо
+                del self.pending[lot.id]
+                self.period["reactivated"] += 1
+            elif row["payment_deadline"] > lot.deadline_at:
+                # Ставку переможця видалено, перемога перейшла до наступного
+                lot.bids.pop()
+                self.plan_payment(lot, row["payment_deadline"] - lot.deadline)
+                lot.deadline_at = row["payment_deadline"]
+                self.period["promoted"] += 1
+
+    # --- ЗВІТ ---
+
+    def print_header(self):
+        print(f"{'days':>9} {'lots':>7} {'bids':>8} {'closed':>7} {'paid':>6} {'late':>6} {'promo':>6} {'react':>6}  "
+              + "  ".join(f"{name[:24]:>24}" for name in SWEEPS))
+        print(f"{'':>9} {'':>7} {'':>8} {'':>7} {'':>6} {'':>6} {'':>6} {'':>6}  "
+              + "  ".join(f"{'s/day SQL/day rows/day':>24}" for _ in SWEEPS))
+
+    def print_period(self, first_day, last_day):
+        days = last_day - first_day + 1
+        cells = []
+        for name in SWEEPS:
+            _, seconds, queries, rows = self.sweeps[name]
+            cells.append(f"{seconds / days:>6.2f} {queries / days:>8.0f} {rows / days:>8.0f}")
+        p = self.period
+        print(f"{first_day:>4}-{last_day:<4} {p['lots']:>7} {p['bids']:>8} {p['closed']:>7} {p['paid']:>6} {p['late']:>6} "
+              f"{p['promoted']:>6} {p['reactivated']:>6}  " + "  ".join(f"{cell:>24}" for cell in cells))
+        self.period.clear()
+        self.sweeps.clear()
+
+    async def run(self):
+        args = self.args
+        tick = timedelta(minutes=args.tick_minutes)
+        ticks_per_day = 1440 // args.tick_minutes
+        await self.create_users()
+        self.print_header()
+
+        started = time.perf_counter()
+        with clock.use_clock(self.clock):
+            for index in range(1, args.days * ticks_per_day + 1):
+                self.clock.advance(tick)
+                now = self.clock.now()
+                await self.create_lots(now)
+                await self.place_bids(now)
+                await self.close_auctions(now)
+                await self.pay(now)
+                await self.run_sweeps(index)
+                await self.reconcile(now)
+
+                day = index // ticks_per_day
+                if index % ticks_per_day == 0 and (day % args.report_days == 0 or day == args.days):
+                    self.print_period(day - (day - 1) % args.report_days, day)
+        elapsed = time.perf_counter() - started
+        print(f"\n{args.days} simulated days in {elapsed:.1f}s ({args.days * 86400 / elapsed:.0f}x real time)")
+
+    async def check_invariants(self):
+        now = self.clock.now()
+        checks = {
+            "pending lots past deadline": (
+                "SELECT count(*) FROM lots WHERE status = 'pending_payment' AND payment_deadline < $1",
+                now - timedelta(minutes=self.args.tick_minutes),
+            ),
+            "closed_unsold lots with active bids": (
+                "SELECT count(*) FROM lots WHERE status = 'closed_unsold' AND EXISTS "
+                "(SELECT 1 FROM bids WHERE bids.lot_id = lots.id AND bids.is_active)",
+            ),
+            "sold lots without exactly one payment": (
+                "SELECT count(*) FROM lots LEFT JOIN (SELECT lot_id, count(*) AS n FROM payments GROUP BY lot_id) p "
+                "ON p.lot_id = lots.id WHERE lots.status = 'sold' AND coalesce(p.n, 0) <> 1",
+            ),
+            "lots whose price is not the top active bid": (
+                "SELECT count(*) FROM lots JOIN (SELECT lot_id, max(amount) AS top FROM bids WHERE is_active GROUP BY lot_id) b "
+                "ON b.lot_id = lots.id WHERE lots.status IN ('active', 'pending_payment') AND lots.current_price <> b.top",
+            ),
+        }
+        failures = 0
+        for name, (sql, *params) in checks.items():
+            count = await self.pg.fetchval(sql, *params)
+            failures += bool(count)
+            print(f"{'FAIL' if count else 'ok':4} {name}: {count}")
+        return failures
+
+async def run(args):
+    if not args.reset:
+        raise SystemExit("The simulator recreates all tables: pass --reset to confirm (use a separate database)")
+
+    # Схема з нуля: create_all не додає нових індексів до наявних таблиць
+    async with engine.begin() as conn:
+        has_users = (await conn.exec_driver_sql("SELECT to_regclass('users') IS NOT NULL")).scalar()
+        if has_users and (await conn.exec_driver_sql("SELECT EXISTS (SELECT 1 FROM users WHERE auth0_sub NOT LIKE 'sim|%')")).scalar():
+            raise SystemExit("Table users is not empty: refusing to drop a database the simulator did not create")
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with engine.connect() as conn:
+        raw = await conn.get_raw_connection()
+        pg = raw.driver_connection
+
+        simulation = Simulation(args, pg)
+        await simulation.run()
+
+        for table in TABLES:
+            await pg.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), GREATEST((SELECT max(id) FROM {table}), 1))")
+        print()
+        return 1 if await simulation.check_invariants() else 0
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--lots-per-day", type=int, default=3000)
+    parser.add_argument("--bids-per-day", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--pay-rate", type=float, default=0.7, help="частка переможців, що намагаються оплатити")
+    parser.add_argument("--abandon-rate", type=float, default=0.1, help="частка лотів, які продавець ніколи не закриває")
+    parser.add_argument("--tick-minutes", type=int, default=60, choices=(5, 10, 15, 20, 30, 60))
+    parser.add_argument("--report-days", type=int, default=7)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--reset", action="store_true", help="перестворити таблиці (обов'язково: симулятор починає з порожньої бази)")
+    parser.add_argument(
+        "--start", type=lambda value: datetime.fromisoformat(value).replace(tzinfo=timezone.utc),
+        default=datetime(2026, 1, 1, tzinfo=timezone.utc), help="початок віртуального часу (ISO)",
+    )
+    args = parser.parse_args()
+    # Попередження про N+1 у sweep-ах і так видно в колонці SQL/day
+    logging.getLogger("querystats").setLevel(logging.ERROR)
+    raise SystemExit(asyncio.run(run(args)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+# backend/tracing.py
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+import httpx
+import fastapi.routing
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Легке трасування запитів без зовнішніх залежностей.
+# Кореневий спан - HTTP-запит або один прохід фонової задачі; дочірні -
+# auth, пошук користувача, кожен SQL-запит, commit, серіалізація, файли.
+# Рішення про семплінг приймається один раз на корені: для невідібраних
+# трас span() - це лише читання contextvar, тому TRACE_SAMPLE_RATE
+# прямо керує накладними витратами.
+# Експорт пачками з фонової задачі: JSONL-файл (з ротацією) або OTLP/HTTP (JSON).
+# Вхідний traceparent завжди продовжує трасу (trace_id, батьківський спан),
+# але прапорець sampled від клієнта вмикає трасу лише за довіреним проксі
+# (TRACE_TRUST_TRACEPARENT=1) - інакше будь-хто міг би ввімкнути повне
+# трасування кожного свого запиту. Без довіри рішення - за TRACE_SAMPLE_RATE.
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "file")  # file | otlp
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+# Після TRACE_FILE_MAX_BYTES файл стає traces.jsonl.1 (старші зсуваються), зберігається TRACE_FILE_BACKUPS файлів
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", str(100 * 1024 * 1024)))
+TRACE_FILE_BACKUPS = int(os.getenv("TRACE_FILE_BACKUPS", "3"))
+# Прапорець sampled із traceparent - лише від довіреного проксі/gateway
+TRACE_TRUST_TRACEPARENT = os.getenv("TRACE_TRUST_TRACEPARENT", "0") == "1"
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "bidbuy-api")
+TRACE_EXPORT_INTERVAL_SECONDS = float(os.getenv("TRACE_EXPORT_INTERVAL_SECONDS", "1"))
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", "20000"))
+
+spans_exported = metrics.Counter("trace_spans_exported_total", "Spans written by the trace exporter")
+spans_dropped = metrics.Counter("trace_spans_dropped_total", "Spans dropped because the export queue was full or export failed")
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "error", "root")
+
+    def __init__(self, trace_id, parent_id, name, attributes, root=False):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.error = None
+        self.root = root
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def child(self, name, **attributes):
+        return Span(self.trace_id, self.span_id, name, attributes)
+
+    def end(self, error=None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = error
+        _enqueue(self)
+
+    def as_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+_current_span = contextvars.ContextVar("trace_span", default=None)
+_queue = deque()
+
+def _enqueue(span):
+    if len(_queue) >= TRACE_QUEUE_SIZE:
+        spans_dropped.inc()
+        return
+    _queue.append(span)
+
+def current_span():
+    return _current_span.get()
+
+def _parse_traceparent(header):
+    """W3C traceparent: 00-<trace_id>-<parent_id>-<flags>"""
+    try:
+        version, trace_id, parent_id, flags = header.strip().split("-")
+        if len(trace_id) != 32 or len(parent_id) != 16:
+            return None
+        return trace_id, parent_id, int(flags, 16) & 1 == 1
+    except (ValueError, AttributeError):
+        return None
+
+@contextmanager
+def start_trace(name, traceparent=None, **attributes):
+    """Кореневий спан. Повертає None, якщо траса не відібрана семплінгом."""
+    parent = _parse_traceparent(traceparent) if traceparent else None
+    if parent is not None and TRACE_TRUST_TRACEPARENT:
+        trace_id, parent_id, sampled = parent
+    else:
+        trace_id, parent_id = parent[:2] if parent is not None else (None, None)
+        sampled = TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE
+
+    if not sampled:
+        yield None
+        return
+
+    root = Span(trace_id or f"{random.getrandbits(128):032x}", parent_id, name, attributes, root=True)
+    token = _current_span.set(root)
+    error = None
+    try:
+        yield root
+    except BaseException as e:
+        error = repr(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        root.end(error)
+
+@contextmanager
+def span(name, **attributes):
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+
+    child = parent.child(name, **attributes)
+    token = _current_span.set(child)
+    error = None
+    try:
+        yield child
+    except BaseException as e:
+        error = repr(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        child.end(error)
+
+# --- SQL ТА COMMIT ---
+# Спани SQL не стають поточними: всередині курсора дочірніх спанів немає
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _trace_query_start(conn, cursor, statement, parameters, context, executemany):
+    parent = _current_span.get()
+    if parent is not None:
+        conn.info.setdefault("trace_spans", []).append(
+            parent.child("db.query", statement=" ".join(statement.split())[:500])
+        )
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _trace_query_end(conn, cursor, statement, parameters, context, executemany):
+    spans = conn.info.get("trace_spans")
+    if spans:
+        query_span = spans.pop()
+        query_span.set(rowcount=cursor.rowcount)
+        query_span.end()
+
+@event.listens_for(Engine, "handle_error")
+def _trace_query_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("trace_spans"):
+        connection.info["trace_spans"].pop().end(repr(exception_context.original_exception))
+
+@event.listens_for(Session, "before_commit")
+def _trace_commit_start(session):
+    parent = _current_span.get()
+    if parent is not None:
+        session.info["trace_commit"] = parent.child("db.commit")
+
+@event.listens_for(Session, "after_commit")
+def _trace_commit_end(session):
+    commit_span = session.info.pop("trace_commit", None)
+    if commit_span is not None:
+        commit_span.end()
+
+@event.listens_for(Session, "after_rollback")
+def _trace_commit_failed(session):
+    commit_span = session.info.pop("trace_commit", None)
+    if commit_span is not None:
+        commit_span.end("rollback")
+
+# --- СЕРІАЛІЗАЦІЯ ВІДПОВІДІ ---
+# FastAPI викликає serialize_response як глобальну функцію модуля routing
+
+_serialize_response = fastapi.routing.serialize_response
+
+async def _traced_serialize_response(*args, **kwargs):
+    with span("serialize"):
+        return await _serialize_response(*args, **kwargs)
+
+fastapi.routing.serialize_response = _traced_serialize_response
+
+# --- HTTP ---
+
+class TracingMiddleware:
+    """Чистий ASGI middleware: кореневий спан на кожен відібраний запит"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+
+        with start_trace(f"{scope['method']} {scope['path']}", traceparent=traceparent) as root:
+            if root is None:
+                await self.app(scope, receive, send)
+                return
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    root.set(status=message["status"])
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-trace-id", root.trace_id.encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = scope.get("route")
+                if route is not None:
+                    # Шаблон маршруту замість конкретного URL - для групування
+                    root.name = f"{scope['method']} {route.path}"
+                root.set(path=scope["path"])
+
+# --- ЕКСПОРТ ---
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def _otlp_payload(spans):
+    otlp_spans = []
+    for item in spans:
+        otlp_span = {
+            "traceId": item.trace_id,
+            "spanId": item.span_id,
+            "name": item.name,
+            "kind": 2 if item.root else 1,
+            "startTimeUnixNano": str(item.start_ns),
+            "endTimeUnixNano": str(item.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in item.attributes.items()],
+            "status": {"code": 2, "message": item.error} if item.error else {"code": 1},
+        }
+        if item.parent_id:
+            otlp_span["parentSpanId"] = item.parent_id
+        otlp_spans.append(otlp_span)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": TRACE_SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "bidbuy.tracing"}, "spans": otlp_spans}],
+        }]
+    }
+
+def _rotate_file():
+    """traces.jsonl -> traces.jsonl.1 -> ... -> traces.jsonl.N (найстаріший видаляється)"""
+    for index in range(TRACE_FILE_BACKUPS - 1, 0, -1):
+        source = f"{TRACE_FILE}.{index}"
+        if os.path.exists(source):
+            os.replace(source, f"{TRACE_FILE}.{index + 1}")
+    if TRACE_FILE_BACKUPS > 0:
+        os.replace(TRACE_FILE, f"{TRACE_FILE}.1")
+    else:
+        os.remove(TRACE_FILE)
+
+def _write_file(spans):
+    if TRACE_FILE_MAX_BYTES > 0 and os.path.exists(TRACE_FILE) and os.path.getsize(TRACE_FILE) >= TRACE_FILE_MAX_BYTES:
+        _rotate_file()
+    with open(TRACE_FILE, "a", encoding="utf-8") as f:
+        for item in spans:
+            f.write(json.dumps(item.as_dict(), ensure_ascii=False, default=str) + "\n")
+
+async def export_pending(client=None):
+    batch = []
+    while _queue:
+        batch.append(_queue.popleft())
+    if not batch:
+        return 0
+
+    try:
+        if TRACE_EXPORTER == "otlp":
+            response = await client.post(TRACE_OTLP_ENDPOINT, json=_otlp_payload(batch))
+            response.raise_for_status()
+        else:
+            # Запис у файл - в потоці, щоб не блокувати event loop
+            await asyncio.to_thread(_write_file, batch)
+    except Exception:
+        # Трасування не повинно впливати на роботу - пачку відкидаємо
+        spans_dropped.inc(len(batch))
+        raise
+    spans_exported.inc(len(batch))
+    return len(batch)
+
+async def _export_loop():
+    async with httpx.AsyncClient(timeout=5) as client:
+        while True:
+            await asyncio.sleep(TRACE_EXPORT_INTERVAL_SECONDS)
+            try:
+                await export_pending(client)
+            except Exception as e:
+                logger.warning("Trace export failed: %s", e)
+
+async def start_trace_exporter():
+    # Працює і при TRACE_SAMPLE_RATE=0: довірений проксі може вимагати трасу через traceparent
+    asyncio.create_task(_export_loop(), name="trace_exporter")
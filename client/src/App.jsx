@@ -12,6 +12,8 @@ import ProfilePage from './pages/ProfilePage';
 import CompleteProfilePage from './pages/CompleteProfilePage';
 import PaymentPage from './pages/PaymentPage';
 
+const NOTIFICATIONS_POLL_MS = 30000;
+
 function App() {
   const { loginWithRedirect, logout, isAuthenticated, user } = useAuth0();
   const api = useApi();
@@ -22,6 +24,7 @@ function App() {
   const [notifications, setNotifications] = useState([]);
   const [showNotifDropdown, setShowNotifDropdown] = useState(false);
   const notifRef = useRef(null);
+  const unreadCountRef = useRef(0);
 
   useEffect(() => {
     if (isAuthenticated) {
@@ -33,6 +36,18 @@ function App() {
     }
   }, [isAuthenticated, api]);
 
+  // Дзвіночок: дешевий лічильник замість списку; список - лише коли з'явилось нове
+  useEffect(() => {
+    if (!isAuthenticated) return;
+    const timer = setInterval(async () => {
+      try {
+        const res = await api.get('/users/notifications/unread-count');
+        if (res.data.count !== unreadCountRef.current) fetchNotifications();
+      } catch (e) { console.error(e); }
+    }, NOTIFICATIONS_POLL_MS);
+    return () => clearInterval(timer);
+  }, [isAuthenticated, api]);
+
   const fetchNotifications = async () => {
       try {
           const res = await api.get('/users/notifications');
@@ -77,6 +92,7 @@ function App() {
 
   // Рахуємо тільки ті, де is_read === false
   const unreadCount = notifications.filter(n => !n.is_read).length;
+  unreadCountRef.current = unreadCount;
 
   return (
     <div style={{ fontFamily: "'Inter', sans-serif", color: '#111827' }}>
@@ -133,7 +149,7 @@ function App() {
                                     </div>
                                 ) : (
                                     notifications.map(note => (
-                                        <div key={note.id} style={{ padding: '12px', borderBottom: '1px solid #f3f4f6', fontSize: '0.9rem', background: note.is_read ? 'white' : '#eff6ff' }}>
+                                        <div key={`${note.broadcast ? 'b' : 'n'}-${note.id}`} style={{ padding: '12px', borderBottom: '1px solid #f3f4f6', fontSize: '0.9rem', background: note.is_read ? 'white' : '#eff6ff' }}>
                                             <p style={{ margin: '0 0 5px 0', lineHeight: '1.4' }}>{note.message}</p>
                                             <span style={{ fontSize: '0.75rem', color: '#9ca3af' }}>
                                                 {new Date(note.created_at).toLocaleString()}
@@ -29,30 +29,29 @@ export default function LotDetailPage() {
     if (!id || id === 'undefined') { setError("Error URL"); setLoading(false); return; }
     try {
       setLoading(true);
-      const lotRes = await api.get(`/lots/${id}`);
-      setLot(lotRes.data);
-      setEditForm({
-        title: lotRes.data.title, description: lotRes.data.description,
-        start_price: lotRes.data.start_price, min_step: lotRes.data.min_step
-      });
-      if (lotRes.data.images?.length > 0) setActiveImage(lotRes.data.images[0].image_url);
-      else setActiveImage(lotRes.data.image_url);
-      
-      // ⚠️ ВАЖЛИВО: Завантажуємо ставки ТІЛЬКИ якщо користувач авторизований
+      let lotData;
+
+      // ⚠️ ВАЖЛИВО: Ставки і профіль - ТІЛЬКИ для авторизованого користувача.
+      // Лот, ставки і профіль приходять одним запитом (/views/lot)
       if (isAuthenticated) {
-          try {
-              const bidsRes = await api.get(`/bids/${id}`);
-              setBids(bidsRes.data);
-          } catch (bidsError) {
-              console.error("Error loading bids:", bidsError);
-              setBids([]);
-          }
-
-          const u = await api.get('/users/me');
-          setMyDbId(u.data.id);
+          const view = await api.get(`/views/lot/${id}`);
+          if (!view.data.lot) throw new Error(view.data.errors?.lot?.detail);
+          if (view.data.errors?.bids) console.error("Error loading bids:", view.data.errors.bids);
+          lotData = view.data.lot;
+          setBids(view.data.bids || []);
+          setMyDbId(view.data.me?.id);
       } else {
+          lotData = (await api.get(`/lots/${id}`)).data;
           setBids([]); // Для неавторизованих - порожній масив
       }
+
+      setLot(lotData);
+      setEditForm({
+        title: lotData.title, description: lotData.description,
+        start_price: lotData.start_price, min_step: lotData.min_step
+      });
+      if (lotData.images?.length > 0) setActiveImage(lotData.images[0].image_url);
+      else setActiveImage(lotData.image_url);
     } catch (e) { setError("Лот не знайдено"); } finally { setLoading(false); }
   };
 
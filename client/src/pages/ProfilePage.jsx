@@ -41,21 +41,21 @@ export default function ProfilePage() {
   const loadAll = async () => {
     try {
       setLoading(true);
-      const profileRes = await api.get('/users/me');
-      setProfile(profileRes.data);
+      // Усе для сторінки одним запитом; секція з помилкою приходить як null
+      const { data } = await api.get('/views/profile');
+      Object.entries(data.errors || {}).forEach(([section, err]) => console.error(`Profile section ${section}:`, err));
+
+      setProfile(data.me);
       setForm({
-        username: profileRes.data.username || '',
-        phone_number: profileRes.data.phone_number || ''
+        username: data.me?.username || '',
+        phone_number: data.me?.phone_number || ''
       });
+      setMyLots(data.lots || []);
+      setMyBids(data.bids || []);
 
-      const lotsRes = await api.get('/lots/my');
-      setMyLots(lotsRes.data);
-
-      const bidsRes = await api.get('/bids/my');
-      setMyBids(bidsRes.data);
-
-      if (profileRes.data.is_admin) {
-          fetchAdminUsers();
+      if (data.me?.is_admin) {
+          setAdminUsers(data.admin_users || []);
+          if (data.rules) setRulesText(data.rules.content);
       }
 
     } catch (err) {
@@ -72,14 +72,6 @@ export default function ProfilePage() {
       } catch (e) { console.error("Admin fetch error", e); }
   }
 
-  useEffect(() => {
-      if (activeTab === 'admin' && profile?.is_admin) {
-          api.get('/settings/rules')
-             .then(res => setRulesText(res.data.content))
-             .catch(e => console.error(e));
-      }
-  }, [activeTab, profile, api]);
-
   useEffect(() => {
     loadAll();
     // eslint-disable-next-line react-hooks/exhaustive-deps
@@ -145,6 +137,15 @@ export default function ProfilePage() {
     }
   };
 
+  const handleToggleOutbid = async (enabled) => {
+    try {
+      await api.patch('/users/me', { notify_outbid: enabled });
+      setProfile(prev => ({ ...prev, notify_outbid: enabled }));
+    } catch (err) {
+      alert(err.response?.data?.detail || err.message);
+    }
+  };
+
   const handleDeleteLot = async (lotId) => {
     if (!window.confirm("Видалити лот?")) return;
     try { await api.delete(`/lots/${lotId}`); alert("Лот видалено"); loadAll(); } 
@@ -225,7 +226,7 @@ export default function ProfilePage() {
   const handleBlockUser = async () => {
       try {
           await api.post(`/admin/users/${banTargetId}/block`, banForm);
-          alert("Користувача заблоковано, його лоти видалено, ставки скасовано.");
+          alert("Користувача заблоковано. Його лоти і ставки буде прибрано у фоні за кілька секунд.");
           setShowBanModal(false);
           fetchAdminUsers();
       } catch (err) {
@@ -282,6 +283,13 @@ export default function ProfilePage() {
               <strong style={{ minWidth: '150px', color: '#4b5563' }}>Телефон:</strong>
               <span style={{ color: '#111827' }}>{profile.phone_number || <span style={{color: '#9ca3af'}}>Не вказано</span>}</span>
             </div>
+            <div style={rowStyle}>
+              <strong style={{ minWidth: '150px', color: '#4b5563' }}>Сповіщення:</strong>
+              <label style={{ display: 'flex', alignItems: 'center', gap: '8px', color: '#111827', cursor: 'pointer' }}>
+                <input type="checkbox" checked={profile.notify_outbid !== false} onChange={e => handleToggleOutbid(e.target.checked)} />
+                Повідомляти, коли мою ставку перебили
+              </label>
+            </div>
             <button onClick={() => setIsEditing(true)} style={editBtnStyle}>✎ Редагувати профіль</button>
           </div>
         ) : (
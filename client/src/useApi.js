@@ -2,6 +2,11 @@ import { useAuth0 } from "@auth0/auth0-react";
 import axios from "axios";
 import { useMemo } from "react";
 
+// Read-your-writes: сервер повертає час останнього запису (X-Last-Write),
+// ми надсилаємо його з кожним запитом - тоді читання не піде на репліку,
+// яка цього запису ще не отримала (на будь-якому воркері)
+const LAST_WRITE_KEY = "lastWrite";
+
 export const useApi = () => {
   const { getAccessTokenSilently } = useAuth0();
   const baseURL = import.meta.env.VITE_API_URL;
@@ -20,9 +25,22 @@ export const useApi = () => {
         // Якщо юзер не залогінений, токен просто не додасться (для публічних роутів)
         console.log("User not authenticated or error getting token");
       }
+      const lastWrite = sessionStorage.getItem(LAST_WRITE_KEY);
+      if (lastWrite) {
+        config.headers["X-Last-Write"] = lastWrite;
+      }
       return config;
     });
 
+    // Перехоплювач відповідей: запам'ятовує час останнього запису
+    instance.interceptors.response.use((response) => {
+      const lastWrite = response.headers["x-last-write"];
+      if (lastWrite) {
+        sessionStorage.setItem(LAST_WRITE_KEY, lastWrite);
+      }
+      return response;
+    });
+
     return instance;
   }, [getAccessTokenSilently, baseURL]);
 
@@ -12,7 +12,12 @@ CREATE TABLE users (
     ban_reason VARCHAR,
     ban_until TIMESTAMP WITH TIME ZONE,
     
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+
+    -- Найбільший прочитаний id розсилки (broadcasts)
+    broadcasts_read_id BIGINT NOT NULL DEFAULT 0,
+    -- Сповіщення "вашу ставку перебито"
+    notify_outbid BOOLEAN NOT NULL DEFAULT TRUE
 );
 
 -- Індекс для швидкого пошуку при логіні
@@ -20,6 +25,9 @@ CREATE INDEX idx_users_auth0_sub ON users(auth0_sub);
 
 
 -- 3. Створення таблиці Лотів
+-- Глобальний лічильник версій лотів (ETag, інкрементальні оновлення)
+CREATE SEQUENCE lot_version_seq;
+
 CREATE TABLE lots (
     id SERIAL PRIMARY KEY,
     title VARCHAR NOT NULL,
@@ -44,14 +52,23 @@ CREATE TABLE lots (
     -- Реальний дедлайн оплати (встановлюється після завершення аукціону)
     payment_deadline TIMESTAMP WITH TIME ZONE,
     
-    -- Час закриття без ставок (для відліку 24 годин на відновлення/видалення)
+    -- Час завершення (продаж чи закриття): відлік на відновлення і до архівації
     closed_at TIMESTAMP WITH TIME ZONE DEFAULT NULL,
     
+    -- Версія змінюється при кожній зміні лота, його ставок чи картинок
+    version BIGINT NOT NULL DEFAULT nextval('lot_version_seq'),
+    -- Транзакція, що востаннє змінила лот: межа для since_version у POST /lots/snapshots
+    version_xid BIGINT NOT NULL DEFAULT (pg_current_xact_id()::text::bigint),
+    
     seller_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
 CREATE INDEX idx_lots_status ON lots(status);
+-- Лоти продавця по id ("мої лоти", пакети каскаду бану)
+CREATE INDEX idx_lots_seller_id ON lots(seller_id, id);
+-- Завершені лоти за часом закриття - кандидати в архів
+CREATE INDEX idx_lots_finished_closed_at ON lots(closed_at) WHERE status IN ('sold', 'closed', 'closed_unsold');
 
 
 -- 4. Створення таблиці Картинки Лотів (Галерея)
@@ -76,6 +93,24 @@ CREATE TABLE bids (
 );
 
 CREATE INDEX idx_bids_lot_id ON bids(lot_id);
+-- Найвища активна ставка лота (знімки лотів, перевірка мінімальної ставки)
+CREATE INDEX idx_bids_lot_active_amount ON bids(lot_id, amount DESC) WHERE is_active;
+-- Активні ставки користувача по лотах (пакети каскаду бану)
+CREATE INDEX idx_bids_user_active_lot ON bids(user_id, lot_id) WHERE is_active;
+
+
+-- Автоматичні ставки: сервер перебиває конкурентів до max_amount
+CREATE TABLE proxy_bids (
+    id SERIAL PRIMARY KEY,
+    lot_id INTEGER NOT NULL REFERENCES lots(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    max_amount NUMERIC(10, 2) NOT NULL,
+    -- Пріоритет при однаковому максимумі - хто раніше встановив
+    placed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    CONSTRAINT uq_proxy_bids_lot_user UNIQUE (lot_id, user_id)
+);
+
+CREATE INDEX ix_proxy_bids_user_id ON proxy_bids(user_id);
 
 
 -- 6. Створення таблиці Платежів
@@ -95,14 +130,130 @@ CREATE TABLE notifications (
     user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
     message TEXT NOT NULL,
     is_read BOOLEAN DEFAULT FALSE,
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    -- 'outbid' - оновлюється на місці; NULL - звичайне сповіщення
+    kind VARCHAR(16),
+    lot_id INTEGER REFERENCES lots(id) ON DELETE SET NULL
 );
 
 CREATE INDEX idx_notifications_user_id ON notifications(user_id);
+-- Одне сповіщення "перебито" на (користувач, лот) - ціль upsert
+CREATE UNIQUE INDEX uq_notifications_outbid ON notifications(user_id, lot_id) WHERE kind = 'outbid';
+
+-- Розсилки для всіх / сегмента: один рядок на розсилку, прочитання - users.broadcasts_read_id
+CREATE TABLE broadcasts (
+    id BIGSERIAL PRIMARY KEY,
+    message TEXT NOT NULL,
+    segment VARCHAR(32) NOT NULL DEFAULT 'all',
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+-- 8. Список спостереження (лоти, за якими стежить користувач)
+CREATE TABLE watchlist (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    lot_id INTEGER NOT NULL REFERENCES lots(id) ON DELETE CASCADE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    CONSTRAINT uq_watchlist_user_lot UNIQUE (user_id, lot_id)
+);
+
+CREATE INDEX ix_watchlist_lot_id ON watchlist(lot_id);
+
+CREATE TABLE idempotency_keys (
+    id BIGSERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    key VARCHAR(255) NOT NULL,
+    request_hash VARCHAR(64) NOT NULL,
+    status VARCHAR(16) NOT NULL DEFAULT 'pending',
+    status_code INTEGER,
+    content_type VARCHAR,
+    body BYTEA,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    CONSTRAINT uq_idempotency_keys_user_key UNIQUE (user_id, key)
+);
+
+CREATE INDEX ix_idempotency_keys_expires_at ON idempotency_keys(expires_at);
+
+-- Каскад бану у фоні: прогрес для адміна, підхоплення після падіння воркера
+CREATE TABLE ban_jobs (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    admin_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
+    status VARCHAR(16) NOT NULL DEFAULT 'pending',
+    lots_total INTEGER NOT NULL DEFAULT 0,
+    lots_deleted INTEGER NOT NULL DEFAULT 0,
+    bid_lots_total INTEGER NOT NULL DEFAULT 0,
+    bid_lots_done INTEGER NOT NULL DEFAULT 0,
+    notifications_sent INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    heartbeat_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE INDEX ix_ban_jobs_user_id ON ban_jobs(user_id);
+
+-- Архів завершених лотів (archive.py): ті самі колонки, id зберігаються
+CREATE TABLE lots_archive (
+    id INTEGER PRIMARY KEY,
+    title VARCHAR NOT NULL,
+    description TEXT,
+    start_price NUMERIC(10, 2) NOT NULL,
+    current_price NUMERIC(10, 2),
+    min_step NUMERIC(10, 2),
+    status VARCHAR,
+    image_url VARCHAR,
+    payment_deadline_days INTEGER NOT NULL,
+    payment_deadline_hours INTEGER NOT NULL,
+    payment_deadline_minutes INTEGER NOT NULL,
+    payment_deadline TIMESTAMP WITH TIME ZONE,
+    lot_type VARCHAR,
+    seller_id INTEGER REFERENCES users(id),
+    created_at TIMESTAMP WITH TIME ZONE,
+    closed_at TIMESTAMP WITH TIME ZONE,
+    version BIGINT NOT NULL,
+    version_xid BIGINT,
+    archived_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX idx_lots_archive_seller_id ON lots_archive(seller_id, id);
+
+CREATE TABLE lot_images_archive (
+    id INTEGER PRIMARY KEY,
+    image_url VARCHAR NOT NULL,
+    lot_id INTEGER NOT NULL REFERENCES lots_archive(id) ON DELETE CASCADE
+);
+
+CREATE INDEX ix_lot_images_archive_lot_id ON lot_images_archive(lot_id);
+
+CREATE TABLE bids_archive (
+    id INTEGER PRIMARY KEY,
+    amount NUMERIC(10, 2) NOT NULL,
+    timestamp TIMESTAMP WITH TIME ZONE,
+    is_active BOOLEAN,
+    user_id INTEGER REFERENCES users(id),
+    lot_id INTEGER NOT NULL REFERENCES lots_archive(id) ON DELETE CASCADE
+);
+
+CREATE INDEX idx_bids_archive_lot_id ON bids_archive(lot_id);
+CREATE INDEX idx_bids_archive_user_id ON bids_archive(user_id, timestamp DESC);
+
+CREATE TABLE payments_archive (
+    id INTEGER PRIMARY KEY,
+    amount NUMERIC(10, 2) NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE,
+    user_id INTEGER REFERENCES users(id),
+    lot_id INTEGER NOT NULL REFERENCES lots_archive(id) ON DELETE CASCADE
+);
+
+CREATE INDEX ix_payments_archive_lot_id ON payments_archive(lot_id);
 
 CREATE TABLE site_settings (
     key VARCHAR PRIMARY KEY,
-    value TEXT NOT NULL
+    value TEXT NOT NULL,
+    revision INTEGER NOT NULL DEFAULT 1
 );
 
 -- Вставимо дефолтні правила